@@ -1,3 +1,4 @@
+from typing import List, Optional
 from pydantic_settings import BaseSettings
 from pydantic import ConfigDict
 
@@ -6,6 +7,81 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Serve requests through an asyncio engine (aiosqlite / asyncpg) instead
+    # of running each request's DB work on the threadpool
+    ASYNC_DB: bool = False
+    # SQLite performance profile applied to every connection (WAL,
+    # synchronous=NORMAL, page cache, mmap, busy timeout); no-op elsewhere
+    SQLITE_TUNING: bool = True
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_MB: int = 64
+    SQLITE_MMAP_SIZE_MB: int = 256
+    # Group-commit purchases/restocks through a single writer thread (SQLite only)
+    SQLITE_WRITE_QUEUE: bool = True
+    SQLITE_WRITE_BATCH_SIZE: int = 64
+    # Authenticated-user snapshots cached by get_current_user (0 disables)
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: int = 60
+    # Verified access tokens kept decoded, so a token reused across requests
+    # has its signature checked once (0 disables); entries expire with the token
+    TOKEN_CACHE_SIZE: int = 10000
+    # How often each worker re-reads token_revocations, picking up admin
+    # changes made outside the invalidation bus (e.g. make_admin.py; 0 disables)
+    TOKEN_REVOCATION_POLL_SECONDS: float = 1
+    # Pre-serialized GET /api/sweets and /api/sweets/{id} responses (0 disables);
+    # the TTL bounds staleness from other workers' writes if the invalidation
+    # bus is off or misses them
+    CATALOG_CACHE_SIZE: int = 1024
+    CATALOG_CACHE_TTL_SECONDS: int = 10
+    # Uploaded images are stored under UPLOAD_DIR/sweets and served at /uploads
+    UPLOAD_DIR: str = "uploads"
+    MAX_UPLOAD_BYTES: int = 5 * 1024 * 1024
+    # Widths of the resized/WebP copies made for each upload, and the worker
+    # processes that make them (None = one per CPU, 0 = use the threadpool)
+    IMAGE_VARIANT_WIDTHS: List[int] = [160, 480, 960]
+    IMAGE_VARIANT_WORKERS: Optional[int] = None
+    # Background sweep of uploads no sweet references: files untouched for the
+    # grace period are deleted, UPLOAD_SWEEP_BATCH_SIZE files are examined
+    # every UPLOAD_SWEEP_INTERVAL_SECONDS (0 disables the sweeper)
+    UPLOAD_ORPHAN_GRACE_SECONDS: int = 24 * 60 * 60
+    UPLOAD_SWEEP_INTERVAL_SECONDS: float = 10
+    UPLOAD_SWEEP_BATCH_SIZE: int = 500
+    # Sales rollups: new stock movements are compacted every
+    # ROLLUP_INTERVAL_SECONDS (0 disables), up to ROLLUP_BATCH_SIZE per transaction
+    ROLLUP_INTERVAL_SECONDS: float = 5
+    ROLLUP_BATCH_SIZE: int = 50000
+    # GET /api/sweets/stream: open streams allowed per worker, recently changed
+    # sweets whose deltas are kept for catching-up clients (older cursors get
+    # a resync), and the idle keep-alive interval
+    STREAM_MAX_SUBSCRIBERS: int = 20000
+    STREAM_MAX_TRACKED_SWEETS: int = 10000
+    STREAM_HEARTBEAT_SECONDS: float = 15
+    # Create or upgrade the schema (and prune expired token revocations) when
+    # the app starts; serve.py does it once itself and turns this off for
+    # its workers
+    INIT_DB_ON_STARTUP: bool = True
+    # Shared SQLite file through which worker processes tell each other about
+    # writes, so their caches and streams stay coherent (None = single process;
+    # serve.py sets it when starting several workers), polled this often
+    INVALIDATION_BUS_PATH: Optional[str] = None
+    INVALIDATION_BUS_POLL_SECONDS: float = 0.05
+    # Per-route latency/DB/serialization histograms served at /metrics
+    # (Prometheus text format, per worker process) plus a Server-Timing
+    # header on every response
+    METRICS_ENABLED: bool = True
+    # Opt-in sampling profiler: requests slower than PROFILE_SLOW_REQUEST_MS
+    # (0 disables) leave collapsed-stack dumps (flamegraph.pl / speedscope)
+    # in PROFILE_DIR, sampled every PROFILE_SAMPLE_INTERVAL_MS; the newest
+    # PROFILE_MAX_FILES are kept
+    PROFILE_SLOW_REQUEST_MS: float = 0
+    PROFILE_SAMPLE_INTERVAL_MS: float = 5
+    PROFILE_DIR: str = "profiles"
+    PROFILE_MAX_FILES: int = 100
+    # bcrypt worker processes (None = one per CPU, 0 = use the threadpool)
+    PASSWORD_HASH_WORKERS: Optional[int] = None
+    # Hash/verify calls allowed in flight before login/register answer 503
+    # (None = 8 per worker, which bounds queueing to roughly 1-2 s of bcrypt)
+    PASSWORD_HASH_MAX_PENDING: Optional[int] = None
     
     model_config = ConfigDict(env_file=".env")
 
@@ -1,5 +1,10 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import time
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, delete, event, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 from .config import settings
 
 engine = create_engine(
@@ -7,6 +12,37 @@ engine = create_engine(
     pool_pre_ping=True
 )
 
+def configure_sqlite(engine) -> None:
+    """Apply the SQLite performance profile to each new connection of `engine`.
+
+    WAL lets readers proceed while a write is in progress, and with
+    synchronous=NORMAL a commit only appends to the WAL instead of syncing
+    the main file. busy_timeout makes a writer wait for the lock rather than
+    fail with "database is locked". Pass ``async_engine.sync_engine`` for an
+    asyncio engine.
+    """
+    pragmas = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}",
+        # Negative cache_size is in KiB
+        f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_MB * 1024}",
+        f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE_MB * 1024 * 1024}",
+        "PRAGMA temp_store=MEMORY",
+    )
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+if settings.SQLITE_TUNING and engine.dialect.name == "sqlite":
+    configure_sqlite(engine)
+
 SessionLocal = sessionmaker(
     autocommit=False,
     autoflush=False,
@@ -15,13 +51,97 @@ SessionLocal = sessionmaker(
 
 Base = declarative_base()
 
-def get_db():
+# asyncio drivers used when ASYNC_DB is on and DATABASE_URL names no driver
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def async_database_url(url: str) -> str:
+    """Rewrite a default-driver database URL to use the matching asyncio driver"""
+    url = make_url(url)
+    if url.drivername in ASYNC_DRIVERS:
+        url = url.set(drivername=ASYNC_DRIVERS[url.drivername])
+    return url.render_as_string(hide_password=False)
+
+async_engine = None
+AsyncSessionLocal = None
+if settings.ASYNC_DB:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(
+        async_database_url(settings.DATABASE_URL),
+        pool_pre_ping=True
+    )
+    if settings.SQLITE_TUNING and async_engine.dialect.name == "sqlite":
+        configure_sqlite(async_engine.sync_engine)
+    # Objects stay loaded after commit: an expired attribute would need
+    # implicit IO, which AsyncSession cannot do outside run_sync
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine,
+        autoflush=False,
+        expire_on_commit=False
+    )
+
+def get_sync_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# The session dependency every router uses; ASYNC_DB picks the implementation
+get_db = get_async_db if settings.ASYNC_DB else get_sync_db
+
+async def run_db(db, fn, *args):
+    """Call ``fn(session, *args)`` without blocking the event loop.
+
+    A sync Session runs `fn` on the threadpool; an AsyncSession runs it via
+    ``run_sync`` on its own asyncio connection, so the same query code
+    serves both ASYNC_DB modes.
+    """
+    if isinstance(db, Session):
+        return await run_in_threadpool(fn, db, *args)
+    return await db.run_sync(fn, *args)
+
+async def close_db(db):
+    """Close a session of either kind"""
+    if isinstance(db, Session):
+        await run_in_threadpool(db.close)
+    else:
+        await db.close()
+
+def upgrade_schema(connection):
+    """Add columns and indexes that existing tables are missing.
+
+    create_all only creates whole tables, so databases created by an older
+    version of the models get new (nullable, defaulted or computed) columns
+    via ALTER TABLE ADD COLUMN and any missing indexes here.
+    """
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+        for index in table.indexes:
+            index.create(bind=connection, checkfirst=True)
+
 def init_db():
     from . import models
     Base.metadata.create_all(bind=engine)
+    # create_all skips existing tables, so databases created before the
+    # search index existed get it (and a one-off rebuild) here
+    with engine.begin() as connection:
+        upgrade_schema(connection)
+        models.install_search_index(connection)
+        # Revocations older than any token still valid no longer matter
+        cutoff = time.time() - settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        connection.execute(delete(models.TokenRevocation).where(models.TokenRevocation.revoked_at < cutoff))
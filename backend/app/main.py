@@ -1,9 +1,26 @@
-from fastapi import FastAPI
+import asyncio
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from pathlib import Path
-from .database import init_db
-from .routers import auth, sweets
+from .config import settings
+from .database import SessionLocal, init_db
+from .routers import analytics, auth, orders, sweets
+from .utils.auth import invalidate_cached_user, token_cache, token_revocations, user_cache
+from .utils.catalog_cache import catalog_cache
+from .utils.hashing_pool import password_pool
+from .utils.image_pool import image_pool
+from .utils.invalidation_bus import (
+    CATALOG_TOPIC, STREAM_RESET_TOPIC, TOKEN_REVOKED_TOPIC, UPLOAD_DELETED_TOPIC, USER_TOPIC, invalidation_bus
+)
+from .utils.metrics import PROMETHEUS_MEDIA_TYPE, MetricsMiddleware, instrument_response_serialization, metrics
+from .utils.profiler import SlowRequestProfiler
+from .utils.rollups import rollup_compactor
+from .utils.stock_stream import stock_broadcaster
+from .utils.upload_files import UploadFiles
+from .utils.upload_sweeper import upload_sweeper
+from .utils.uploads import SWEET_IMAGES_URL_PREFIX, UPLOADS_URL_PREFIX, variants_cache
+from .utils.write_queue import write_queue_stats
 
 
 app = FastAPI(
@@ -21,21 +38,128 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so its timings include everything else
+if settings.METRICS_ENABLED:
+    profiler = None
+    if settings.PROFILE_SLOW_REQUEST_MS > 0:
+        profiler = SlowRequestProfiler(
+            threshold=settings.PROFILE_SLOW_REQUEST_MS / 1000,
+            interval=settings.PROFILE_SAMPLE_INTERVAL_MS / 1000,
+            directory=settings.PROFILE_DIR,
+            max_files=settings.PROFILE_MAX_FILES
+        )
+    app.add_middleware(MetricsMiddleware, metrics=metrics, profiler=profiler)
+    instrument_response_serialization()
+
 # Create uploads directory if it doesn't exist
-uploads_dir = Path("uploads")
+uploads_dir = Path(settings.UPLOAD_DIR)
 uploads_dir.mkdir(exist_ok=True)
 
-# Mount static files for serving uploaded images
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# Serve uploaded images with long-lived caching, ETags and Range support
+upload_files = UploadFiles(directory=uploads_dir)
+app.mount(UPLOADS_URL_PREFIX, upload_files, name="uploads")
+upload_sweeper.on_delete.append(upload_files.forget)
+
+
+# Apply other worker processes' writes to this worker's caches and streams
+def _apply_catalog_changes(changes):
+    catalog_cache.bump()
+    if changes:
+        stock_broadcaster.publish((sweet_id, fields) for sweet_id, fields in changes)
+
+def _forget_deleted_upload(filename):
+    upload_files.forget(filename)
+    variants_cache.pop(f"{SWEET_IMAGES_URL_PREFIX}/{filename}")
+
+def _drop_local_caches():
+    catalog_cache.bump()
+    stock_broadcaster.reset()
+    user_cache.clear()
+    upload_files.lookups.clear()
+    variants_cache.clear()
+
+invalidation_bus.subscribe(CATALOG_TOPIC, _apply_catalog_changes)
+invalidation_bus.subscribe(STREAM_RESET_TOPIC, lambda _: stock_broadcaster.reset())
+invalidation_bus.subscribe(USER_TOPIC, invalidate_cached_user)
+invalidation_bus.subscribe(TOKEN_REVOKED_TOPIC, lambda payload: token_revocations.revoke(*payload))
+invalidation_bus.subscribe(UPLOAD_DELETED_TOPIC, _forget_deleted_upload)
+invalidation_bus.on_gap.append(_drop_local_caches)
+# Revocations may have been among the missed events
+invalidation_bus.on_gap.append(token_revocations.revoke_all)
+upload_sweeper.on_delete.append(lambda filename: invalidation_bus.publish(UPLOAD_DELETED_TOPIC, filename))
+
+
+def _app_metrics():
+    """Cache, stream, bus and queue counters for /metrics"""
+    caches = {
+        "catalog": catalog_cache.entries.stats(),
+        "user": user_cache.stats(),
+        "token": token_cache.stats(),
+        "upload_lookups": upload_files.lookups.stats(),
+        "image_variants": variants_cache.stats(),
+    }
+    yield "cache_hits_total", "counter", "Cache hits", [({"cache": name}, stats["hits"]) for name, stats in caches.items()]
+    yield "cache_misses_total", "counter", "Cache misses", [
+        ({"cache": name}, stats["misses"]) for name, stats in caches.items()
+    ]
+    yield "cache_entries", "gauge", "Cached entries", [({"cache": name}, stats["size"]) for name, stats in caches.items()]
+    yield "stream_subscribers", "gauge", "Open /api/sweets/stream connections", [
+        ({}, stock_broadcaster.subscribers)
+    ]
+    bus = invalidation_bus.stats()
+    yield "invalidation_bus_events_total", "counter", "Cache invalidation events exchanged with other workers", [
+        ({"direction": "published"}, bus["published"]), ({"direction": "received"}, bus["received"])
+    ]
+    yield "invalidation_bus_gaps_total", "counter", "Times missed events forced a full cache drop", [({}, bus["gaps"])]
+    queue = write_queue_stats()
+    yield "write_queue_commits_total", "counter", "Group commits by the SQLite writer thread", [({}, queue["commits"])]
+    yield "write_queue_jobs_total", "counter", "Write jobs run by the SQLite writer thread", [({}, queue["jobs"])]
+    yield "password_hash_pending", "gauge", "bcrypt calls in flight", [({}, password_pool.pending)]
+    yield "password_hash_rejected_total", "counter", "Logins/registrations turned away with 503", [
+        ({}, password_pool.rejected)
+    ]
+
+metrics.collectors.append(_app_metrics)
 
 # Include routers
 app.include_router(auth.router)
 app.include_router(sweets.router)
+app.include_router(orders.router)
+app.include_router(analytics.router)
 
 @app.on_event("startup")
 def startup_event():
     """Initialize database on startup"""
-    init_db()
+    if settings.INIT_DB_ON_STARTUP:
+        init_db()
+    with SessionLocal() as db:
+        token_revocations.load(db)
+
+@app.on_event("startup")
+async def start_background_jobs():
+    """Start the upload sweeper, the sales rollup compactor, the token revocation poll and the invalidation bus"""
+    jobs = [
+        (upload_sweeper, settings.UPLOAD_SWEEP_INTERVAL_SECONDS),
+        (rollup_compactor, settings.ROLLUP_INTERVAL_SECONDS),
+        (token_revocations, settings.TOKEN_REVOCATION_POLL_SECONDS),
+    ]
+    app.state.background_jobs = [
+        asyncio.create_task(job.run(SessionLocal, interval))
+        for job, interval in jobs
+        if interval > 0
+    ]
+    if invalidation_bus.enabled:
+        app.state.background_jobs.append(asyncio.create_task(invalidation_bus.run()))
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    for task in getattr(app.state, "background_jobs", []):
+        task.cancel()
+    invalidation_bus.close()
+    # uvicorn re-raises SIGTERM once shutdown completes, so atexit hooks never
+    # run: stop the pool processes here or they outlive the server
+    password_pool.shutdown(wait=True)
+    image_pool.shutdown(wait=True)
 
 @app.get("/")
 def root():
@@ -49,4 +173,10 @@ def root():
 @app.get("/health")
 def health_check():
     """Health check endpoint"""
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def prometheus_metrics():
+        """Request and cache metrics of the worker process that answers, in Prometheus text format"""
+        return Response(content=metrics.render(), media_type=PROMETHEUS_MEDIA_TYPE)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean
+from sqlalchemy import BigInteger, Column, Computed, Index, Integer, SmallInteger, String, Float, Boolean, event, text
 from ..database import Base
 
 class User(Base):
@@ -20,4 +20,205 @@ class Sweet(Base):
     price = Column(Float, nullable=False)
     quantity = Column(Integer, nullable=False)
     description = Column(String(500), nullable=True)  
-    image_url = Column(String(500), nullable=True)    
+    image_url = Column(String(500), nullable=True)
+    # Stock level below which the sweet needs reordering; 0 never alerts
+    reorder_threshold = Column(Integer, nullable=False, default=0, server_default="0")
+    # Lowercased category maintained by the database, so exact category
+    # filters are index lookups however the row was written
+    category_key = Column(String(100), Computed("lower(category)"))
+
+    __table_args__ = (
+        Index("ix_sweets_category_key_price", "category_key", "price"),
+        Index("ix_sweets_price", "price"),
+        # Partial index holding only the sweets below their reorder threshold:
+        # listing them reads just those entries, and stock changes elsewhere
+        # in the catalog never touch it
+        Index(
+            "ix_sweets_low_stock", "id",
+            sqlite_where=quantity < reorder_threshold,
+            postgresql_where=quantity < reorder_threshold
+        ),
+    )
+
+
+# StockMovement.kind values
+MOVEMENT_PURCHASE = 1
+MOVEMENT_RESTOCK = 2
+MOVEMENT_KINDS = {MOVEMENT_PURCHASE: "purchase", MOVEMENT_RESTOCK: "restock"}
+
+
+class StockMovement(Base):
+    """Append-only ledger row, written in the same transaction as the stock change.
+
+    Rows are only ever inserted, with increasing ids, so they land at the end
+    of the table and its indexes. Sweet and user ids are plain integers
+    rather than foreign keys: history outlives deleted sweets and users.
+    """
+    __tablename__ = "stock_movements"
+
+    id = Column(Integer, primary_key=True)
+    # Epoch milliseconds
+    ts = Column(BigInteger, nullable=False)
+    sweet_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=True)
+    kind = Column(SmallInteger, nullable=False)
+    # Signed stock change: negative for purchases
+    delta = Column(Integer, nullable=False)
+    unit_price = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index("ix_stock_movements_sweet_id_ts", "sweet_id", "ts"),
+        Index("ix_stock_movements_user_id_id", "user_id", "id"),
+    )
+
+
+class TokenRevocation(Base):
+    """When a user's admin flag, username or password last changed, or they were deleted.
+
+    Access tokens carry the user's id and admin flag; those claims are not
+    trusted in tokens issued before `revoked_at` (epoch seconds).
+    """
+    __tablename__ = "token_revocations"
+
+    username = Column(String(150), primary_key=True)
+    revoked_at = Column(Float, nullable=False)
+
+
+# SalesRollup.bucket_size values, in seconds; 0 is the single all-time bucket
+ROLLUP_ALL_TIME = 0
+ROLLUP_HOUR = 3600
+ROLLUP_DAY = 86400
+ROLLUP_BUCKET_SIZES = (ROLLUP_ALL_TIME, ROLLUP_HOUR, ROLLUP_DAY)
+
+
+class SalesRollup(Base):
+    """Stock movements pre-aggregated per sweet and time bucket.
+
+    Maintained incrementally by utils.rollups from the stock_movements
+    ledger. `category` is the sweet's category when its sales were
+    compacted, so recategorized sweets keep their history where it was.
+    """
+    __tablename__ = "sales_rollups"
+
+    bucket_size = Column(Integer, primary_key=True)
+    # Bucket start in epoch seconds (0 for the all-time bucket)
+    bucket = Column(BigInteger, primary_key=True)
+    sweet_id = Column(Integer, primary_key=True)
+    category = Column(String(100), primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+    units_sold = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+    units_restocked = Column(Integer, nullable=False, default=0)
+
+
+class RollupWatermark(Base):
+    """Id of the last stock movement folded into the rollups"""
+    __tablename__ = "rollup_watermarks"
+
+    name = Column(String(50), primary_key=True)
+    last_movement_id = Column(Integer, nullable=False)
+
+
+# Full-text search index over name, category and description. On SQLite this
+# is an FTS5 trigram table mirroring `sweets` via triggers (so ORM writes and
+# executemany inserts both stay in sync); on Postgres it is a pg_trgm GIN
+# index over the same text. Triggers only fire on text columns, so stock
+# updates never touch the index. bulk_insert_sweets pauses the insert trigger
+# (a row in SWEETS_FTS_PAUSE_TABLE, only ever present inside its own
+# transaction) and indexes the whole batch with one INSERT ... SELECT.
+SWEETS_FTS_TABLE = "sweets_fts"
+SWEETS_FTS_PAUSE_TABLE = "sweets_fts_paused"
+SWEETS_SEARCH_DOCUMENT = "(name || ' ' || category || ' ' || coalesce(description, ''))"
+
+_SQLITE_SEARCH_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SWEETS_FTS_TABLE} USING fts5(
+        name, category, description,
+        content='sweets', content_rowid='id', tokenize='trigram'
+    )""",
+    f"CREATE TABLE IF NOT EXISTS {SWEETS_FTS_PAUSE_TABLE} (paused INTEGER)",
+    f"""CREATE TRIGGER IF NOT EXISTS sweets_fts_insert AFTER INSERT ON sweets
+    WHEN NOT EXISTS (SELECT 1 FROM {SWEETS_FTS_PAUSE_TABLE}) BEGIN
+        INSERT INTO {SWEETS_FTS_TABLE}(rowid, name, category, description)
+        VALUES (new.id, new.name, new.category, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS sweets_fts_delete AFTER DELETE ON sweets BEGIN
+        INSERT INTO {SWEETS_FTS_TABLE}({SWEETS_FTS_TABLE}, rowid, name, category, description)
+        VALUES ('delete', old.id, old.name, old.category, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS sweets_fts_update
+    AFTER UPDATE OF name, category, description ON sweets BEGIN
+        INSERT INTO {SWEETS_FTS_TABLE}({SWEETS_FTS_TABLE}, rowid, name, category, description)
+        VALUES ('delete', old.id, old.name, old.category, old.description);
+        INSERT INTO {SWEETS_FTS_TABLE}(rowid, name, category, description)
+        VALUES (new.id, new.name, new.category, new.description);
+    END""",
+]
+
+_POSTGRES_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS ix_sweets_search_trgm ON sweets USING gin ({SWEETS_SEARCH_DOCUMENT} gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_sweets_name_trgm ON sweets USING gin (name gin_trgm_ops)",
+]
+
+
+def install_search_index(connection) -> None:
+    """Create the search index for this dialect if missing, filling it from existing rows"""
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": SWEETS_FTS_TABLE}
+        ).first()
+        insert_trigger = connection.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'sweets_fts_insert'")
+        ).scalar()
+        if insert_trigger and SWEETS_FTS_PAUSE_TABLE not in insert_trigger:
+            # Created before bulk inserts could pause it
+            connection.exec_driver_sql("DROP TRIGGER sweets_fts_insert")
+        for statement in _SQLITE_SEARCH_DDL:
+            connection.exec_driver_sql(statement)
+        if not exists:
+            connection.exec_driver_sql(
+                f"INSERT INTO {SWEETS_FTS_TABLE}({SWEETS_FTS_TABLE}) VALUES ('rebuild')"
+            )
+    elif dialect == "postgresql":
+        for statement in _POSTGRES_SEARCH_DDL:
+            connection.exec_driver_sql(statement)
+
+
+def bulk_insert_sweets(db, rows: list) -> None:
+    """INSERT `rows` into sweets in one executemany, without committing.
+
+    On SQLite the per-row FTS trigger is paused and the batch is indexed
+    with a single INSERT ... SELECT, which is several times faster for
+    large batches. The pause row is written first, so the write lock is
+    held before the new ids are taken to be those above the current max.
+    """
+    # A Core insert: the ORM's per-row bookkeeping buys nothing here
+    statement = Sweet.__table__.insert()
+    if db.get_bind().dialect.name != "sqlite":
+        db.execute(statement, rows)
+        return
+    db.execute(text(f"INSERT INTO {SWEETS_FTS_PAUSE_TABLE} (paused) VALUES (1)"))
+    last_id = db.execute(text("SELECT coalesce(max(id), 0) FROM sweets")).scalar()
+    db.execute(statement, rows)
+    db.execute(
+        text(
+            f"INSERT INTO {SWEETS_FTS_TABLE}(rowid, name, category, description) "
+            "SELECT id, name, category, description FROM sweets WHERE id > :last_id"
+        ),
+        {"last_id": last_id}
+    )
+    db.execute(text(f"DELETE FROM {SWEETS_FTS_PAUSE_TABLE}"))
+
+
+@event.listens_for(Sweet.__table__, "after_create")
+def _create_search_index(target, connection, **kw):
+    install_search_index(connection)
+
+
+@event.listens_for(Sweet.__table__, "after_drop")
+def _drop_search_index(target, connection, **kw):
+    # The FTS5 table outlives `sweets` (its triggers do not)
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {SWEETS_FTS_TABLE}")
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {SWEETS_FTS_PAUSE_TABLE}")
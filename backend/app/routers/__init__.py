@@ -1,3 +1,3 @@
-from . import auth, sweets
+from . import analytics, auth, orders, sweets
 
-__all__ = ["auth", "sweets"]
\ No newline at end of file
+__all__ = ["analytics", "auth", "orders", "sweets"]
\ No newline at end of file
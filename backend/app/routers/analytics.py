@@ -0,0 +1,140 @@
+import calendar
+from datetime import date, datetime, timezone
+from typing import List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ..database import get_db, run_db
+from ..models import ROLLUP_ALL_TIME, ROLLUP_DAY, ROLLUP_HOUR, Sweet, User
+from ..schemas import CategorySales, SalesBucket, SweetSales
+from ..utils.auth import get_current_admin_user
+from ..utils.rollups import MEASURES, sales_rows
+
+router = APIRouter(prefix="/api/analytics", tags=["Analytics"])
+
+INTERVALS = {"hour": ROLLUP_HOUR, "day": ROLLUP_DAY}
+# Buckets returned when `start` is omitted, and the most a series may span
+DEFAULT_SERIES_BUCKETS = {"hour": 24, "day": 30}
+MAX_SERIES_BUCKETS = 2000
+
+def _day_bounds(start: Optional[date], end: Optional[date]) -> Tuple[int, Optional[int], Optional[int]]:
+    """Bucket size and [start, end) epoch bounds covering whole UTC days, `end` included"""
+    if start is None and end is None:
+        return ROLLUP_ALL_TIME, None, None
+    lower = calendar.timegm(start.timetuple()) if start is not None else None
+    upper = calendar.timegm(end.timetuple()) + ROLLUP_DAY if end is not None else None
+    return ROLLUP_DAY, lower, upper
+
+def _epoch_seconds(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+def _sums(rows) -> list:
+    return [func.sum(rows.c[measure]).label(measure) for measure in MEASURES]
+
+def _report(result) -> List[dict]:
+    documents = []
+    for row in result:
+        document = dict(row._mapping)
+        document["revenue"] = round(document["revenue"], 2)
+        documents.append(document)
+    return documents
+
+def _sweet_sales(db: Session, bucket_size: int, start: Optional[int], end: Optional[int]) -> List[dict]:
+    rows = sales_rows(bucket_size, start, end)
+    query = (
+        select(rows.c.sweet_id, Sweet.name, Sweet.category, *_sums(rows))
+        .select_from(rows)
+        .outerjoin(Sweet, Sweet.id == rows.c.sweet_id)
+        .group_by(rows.c.sweet_id, Sweet.name, Sweet.category)
+        .order_by(func.sum(rows.c.revenue).desc(), rows.c.sweet_id)
+    )
+    return _report(db.execute(query))
+
+def _category_sales(db: Session, bucket_size: int, start: Optional[int], end: Optional[int]) -> List[dict]:
+    rows = sales_rows(bucket_size, start, end)
+    query = (
+        select(rows.c.category, *_sums(rows))
+        .group_by(rows.c.category)
+        .order_by(func.sum(rows.c.revenue).desc(), rows.c.category)
+    )
+    return _report(db.execute(query))
+
+def _sales_series(
+    db: Session, bucket_size: int, start: int, end: int, sweet_id: Optional[int], category: Optional[str]
+) -> List[dict]:
+    rows = sales_rows(bucket_size, start, end)
+    query = select(rows.c.bucket, *_sums(rows)).group_by(rows.c.bucket)
+    if sweet_id is not None:
+        query = query.where(rows.c.sweet_id == sweet_id)
+    if category is not None:
+        query = query.where(func.lower(rows.c.category) == category.lower())
+    found = {row["bucket"]: row for row in _report(db.execute(query))}
+    
+    # Every bucket in the range, zero-filled, so charts need no gap handling
+    empty = {measure: 0 for measure in MEASURES}
+    series = []
+    for bucket in range(start, end, bucket_size):
+        totals = found.get(bucket, empty)
+        series.append({
+            "start": datetime.fromtimestamp(bucket, timezone.utc),
+            **{measure: totals[measure] for measure in MEASURES}
+        })
+    return series
+
+@router.get("/sweets", response_model=List[SweetSales])
+async def get_sales_by_sweet(
+    start: Optional[date] = Query(None, description="First UTC day to include (default: all time)"),
+    end: Optional[date] = Query(None, description="Last UTC day to include (default: all time)"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Units sold, revenue and restocks per sweet, highest revenue first (admin only)
+
+    Served from pre-aggregated rollups, so the cost depends on the number
+    of sweets and days in the range, not on how many orders were placed.
+    """
+    return await run_db(db, _sweet_sales, *_day_bounds(start, end))
+
+@router.get("/categories", response_model=List[CategorySales])
+async def get_sales_by_category(
+    start: Optional[date] = Query(None, description="First UTC day to include (default: all time)"),
+    end: Optional[date] = Query(None, description="Last UTC day to include (default: all time)"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Sales totals per category, highest revenue first (admin only)
+
+    Sales count towards the category the sweet had when they were made.
+    """
+    return await run_db(db, _category_sales, *_day_bounds(start, end))
+
+@router.get("/timeseries", response_model=List[SalesBucket])
+async def get_sales_timeseries(
+    interval: str = Query("hour", pattern="^(hour|day)$", description="Bucket width: hour or day"),
+    start: Optional[datetime] = Query(None, description="Start of the range (UTC if no offset); default: 24 hours or 30 days before `end`"),
+    end: Optional[datetime] = Query(None, description="End of the range (UTC if no offset); default: now"),
+    sweet_id: Optional[int] = Query(None, description="Only this sweet"),
+    category: Optional[str] = Query(None, description="Only this category (case-insensitive)"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Sales totals per hour or day, oldest first, including empty buckets (admin only)"""
+    bucket_size = INTERVALS[interval]
+    upper = _epoch_seconds(end) if end is not None else int(datetime.now(timezone.utc).timestamp())
+    # Widen the range to whole buckets
+    upper = -(-upper // bucket_size) * bucket_size
+    if start is not None:
+        lower = _epoch_seconds(start) // bucket_size * bucket_size
+    else:
+        lower = upper - DEFAULT_SERIES_BUCKETS[interval] * bucket_size
+    
+    buckets = (upper - lower) // bucket_size
+    if buckets > MAX_SERIES_BUCKETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Range too long: at most {MAX_SERIES_BUCKETS} {interval} buckets"
+        )
+    return await run_db(db, _sales_series, bucket_size, lower, upper, sweet_id, category)
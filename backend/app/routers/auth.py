@@ -1,41 +1,74 @@
+import time
 from datetime import timedelta
+from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import or_
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from ..database import get_db
+from ..database import get_db, run_db
 from ..models import User
 from ..schemas import UserCreate, UserResponse, LoginRequest, Token
 from ..utils.auth import (
-    verify_password,
-    get_password_hash,
     create_access_token,
     get_current_user
 )
+from ..utils.hashing_pool import password_pool
 from ..config import settings
 
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 
-@router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
-    """Register a new user"""
-    # Check if username already exists
-    existing_user = db.query(User).filter(User.username == user_data.username).first()
-    if existing_user:
+def _find_existing_names(db: Session, username: str, email: str) -> List[str]:
+    """Usernames of accounts clashing on username or email"""
+    names = [
+        user.username
+        for user in db.query(User).filter(or_(User.username == username, User.email == email))
+    ]
+    # Hand the connection back before the caller waits on bcrypt
+    db.rollback()
+    return names
+
+def _check_names_free(existing_names: List[str], username: str):
+    if username in existing_names:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already registered"
         )
-    
-    # Check if email already exists
-    existing_email = db.query(User).filter(User.email == user_data.email).first()
-    if existing_email:
+    if existing_names:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
+
+def _add_user(db: Session, user: User) -> User:
+    db.add(user)
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent registration took the name between the check and here
+        db.rollback()
+        _check_names_free(_find_existing_names(db, user.username, user.email), user.username)
+        raise
+    db.refresh(user)
+    return user
+
+def _get_credentials(db: Session, username: str) -> Optional[Row]:
+    """Stored password hash, id and admin flag for `username`, or None if no such user"""
+    credentials = db.query(User.hashed_password, User.id, User.is_admin).filter(User.username == username).first()
+    # Hand the connection back before the caller waits on bcrypt
+    db.rollback()
+    return credentials
+
+@router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
+async def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
+    """Register a new user"""
+    # Check if username or email already exists
+    existing_names = await run_db(db, _find_existing_names, user_data.username, user_data.email)
+    _check_names_free(existing_names, user_data.username)
     
-    # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    # Hash in the password pool so bcrypt never occupies a request thread
+    hashed_password = await password_pool.hash(user_data.password)
     new_user = User(
         username=user_data.username,
         email=user_data.email,
@@ -43,19 +76,18 @@ def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
         is_admin=False
     )
     
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    
-    return new_user
+    return await run_db(db, _add_user, new_user)
 
 @router.post("/login", response_model=Token)
-def login(login_data: LoginRequest, db: Session = Depends(get_db)):
+async def login(login_data: LoginRequest, db: Session = Depends(get_db)):
     """Login and get access token"""
+    # Before the user is read, so the token never claims to be newer than the
+    # admin flag it carries (see TokenRevocations)
+    issued_at = int(time.time())
     # Find user by username
-    user = db.query(User).filter(User.username == login_data.username).first()
+    credentials = await run_db(db, _get_credentials, login_data.username)
     
-    if not user or not verify_password(login_data.password, user.hashed_password):
+    if not credentials or not await password_pool.verify(login_data.password, credentials.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -65,13 +97,18 @@ def login(login_data: LoginRequest, db: Session = Depends(get_db)):
     # Create access token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username},
+        data={
+            "sub": login_data.username,
+            "uid": credentials.id,
+            "is_admin": bool(credentials.is_admin),
+            "iat": issued_at,
+        },
         expires_delta=access_token_expires
     )
     
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=UserResponse)
-def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(current_user: User = Depends(get_current_user)):
     """Get current authenticated user information"""
     return current_user
@@ -0,0 +1,77 @@
+from typing import List, Optional, Tuple
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..database import get_db, run_db
+from ..models import MOVEMENT_KINDS, MOVEMENT_PURCHASE, StockMovement, User
+from ..schemas import StockMovementResponse
+from ..utils.auth import get_current_user, get_current_admin_user
+from .sweets import NEXT_CURSOR_HEADER
+
+router = APIRouter(prefix="/api/orders", tags=["Orders"])
+
+DEFAULT_HISTORY_PAGE_SIZE = 50
+MAX_HISTORY_PAGE_SIZE = 500
+
+MOVEMENT_COLUMNS = (
+    StockMovement.id,
+    StockMovement.ts,
+    StockMovement.sweet_id,
+    StockMovement.user_id,
+    StockMovement.kind,
+    StockMovement.delta,
+    StockMovement.unit_price,
+)
+
+def _purchase_history(db: Session, user_id: int, limit: int, before: Optional[int]) -> Tuple[List[dict], dict]:
+    """One page of a user's purchases, newest first, and its response headers"""
+    # Walks ix_stock_movements_user_id_id backwards from the cursor
+    query = (
+        select(*MOVEMENT_COLUMNS)
+        .where(StockMovement.user_id == user_id, StockMovement.kind == MOVEMENT_PURCHASE)
+        .order_by(StockMovement.id.desc())
+    )
+    if before is not None:
+        query = query.where(StockMovement.id < before)
+    
+    # Fetch one extra row to know whether another page exists
+    rows = db.execute(query.limit(limit + 1)).all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers[NEXT_CURSOR_HEADER] = str(rows[-1].id)
+    movements = [{**row._mapping, "kind": MOVEMENT_KINDS[row.kind]} for row in rows]
+    return movements, headers
+
+async def _history_response(db: Session, response: Response, user_id: int, limit: int, before: Optional[int]):
+    movements, headers = await run_db(db, _purchase_history, user_id, limit, before)
+    response.headers.update(headers)
+    return movements
+
+@router.get("", response_model=List[StockMovementResponse])
+async def get_my_orders(
+    response: Response,
+    limit: int = Query(DEFAULT_HISTORY_PAGE_SIZE, ge=1, le=MAX_HISTORY_PAGE_SIZE, description="Page size"),
+    before: Optional[int] = Query(None, ge=1, description="Return purchases with an id lower than this cursor"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """The current user's purchases, newest first (requires authentication)
+
+    When more rows exist, the id to pass as `before` for the next page is
+    returned in the `X-Next-Cursor` header.
+    """
+    return await _history_response(db, response, current_user.id, limit, before)
+
+@router.get("/users/{user_id}", response_model=List[StockMovementResponse])
+async def get_user_orders(
+    user_id: int,
+    response: Response,
+    limit: int = Query(DEFAULT_HISTORY_PAGE_SIZE, ge=1, le=MAX_HISTORY_PAGE_SIZE, description="Page size"),
+    before: Optional[int] = Query(None, ge=1, description="Return purchases with an id lower than this cursor"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Any user's purchases, newest first (admin only), paginated like GET /api/orders"""
+    return await _history_response(db, response, user_id, limit, before)
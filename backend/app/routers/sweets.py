@@ -1,99 +1,332 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query, File, UploadFile
-from sqlalchemy.orm import Session
-import shutil
-from pathlib import Path
-import uuid
-
-from ..database import get_db
-from ..models import User, Sweet
+import time
+from typing import List, Optional, Tuple
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, status, Query, File, UploadFile, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.orm import Session, aliased
+
+from ..config import settings
+from ..database import get_db, run_db
+from ..models import MOVEMENT_PURCHASE, MOVEMENT_RESTOCK, StockMovement, User, Sweet, bulk_insert_sweets
 from ..schemas import (
     SweetCreate,
     SweetUpdate,
     SweetResponse,
+    BulkImportResult,
     PurchaseRequest,
-    RestockRequest
+    BatchPurchaseRequest,
+    RestockRequest,
+    UploadStorageStats
 )
 from ..utils.auth import get_current_user, get_current_admin_user
+from ..utils.catalog_cache import JSON_MEDIA_TYPE, catalog_cache, cached_response
+from ..utils.bulk import (
+    CSV_MEDIA_TYPES, NDJSON_MEDIA_TYPES, OversizedRecord, iter_records, parse_csv_header, parse_records
+)
+from ..utils.search import apply_text_search
+from ..utils.serialization import select_sweet_rows, sweet_row_json, sweet_rows_json
+from ..utils.streaming import CSV_MEDIA_TYPE, NDJSON_MEDIA_TYPE, iter_csv, iter_ndjson
+from ..utils.image_pool import image_pool
+from ..utils.stock_alerts import stock_alerts
+from ..utils.invalidation_bus import CATALOG_TOPIC, STREAM_RESET_TOPIC, invalidation_bus
+from ..utils.stock_stream import EVENT_STREAM_MEDIA_TYPE, stock_broadcaster, stream_frames
+from ..utils.upload_sweeper import upload_sweeper
+from ..utils.uploads import SWEET_IMAGES_URL_PREFIX, image_variants, save_sweet_image, sweet_image_url
+from ..utils.write_queue import run_write
 
 router = APIRouter(prefix="/api/sweets", tags=["Sweets"])
 
+# Header carrying the keyset cursor for the next page of GET /api/sweets
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+MAX_PAGE_SIZE = 1000
+
+# Rows validated and inserted per executemany batch by POST /api/sweets/bulk
+BULK_CHUNK_SIZE = 5000
+# Per-row errors echoed back by a bulk import; the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+EXPORT_COLUMNS = ("id", "name", "category", "price", "quantity", "description", "image_url", "reorder_threshold")
+
+def _catalog_changed(*changes: Tuple[int, dict]):
+    """Call after committing any write to sweets; invalidates cached catalog responses
+
+    `changes` are (sweet_id, changed fields) pairs for GET /api/sweets/stream
+    subscribers. Other worker processes hear about it through the
+    invalidation bus.
+    """
+    catalog_cache.bump()
+    if changes:
+        stock_broadcaster.publish(changes)
+    invalidation_bus.publish(CATALOG_TOPIC, changes)
+
 @router.post("/upload-image", response_model=dict)
 async def upload_sweet_image(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user)
 ):
-    """Upload an image for a sweet (requires authentication)"""
-    # Validate file type
-    allowed_extensions = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
-    file_extension = Path(file.filename).suffix.lower()
-    
-    if file_extension not in allowed_extensions:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid file type. Allowed types: {', '.join(allowed_extensions)}"
-        )
-    
-    # Create uploads directory if it doesn't exist
-    upload_dir = Path("uploads/sweets")
-    upload_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Generate unique filename
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = upload_dir / unique_filename
-    
-    # Save file
+    """Upload an image for a sweet (requires authentication)
+
+    The image is streamed to disk in chunks, capped at MAX_UPLOAD_BYTES,
+    typed by its magic bytes and stored once per distinct content. Resized
+    and WebP variants are generated in the background and show up in the
+    sweet's `image_variants` once ready.
+    """
     try:
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-    except Exception as e:
+        image_path = await save_sweet_image(file)
+    except OSError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to save file: {str(e)}"
         )
     
-    # Return URL path
-    return {"image_url": f"/uploads/sweets/{unique_filename}"}
+    background_tasks.add_task(image_pool.generate_in_background, image_path, SWEET_IMAGES_URL_PREFIX)
+    return {"image_url": sweet_image_url(image_path)}
+
+@router.get("/uploads/stats", response_model=UploadStorageStats)
+async def get_upload_storage_stats(current_user: User = Depends(get_current_admin_user)):
+    """Disk usage of uploaded images and what the orphan sweeper has reclaimed (admin only)"""
+    return upload_sweeper.stats()
+
+def _rows(db: Session, statement) -> list:
+    """Every row selected by `statement`"""
+    return db.execute(statement).all()
+
+def _get_or_404(db: Session, sweet_id: int) -> Sweet:
+    sweet = db.execute(select(Sweet).where(Sweet.id == sweet_id)).scalar_one_or_none()
+    if not sweet:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Sweet not found"
+        )
+    return sweet
+
+def _create_sweet(db: Session, sweet_data: SweetCreate) -> Sweet:
+    new_sweet = Sweet(**sweet_data.model_dump())
+    db.add(new_sweet)
+    db.commit()
+    db.refresh(new_sweet)
+    return new_sweet
 
 @router.post("", response_model=SweetResponse, status_code=status.HTTP_201_CREATED)
-def create_sweet(
+async def create_sweet(
     sweet_data: SweetCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Create a new sweet (requires authentication)"""
-    new_sweet = Sweet(**sweet_data.model_dump())
-    db.add(new_sweet)
-    db.commit()
-    db.refresh(new_sweet)
-    return new_sweet
+    sweet = await run_db(db, _create_sweet, sweet_data)
+    _catalog_changed((sweet.id, SweetResponse.model_validate(sweet).model_dump(exclude={"id"})))
+    return sweet
+
+def _sweet_page_json(db: Session, query, limit: Optional[int]) -> Tuple[bytes, dict]:
+    """Serialized page of sweets and its response headers"""
+    headers = {}
+    if limit is None:
+        rows = _rows(db, query)
+    else:
+        # Fetch one extra row to know whether another page exists
+        rows = _rows(db, query.limit(limit + 1))
+        if len(rows) > limit:
+            rows = rows[:limit]
+            headers[NEXT_CURSOR_HEADER] = str(rows[-1].id)
+    return sweet_rows_json(rows), headers
 
 @router.get("", response_model=List[SweetResponse])
-def get_all_sweets(
+async def get_all_sweets(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    after: Optional[int] = Query(None, ge=0, description="Return sweets with an id greater than this cursor"),
+    output_format: str = Query("json", alias="format", pattern="^(json|ndjson)$", description="json or ndjson (streamed)"),
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get all sweets (requires authentication)"""
-    sweets = db.query(Sweet).all()
-    return sweets
+    """Get sweets ordered by id, optionally keyset-paginated or streamed (requires authentication)
 
-@router.get("/search", response_model=List[SweetResponse])
-def search_sweets(
-    name: Optional[str] = Query(None, description="Search by name"),
-    category: Optional[str] = Query(None, description="Filter by category"),
-    min_price: Optional[float] = Query(None, ge=0, description="Minimum price"),
-    max_price: Optional[float] = Query(None, ge=0, description="Maximum price"),
+    When `limit` is given and more rows exist, the id to pass as `after` for
+    the next page is returned in the `X-Next-Cursor` header. JSON responses
+    carry an ETag and are served from the catalog cache until the catalog
+    changes; a matching If-None-Match gets 304.
+    """
+    query = select_sweet_rows().order_by(Sweet.id)
+    if after is not None:
+        query = query.filter(Sweet.id > after)
+
+    if output_format == "ndjson":
+        if limit is not None:
+            query = query.limit(limit)
+        return StreamingResponse(
+            iter_ndjson(db, query, sweet_row_json),
+            media_type=NDJSON_MEDIA_TYPE
+        )
+
+    # Capture the version before querying so pre-write rows are never
+    # cached under a post-write version
+    version = catalog_cache.version
+    cache_key = ("list", limit, after)
+    entry = catalog_cache.get(version, cache_key)
+    if entry is None:
+        body, headers = await run_db(db, _sweet_page_json, query, limit)
+        entry = catalog_cache.store(version, cache_key, body, headers)
+    return cached_response(entry, if_none_match)
+
+@router.get("/low-stock", response_model=List[SweetResponse])
+async def get_low_stock_sweets(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    after: Optional[int] = Query(None, ge=0, description="Return sweets with an id greater than this cursor"),
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Sweets whose stock is below their reorder threshold, ordered by id (admin only)
+
+    Answered from the ix_sweets_low_stock partial index, so the cost follows
+    the number of low-stock sweets rather than the catalog size. Paginated
+    and cached like GET /api/sweets.
+    """
+    query = select_sweet_rows().where(Sweet.quantity < Sweet.reorder_threshold).order_by(Sweet.id)
+    if after is not None:
+        query = query.filter(Sweet.id > after)
+
+    version = catalog_cache.version
+    cache_key = ("low-stock", limit, after)
+    entry = catalog_cache.get(version, cache_key)
+    if entry is None:
+        body, headers = await run_db(db, _sweet_page_json, query, limit)
+        entry = catalog_cache.store(version, cache_key, body, headers)
+    return cached_response(entry, if_none_match)
+
+@router.get("/stream")
+async def stream_stock_changes(
+    last_event_id: Optional[str] = Header(None, max_length=64),
     current_user: User = Depends(get_current_user)
 ):
-    """Search sweets with filters (requires authentication)"""
-    query = db.query(Sweet)
+    """Server-sent events describing catalog changes as they commit (requires authentication)
+
+    Each ``stock`` event carries a JSON array of deltas, one per changed
+    sweet: its id plus only the fields that changed (``quantity`` after
+    purchases and restocks, ``"deleted": true`` after a delete). Changes
+    coalesce per sweet, so a client that falls behind receives the latest
+    values rather than every intermediate one. A ``resync`` event means
+    deltas were lost (the client was too far behind, or a bulk import ran):
+    reload GET /api/sweets. Reconnecting with Last-Event-ID resumes where
+    the client left off, if it reaches the same worker process; elsewhere
+    it gets a resync. Writes handled by other workers arrive through the
+    invalidation bus.
+    """
+    if stock_broadcaster.subscribers >= stock_broadcaster.max_subscribers:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many open streams, retry later"
+        )
+    return StreamingResponse(
+        stream_frames(stock_broadcaster, last_event_id, settings.STREAM_HEARTBEAT_SECONDS),
+        media_type=EVENT_STREAM_MEDIA_TYPE,
+        # Proxies must pass frames through as they are written
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _import_chunk(db: Session, records: list, header: Optional[list]):
+    """Validate and insert one chunk of bulk-import records in a single executemany"""
+    rows, errors = parse_records(records, header)
+    if rows:
+        bulk_insert_sweets(db, rows)
+        db.commit()
+    return len(rows), errors
+
+@router.post("/bulk", response_model=BulkImportResult)
+async def bulk_import_sweets(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Bulk import sweets from a streamed CSV or NDJSON body (admin only)
+
+    CSV bodies need a header row naming the SweetCreate fields. Valid rows are
+    inserted in batches of BULK_CHUNK_SIZE, each committed as it completes;
+    invalid rows are skipped and reported by line number.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in CSV_MEDIA_TYPES:
+        is_csv = True
+    elif content_type in NDJSON_MEDIA_TYPES:
+        is_csv = False
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send text/csv or application/x-ndjson"
+        )
+    
+    header = None
+    chunk = []
+    inserted = 0
+    failed = 0
+    errors = []
     
-    if name:
-        query = query.filter(Sweet.name.ilike(f"%{name}%"))
+    async def flush():
+        nonlocal inserted, failed
+        count, chunk_errors = await run_db(db, _import_chunk, chunk, header)
+        if count:
+            _catalog_changed()
+        inserted += count
+        failed += len(chunk_errors)
+        errors.extend(chunk_errors[:MAX_REPORTED_ERRORS - len(errors)])
+    
+    try:
+        async for line, record in iter_records(request.stream(), csv_quoting=is_csv):
+            if is_csv and header is None:
+                if isinstance(record, OversizedRecord):
+                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"CSV header: {record}")
+                header = parse_csv_header(record)
+                continue
+            chunk.append((line, record))
+            if len(chunk) >= BULK_CHUNK_SIZE:
+                await flush()
+                chunk = []
+        if chunk:
+            await flush()
+    finally:
+        if inserted:
+            # Too many rows to stream as deltas: stream subscribers refetch
+            stock_broadcaster.reset()
+            invalidation_bus.publish(STREAM_RESET_TOPIC)
     
-    if category:
-        query = query.filter(Sweet.category.ilike(f"%{category}%"))
+    return {"inserted": inserted, "failed": failed, "errors": errors}
+
+@router.get("/export")
+async def export_sweets(
+    output_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$", description="csv or ndjson"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Stream the whole catalog as CSV or NDJSON (requires authentication)"""
+    if output_format == "ndjson":
+        query = select_sweet_rows().order_by(Sweet.id)
+        body = iter_ndjson(db, query, sweet_row_json)
+        media_type = NDJSON_MEDIA_TYPE
+    else:
+        query = select(*(getattr(Sweet, column) for column in EXPORT_COLUMNS)).order_by(Sweet.id)
+        body = iter_csv(db, query, EXPORT_COLUMNS)
+        media_type = CSV_MEDIA_TYPE
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="sweets.{output_format}"'}
+    )
+
+def _search_sweets(
+    db: Session,
+    q: Optional[str],
+    name: Optional[str],
+    category: Optional[str],
+    min_price: Optional[float],
+    max_price: Optional[float],
+    limit: Optional[int],
+    offset: int
+) -> bytes:
+    query, ranked = apply_text_search(
+        select_sweet_rows(), db.get_bind().dialect.name, q=q, name=name, category=category
+    )
     
     if min_price is not None:
         query = query.filter(Sweet.price >= min_price)
@@ -101,38 +334,71 @@ def search_sweets(
     if max_price is not None:
         query = query.filter(Sweet.price <= max_price)
     
-    sweets = query.all()
-    return sweets
+    if not ranked:
+        if min_price is not None or max_price is not None:
+            # Price order lets price filters walk the price indexes
+            query = query.order_by(Sweet.price, Sweet.id)
+        else:
+            query = query.order_by(Sweet.id)
+    
+    query = query.offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    
+    return sweet_rows_json(_rows(db, query))
 
-@router.get("/{sweet_id}", response_model=SweetResponse)
-def get_sweet(
-    sweet_id: int,
+@router.get("/search", response_model=List[SweetResponse])
+async def search_sweets(
+    q: Optional[str] = Query(None, description="Full-text search over name, category and description"),
+    name: Optional[str] = Query(None, description="Search by name"),
+    category: Optional[str] = Query(None, description="Filter by category (partial, case-insensitive)"),
+    min_price: Optional[float] = Query(None, ge=0, description="Minimum price"),
+    max_price: Optional[float] = Query(None, ge=0, description="Maximum price"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    offset: int = Query(0, ge=0, description="Results to skip"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get a specific sweet by ID (requires authentication)"""
-    sweet = db.query(Sweet).filter(Sweet.id == sweet_id).first()
-    if not sweet:
+    """Search sweets with filters, most relevant first (requires authentication)
+
+    Without `limit` every match is returned, as the frontend expects;
+    with it, `offset` pages through them.
+    """
+    body = await run_db(
+        db, _search_sweets, q, name, category, min_price, max_price, limit, offset
+    )
+    return Response(content=body, media_type=JSON_MEDIA_TYPE)
+
+def _sweet_json(db: Session, sweet_id: int) -> bytes:
+    row = db.execute(select_sweet_rows().where(Sweet.id == sweet_id)).first()
+    if row is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Sweet not found"
         )
-    return sweet
+    return sweet_row_json(row)
 
-@router.put("/{sweet_id}", response_model=SweetResponse)
-def update_sweet(
+@router.get("/{sweet_id}", response_model=SweetResponse)
+async def get_sweet(
     sweet_id: int,
-    sweet_data: SweetUpdate,
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Update a sweet (requires authentication)"""
-    sweet = db.query(Sweet).filter(Sweet.id == sweet_id).first()
-    if not sweet:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Sweet not found"
-        )
+    """Get a specific sweet by ID (requires authentication)
+
+    Cached and ETag-validated like the catalog list.
+    """
+    version = catalog_cache.version
+    cache_key = ("sweet", sweet_id)
+    entry = catalog_cache.get(version, cache_key)
+    if entry is None:
+        body = await run_db(db, _sweet_json, sweet_id)
+        entry = catalog_cache.store(version, cache_key, body)
+    return cached_response(entry, if_none_match)
+
+def _update_sweet(db: Session, sweet_id: int, sweet_data: SweetUpdate) -> Sweet:
+    sweet = _get_or_404(db, sweet_id)
     
     # Update only provided fields
     update_data = sweet_data.model_dump(exclude_unset=True)
@@ -143,66 +409,194 @@ def update_sweet(
     db.refresh(sweet)
     return sweet
 
+@router.put("/{sweet_id}", response_model=SweetResponse)
+async def update_sweet(
+    sweet_id: int,
+    sweet_data: SweetUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Update a sweet (requires authentication)"""
+    sweet = await run_db(db, _update_sweet, sweet_id, sweet_data)
+    changed = {field: getattr(sweet, field) for field in sweet_data.model_fields_set}
+    if "image_url" in changed:
+        changed["image_variants"] = image_variants(sweet.image_url)
+    _catalog_changed((sweet.id, changed))
+    return sweet
+
+def _delete_sweet(db: Session, sweet_id: int) -> None:
+    db.delete(_get_or_404(db, sweet_id))
+    db.commit()
+
 @router.delete("/{sweet_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_sweet(
+async def delete_sweet(
     sweet_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_admin_user)
 ):
     """Delete a sweet (admin only)"""
-    sweet = db.query(Sweet).filter(Sweet.id == sweet_id).first()
-    if not sweet:
-        raise HTTPException(
+    await run_db(db, _delete_sweet, sweet_id)
+    _catalog_changed((sweet_id, {"deleted": True}))
+    return None
+
+def _update_stock(db: Session, sweet_id: int, delta: int) -> Optional[Sweet]:
+    """Atomically add `delta` to a sweet's stock in a single statement.
+
+    Issues ``UPDATE ... SET quantity = quantity + :delta WHERE id = :id
+    [AND quantity >= -:delta] RETURNING ...`` so concurrent buyers can never
+    oversell. Returns the updated sweet, or None when the sweet does not exist
+    or (for decrements) does not have enough stock.
+    """
+    stmt = update(Sweet).where(Sweet.id == sweet_id)
+    if delta < 0:
+        stmt = stmt.where(Sweet.quantity >= -delta)
+    stmt = (
+        stmt.values(quantity=Sweet.quantity + delta)
+        .returning(Sweet)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    return db.execute(stmt).scalar_one_or_none()
+
+def _stock_update_failed(db: Session, sweet_id: int) -> HTTPException:
+    """Explain why a conditional decrement matched no row (slow path only)"""
+    available = db.query(Sweet.quantity).filter(Sweet.id == sweet_id).scalar()
+    if available is None:
+        return HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Sweet not found"
         )
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Not enough stock. Available: {available}"
+    )
+
+def _record_movements(db: Session, kind: int, user_id: int, changes: List[Tuple[Sweet, int]]) -> None:
+    """Append ledger rows for stock changes made in the current transaction"""
+    ts = int(time.time() * 1000)
+    db.execute(insert(StockMovement), [
+        {"ts": ts, "sweet_id": sweet.id, "user_id": user_id, "kind": kind, "delta": delta, "unit_price": sweet.price}
+        for sweet, delta in changes
+    ])
+
+def _purchase_batch(db: Session, totals: dict, user_id: int) -> List[SweetResponse]:
+    """Write job: decrement every sweet in `totals`, or nothing at all"""
+    # One conditional UPDATE covers the whole cart; the subquery makes it
+    # all-or-nothing, so a short cart leaves no partial write to undo
+    amounts = case(totals, value=Sweet.id)
+    stocked = aliased(Sweet)
+    in_stock = (
+        select(func.count())
+        .select_from(stocked)
+        .where(stocked.id.in_(totals), stocked.quantity >= case(totals, value=stocked.id))
+        .scalar_subquery()
+    )
+    stmt = (
+        update(Sweet)
+        .where(Sweet.id.in_(totals), Sweet.quantity >= amounts, in_stock == len(totals))
+        .values(quantity=Sweet.quantity - amounts)
+        .returning(Sweet)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    sweets = {sweet.id: sweet for sweet in db.execute(stmt).scalars()}
     
-    db.delete(sweet)
-    db.commit()
-    return None
+    if len(sweets) != len(totals):
+        if sweets:
+            # A concurrent writer slipped in between the subquery and the
+            # row updates (possible on Postgres); run_write rolls this back
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Stock changed during checkout, please retry"
+            )
+        available = dict(
+            db.query(Sweet.id, Sweet.quantity).filter(Sweet.id.in_(totals)).all()
+        )
+        missing = [sweet_id for sweet_id in totals if sweet_id not in available]
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Sweets not found: {missing}"
+            )
+        short = {
+            sweet_id: available[sweet_id]
+            for sweet_id, quantity in totals.items()
+            if available[sweet_id] < quantity
+        }
+        if not short:
+            # Stock was replenished between the UPDATE and this check
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Stock changed during checkout, please retry"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Not enough stock. Available: {short}"
+        )
+    
+    _record_movements(db, MOVEMENT_PURCHASE, user_id, [
+        (sweets[sweet_id], -quantity) for sweet_id, quantity in totals.items()
+    ])
+    return [SweetResponse.model_validate(sweets[sweet_id]) for sweet_id in totals]
+
+@router.post("/purchase-batch", response_model=List[SweetResponse])
+async def purchase_sweets_batch(
+    purchase_data: BatchPurchaseRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Purchase several sweets at once; either every item succeeds or none do"""
+    # Merge repeated line items so each sweet is decremented once
+    totals = {}
+    for item in purchase_data.items:
+        totals[item.sweet_id] = totals.get(item.sweet_id, 0) + item.quantity
+    
+    sweets = await run_write(db, _purchase_batch, totals, current_user.id)
+    _catalog_changed(*((sweet.id, {"quantity": sweet.quantity}) for sweet in sweets))
+    stock_alerts.publish_sales(sweets, totals)
+    return sweets
+
+def _purchase(db: Session, sweet_id: int, quantity: int, user_id: int) -> SweetResponse:
+    """Write job: sell `quantity` of a sweet and record the sale (run_write commits)"""
+    sweet = _update_stock(db, sweet_id, -quantity)
+    if sweet is None:
+        raise _stock_update_failed(db, sweet_id)
+    _record_movements(db, MOVEMENT_PURCHASE, user_id, [(sweet, -quantity)])
+    
+    # Serialize inside the job so expiring the instance doesn't cost a refresh SELECT
+    return SweetResponse.model_validate(sweet)
 
 @router.post("/{sweet_id}/purchase", response_model=SweetResponse)
-def purchase_sweet(
+async def purchase_sweet(
     sweet_id: int,
     purchase_data: PurchaseRequest,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Purchase a sweet (decreases quantity)"""
-    sweet = db.query(Sweet).filter(Sweet.id == sweet_id).first()
-    if not sweet:
+    sweet = await run_write(db, _purchase, sweet_id, purchase_data.quantity, current_user.id)
+    _catalog_changed((sweet.id, {"quantity": sweet.quantity}))
+    stock_alerts.publish_sales([sweet], {sweet.id: purchase_data.quantity})
+    return sweet
+
+def _restock(db: Session, sweet_id: int, quantity: int, user_id: int) -> SweetResponse:
+    """Write job: add `quantity` to a sweet's stock and record it (run_write commits)"""
+    sweet = _update_stock(db, sweet_id, quantity)
+    if sweet is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Sweet not found"
         )
+    _record_movements(db, MOVEMENT_RESTOCK, user_id, [(sweet, quantity)])
     
-    if sweet.quantity < purchase_data.quantity:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Not enough stock. Available: {sweet.quantity}"
-        )
-    
-    sweet.quantity -= purchase_data.quantity
-    db.commit()
-    db.refresh(sweet)
-    return sweet
+    return SweetResponse.model_validate(sweet)
 
 @router.post("/{sweet_id}/restock", response_model=SweetResponse)
-def restock_sweet(
+async def restock_sweet(
     sweet_id: int,
     restock_data: RestockRequest,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_admin_user)
 ):
     """Restock a sweet (admin only, increases quantity)"""
-    sweet = db.query(Sweet).filter(Sweet.id == sweet_id).first()
-    if not sweet:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Sweet not found"
-        )
-    
-    sweet.quantity += restock_data.quantity
-    db.commit()
-    db.refresh(sweet)
-    return sweet
\ No newline at end of file
+    sweet = await run_write(db, _restock, sweet_id, restock_data.quantity, current_user.id)
+    _catalog_changed((sweet.id, {"quantity": sweet.quantity}))
+    return sweet
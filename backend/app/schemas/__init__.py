@@ -1,5 +1,8 @@
-from pydantic import BaseModel, EmailStr, Field, ConfigDict
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field, ConfigDict, computed_field
+from datetime import datetime
+from typing import List, Literal, Optional
+
+from ..utils.uploads import image_variants
 
 # User Schemas
 class UserBase(BaseModel):
@@ -31,10 +34,11 @@ class LoginRequest(BaseModel):
 class SweetBase(BaseModel):
     name: str
     category: str
-    price: float
-    quantity: int
+    price: float = Field(..., ge=0)
+    quantity: int = Field(..., ge=0)
     description: Optional[str] = None
     image_url: Optional[str] = None  # Add this line
+    reorder_threshold: int = Field(0, ge=0)
 
 class SweetCreate(SweetBase):
     pass
@@ -42,17 +46,83 @@ class SweetCreate(SweetBase):
 class SweetUpdate(BaseModel):
     name: Optional[str] = None
     category: Optional[str] = None
-    price: Optional[float] = None
-    quantity: Optional[int] = None
+    price: Optional[float] = Field(None, ge=0)
+    quantity: Optional[int] = Field(None, ge=0)
     description: Optional[str] = None
     image_url: Optional[str] = None  # Add this line
+    reorder_threshold: Optional[int] = Field(None, ge=0)
+
+class ImageVariant(BaseModel):
+    width: int
+    url: str
+    webp_url: str
 
 class SweetResponse(SweetBase):
     id: int
     model_config = ConfigDict(from_attributes=True)
 
+    @computed_field
+    @property
+    def image_variants(self) -> List[ImageVariant]:
+        """Resized copies of image_url, smallest first (empty until generated)"""
+        return [ImageVariant(**variant) for variant in image_variants(self.image_url)]
+
 class PurchaseRequest(BaseModel):
     quantity: int = Field(..., gt=0)
 
+class BulkImportError(BaseModel):
+    line: int
+    error: str
+
+class BulkImportResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[BulkImportError]
+
+class StockMovementResponse(BaseModel):
+    id: int
+    # Epoch milliseconds
+    ts: int
+    sweet_id: int
+    user_id: Optional[int]
+    kind: Literal["purchase", "restock"]
+    # Signed stock change: negative for purchases
+    delta: int
+    unit_price: float
+
+class SalesTotals(BaseModel):
+    orders: int
+    units_sold: int
+    revenue: float
+    units_restocked: int
+
+class SweetSales(SalesTotals):
+    sweet_id: int
+    # Current name and category; None once the sweet has been deleted
+    name: Optional[str]
+    category: Optional[str]
+
+class CategorySales(SalesTotals):
+    category: str
+
+class SalesBucket(SalesTotals):
+    start: datetime
+
+class UploadStorageStats(BaseModel):
+    # Totals as of the last completed sweep (None until one has finished)
+    files: Optional[int]
+    bytes: Optional[int]
+    orphans_reclaimed: int
+    bytes_reclaimed: int
+    cycles: int
+    last_cycle_at: Optional[float]
+
+class PurchaseItem(BaseModel):
+    sweet_id: int
+    quantity: int = Field(..., gt=0)
+
+class BatchPurchaseRequest(BaseModel):
+    items: List[PurchaseItem] = Field(..., min_length=1, max_length=100)
+
 class RestockRequest(BaseModel):
     quantity: int = Field(..., gt=0)
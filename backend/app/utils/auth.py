@@ -1,31 +1,180 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Iterable, Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
 
 from ..config import settings
-from ..database import get_db
-from ..models import User
-from ..schemas import TokenData
+from ..database import get_db, run_db
+from ..models import TokenRevocation, User
+from .cache import TTLCache
+from .invalidation_bus import TOKEN_REVOKED_TOPIC, USER_TOPIC, invalidation_bus
+from .metrics import timed
+from .passwords import pwd_context, verify_password, get_password_hash
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
 
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
 
+@dataclass(frozen=True)
+class AuthenticatedUser:
+    """Detached snapshot of the columns endpoints need from the current user"""
+    id: int
+    username: str
+    # None when get_current_admin_user authorized from the token's claims alone
+    email: Optional[str]
+    is_admin: bool
 
-def get_password_hash(password: str) -> str:
-    # bcrypt only uses first 72 bytes
-    if len(password.encode("utf-8")) > 72:
-        password = password.encode("utf-8")[:72].decode("utf-8", errors="ignore")
-    return pwd_context.hash(password)
+    @classmethod
+    def from_user(cls, user: User) -> "AuthenticatedUser":
+        return cls(id=user.id, username=user.username, email=user.email, is_admin=bool(user.is_admin))
+
+
+@dataclass(frozen=True)
+class TokenClaims:
+    """Verified contents of an access token"""
+    username: str
+    expires_at: Optional[int]
+    # Tokens issued before these claims existed lack them
+    user_id: Optional[int] = None
+    is_admin: Optional[bool] = None
+    issued_at: Optional[int] = None
+
+
+# Snapshots keyed by (token subject, token exp), so a fresh login never reuses
+# an entry and no entry outlives the token that created it
+user_cache = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS)
+
+# Verified tokens -> TokenClaims; entries expire with their token
+token_cache = TTLCache(maxsize=settings.TOKEN_CACHE_SIZE, ttl=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+# A revocation is recorded when the change is flushed, but logins keep
+# reading the old row until it commits; claims issued within this long after
+# a revocation are not trusted either
+REVOCATION_MARGIN_SECONDS = 1.0
+
+
+class TokenRevocations:
+    """Which tokens' id and admin claims can still be trusted.
+
+    Changing a user's admin flag, username or password, or deleting them,
+    records the time in the token_revocations table (in the same
+    transaction), here, and in the other workers via the invalidation bus.
+    Claims in tokens that user was issued before then are no longer
+    trusted, so authorization falls back to looking the user up. Each
+    worker `load`s the table at startup (init_db prunes it) and again every
+    TOKEN_REVOCATION_POLL_SECONDS (`run`), which catches changes made by
+    processes off the bus such as make_admin.py; if it missed bus events it
+    distrusts every token issued so far (`revoke_all`). Changes that bypass
+    the table altogether (a direct SQL edit) are bounded like the user
+    cache: claims are only trusted for USER_CACHE_TTL_SECONDS after login.
+    """
+
+    def __init__(self):
+        self._revoked_at: Dict[str, float] = {}
+        self._all_revoked_at = 0.0
+
+    def revoke(self, username: str, revoked_at: float) -> bool:
+        """Record a revocation; False if one at least as recent was known"""
+        if revoked_at > self._revoked_at.get(username, 0.0):
+            self._revoked_at[username] = revoked_at
+            return True
+        return False
+
+    def revoke_all(self) -> None:
+        """Distrust the claims of every token issued so far"""
+        self._all_revoked_at = max(self._all_revoked_at, time.time() + REVOCATION_MARGIN_SECONDS)
+
+    def trusts(self, claims: TokenClaims) -> bool:
+        if claims.user_id is None or claims.is_admin is None or claims.issued_at is None:
+            return False
+        if time.time() - claims.issued_at >= settings.USER_CACHE_TTL_SECONDS:
+            return False
+        revoked_at = max(self._all_revoked_at, self._revoked_at.get(claims.username, 0.0))
+        return claims.issued_at > revoked_at
+
+    def load(self, db: Session) -> None:
+        """Merge in the stored revocations recent enough to matter to a token still valid.
+
+        Users whose revocation is new here are dropped from the user cache too:
+        the change was made somewhere this worker did not hear about.
+        """
+        cutoff = time.time() - settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        rows = (
+            db.query(TokenRevocation.username, TokenRevocation.revoked_at)
+            .filter(TokenRevocation.revoked_at >= cutoff)
+            .all()
+        )
+        for username, revoked_at in rows:
+            if self.revoke(username, revoked_at):
+                invalidate_cached_user(username)
+
+    def _load_with_session(self, session_factory) -> None:
+        with session_factory() as db:
+            self.load(db)
+
+    async def run(self, session_factory, interval: float) -> None:
+        """Reload every `interval` seconds until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await run_in_threadpool(self._load_with_session, session_factory)
+            except Exception:
+                logger.exception("Loading token revocations failed")
+
+    def clear(self) -> None:
+        self._revoked_at.clear()
+        self._all_revoked_at = 0.0
+
+
+token_revocations = TokenRevocations()
+
+
+def invalidate_cached_user(username: str) -> None:
+    """Forget every cached snapshot for `username`"""
+    user_cache.discard_where(lambda key: key[0] == username)
+
+
+def _forget_user(target: User) -> Iterable[str]:
+    # Covers is_admin/email changes and deletions, plus the old name on renames
+    usernames = (target.username, *(inspect(target).attrs.username.history.deleted or ()))
+    for username in usernames:
+        invalidate_cached_user(username)
+        invalidation_bus.publish(USER_TOPIC, username)
+    return usernames
+
+
+def _revoke_token_claims(connection, usernames: Iterable[str]) -> None:
+    revoked_at = time.time() + REVOCATION_MARGIN_SECONDS
+    insert = postgresql.insert if connection.dialect.name == "postgresql" else sqlite.insert
+    for username in usernames:
+        stmt = insert(TokenRevocation).values(username=username, revoked_at=revoked_at)
+        connection.execute(stmt.on_conflict_do_update(index_elements=["username"], set_={"revoked_at": revoked_at}))
+        token_revocations.revoke(username, revoked_at)
+        invalidation_bus.publish(TOKEN_REVOKED_TOPIC, [username, revoked_at])
+
+
+@event.listens_for(User, "after_update")
+def _invalidate_on_user_update(mapper, connection, target):
+    usernames = _forget_user(target)
+    attrs = inspect(target).attrs
+    if any(attrs[name].history.has_changes() for name in ("is_admin", "username", "hashed_password")):
+        _revoke_token_claims(connection, usernames)
+
+
+@event.listens_for(User, "after_delete")
+def _invalidate_on_user_delete(mapper, connection, target):
+    _revoke_token_claims(connection, _forget_user(target))
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -40,34 +189,95 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def get_current_user(
+def decode_access_token(token: str) -> Optional[TokenClaims]:
+    """Claims of a valid, unexpired access token, or None
+
+    Verified tokens are kept in `token_cache`, so a token reused across
+    requests is decoded and has its signature checked only once.
+    """
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    username = payload.get("sub")
+    if not isinstance(username, str):
+        return None
+    user_id, is_admin, issued_at = payload.get("uid"), payload.get("is_admin"), payload.get("iat")
+    claims = TokenClaims(
+        username=username,
+        expires_at=payload.get("exp"),
+        user_id=user_id if isinstance(user_id, int) else None,
+        is_admin=is_admin if isinstance(is_admin, bool) else None,
+        issued_at=issued_at if isinstance(issued_at, int) else None,
+    )
+    token_cache.set(token, claims, expires_at=claims.expires_at)
+    return claims
+
+def _load_user(db: Session, username: str) -> Optional[AuthenticatedUser]:
+    user = db.query(User).filter(User.username == username).first()
+    snapshot = AuthenticatedUser.from_user(user) if user is not None else None
+    # Hand the connection back before the endpoint queues for its own DB hop
+    db.rollback()
+    return snapshot
+
+async def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
-) -> User:
-    """Get the current authenticated user from JWT token"""
+) -> AuthenticatedUser:
+    """Get the current authenticated user from JWT token
+
+    The user row is looked up once per token and then served from
+    `user_cache` until the token expires, the cache TTL lapses, or the user
+    is updated or deleted.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    with timed("auth"):
+        claims = decode_access_token(token)
+        if claims is None:
             raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
-        raise credentials_exception
+        
+        cache_key = (claims.username, claims.expires_at)
+        cached = user_cache.get(cache_key)
+    if cached is not None:
+        return cached
     
-    user = db.query(User).filter(User.username == token_data.username).first()
-    if user is None:
+    snapshot = await run_db(db, _load_user, claims.username)
+    if snapshot is None:
         raise credentials_exception
     
-    return user
+    user_cache.set(cache_key, snapshot, expires_at=claims.expires_at)
+    return snapshot
+
+async def get_current_admin_user(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> AuthenticatedUser:
+    """Verify that the current user is an admin
 
-def get_current_admin_user(current_user: User = Depends(get_current_user)) -> User:
-    """Verify that the current user is an admin"""
+    Tokens carry the user's id and admin flag, so for USER_CACHE_TTL_SECONDS
+    after login, unless the user's privileges changed since the token was
+    issued (see TokenRevocations), this needs neither the user cache nor
+    the database. Otherwise, and for
+    tokens without those claims, the user is looked up as in
+    get_current_user.
+    """
+    with timed("auth"):
+        claims = decode_access_token(token)
+        trusted = claims is not None and token_revocations.trusts(claims)
+    if trusted:
+        current_user = AuthenticatedUser(
+            id=claims.user_id, username=claims.username, email=None, is_admin=claims.is_admin
+        )
+    else:
+        current_user = await get_current_user(token, db)
     if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
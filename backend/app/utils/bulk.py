@@ -0,0 +1,169 @@
+import codecs
+import csv
+import json
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, Tuple, Union
+
+from pydantic import ValidationError
+
+from ..schemas import SweetCreate
+
+CSV_MEDIA_TYPES = {"text/csv", "application/csv"}
+NDJSON_MEDIA_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+
+
+# Longest record (a line, or a CSV record spanning lines) buffered; longer
+# ones are dropped and reported as failed rows
+MAX_RECORD_CHARS = 64 * 1024
+
+
+class OversizedRecord:
+    """Stands in for a record longer than the limit, which was not buffered"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+
+    def __str__(self) -> str:
+        return f"record longer than {self.limit} characters (unbalanced quote?)"
+
+
+async def iter_records(
+    chunks: AsyncIterator[bytes],
+    csv_quoting: bool = False,
+    max_record_chars: int = MAX_RECORD_CHARS
+) -> AsyncIterator[Tuple[int, Union[str, OversizedRecord]]]:
+    """Split a streamed request body into (line_number, record) pairs.
+
+    Only the current record is buffered, so memory does not depend on the
+    body size. With `csv_quoting`, physical lines are joined while a quoted
+    field is still open, so a CSV record with embedded newlines comes out as
+    one record numbered by the line it starts on. Quote parity is tracked
+    per line as it arrives. A record that grows past `max_record_chars`
+    (typically one stray quote swallowing the rest of the file) comes out
+    as an OversizedRecord for its first line, and the lines buffered after
+    that one are parsed again on their own.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    line_number = 0
+    # Physical lines of a CSV record whose quoted field is still open
+    pending: List[Tuple[int, str]] = []
+    pending_chars = 0
+    # The current physical line outgrew the limit; drop it up to its newline
+    overlong = False
+
+    def feed(number: int, line: str) -> Iterator[Tuple[int, Union[str, OversizedRecord]]]:
+        nonlocal pending_chars
+        if not csv_quoting:
+            yield number, line
+            return
+        odd = line.count('"') % 2
+        if not pending and not odd:
+            yield number, line
+            return
+        pending.append((number, line))
+        pending_chars += len(line) + 1
+        if pending_chars > max_record_chars:
+            yield from overflow()
+        elif odd and len(pending) > 1:
+            # This line closes the field the first one opened
+            record = "\n".join(text for _, text in pending)
+            first = pending[0][0]
+            pending.clear()
+            pending_chars = 0
+            yield first, record
+
+    def overflow() -> Iterator[Tuple[int, Union[str, OversizedRecord]]]:
+        # The lines after the first one held no closing quote, so each is
+        # a record of its own
+        nonlocal pending_chars
+        (first, _), *rest = pending
+        pending.clear()
+        pending_chars = 0
+        yield first, OversizedRecord(max_record_chars)
+        for number, line in rest:
+            yield from feed(number, line)
+
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            line_number += 1
+            if overlong:
+                overlong = False
+                if pending:
+                    for record in overflow():
+                        yield record
+                yield line_number, OversizedRecord(max_record_chars)
+                continue
+            for record in feed(line_number, line.rstrip("\r")):
+                yield record
+        if len(buffer) > max_record_chars:
+            overlong = True
+            buffer = ""
+
+    buffer += decoder.decode(b"", final=True)
+    if overlong:
+        line_number += 1
+        if pending:
+            for record in overflow():
+                yield record
+        yield line_number, OversizedRecord(max_record_chars)
+    elif buffer:
+        line_number += 1
+        for record in feed(line_number, buffer.rstrip("\r")):
+            yield record
+    if pending:
+        # Unterminated quote at the end of the body; the CSV parser reports it
+        yield pending[0][0], "\n".join(text for _, text in pending)
+
+
+def _format_validation_error(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}"
+        for error in exc.errors()
+    )
+
+
+_DEFAULTED_FIELDS = {name for name, field in SweetCreate.model_fields.items() if not field.is_required()}
+
+
+def parse_csv_header(record: str) -> List[str]:
+    return [name.strip() for name in next(csv.reader([record]))]
+
+
+def parse_records(
+    records: Iterable[Tuple[int, Union[str, OversizedRecord]]],
+    header: Optional[List[str]] = None
+) -> Tuple[List[dict], List[dict]]:
+    """Validate a chunk of records against SweetCreate.
+
+    Records are CSV rows when `header` is given, NDJSON objects otherwise.
+    Returns (valid rows ready for INSERT, per-row errors).
+    """
+    rows = []
+    errors = []
+    for line, record in records:
+        if isinstance(record, OversizedRecord):
+            errors.append({"line": line, "error": str(record)})
+            continue
+        if not record.strip():
+            continue
+        try:
+            if header is not None:
+                values = next(csv.reader([record]))
+                if len(values) != len(header):
+                    raise ValueError(f"expected {len(header)} columns, got {len(values)}")
+                # An empty cell is null, or missing where the field has a default
+                data = {
+                    name: (value if value != "" else None)
+                    for name, value in zip(header, values)
+                    if value != "" or name not in _DEFAULTED_FIELDS
+                }
+            else:
+                data = json.loads(record)
+            rows.append(SweetCreate.model_validate(data).model_dump())
+        except ValidationError as exc:
+            errors.append({"line": line, "error": _format_validation_error(exc)})
+        except (ValueError, TypeError, csv.Error) as exc:
+            errors.append({"line": line, "error": str(exc)})
+    return rows, errors
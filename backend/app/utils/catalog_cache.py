@@ -0,0 +1,94 @@
+import hashlib
+import threading
+from typing import Dict, Hashable, NamedTuple, Optional
+
+from fastapi import Response, status
+
+from ..config import settings
+from .cache import TTLCache
+
+JSON_MEDIA_TYPE = "application/json"
+# Authenticated data: browsers may keep it but must revalidate with If-None-Match
+CACHE_CONTROL = "private, no-cache"
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    headers: Dict[str, str]
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag derived from the response bytes"""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches `etag` (weak comparison, per RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+
+class CatalogCache:
+    """Pre-serialized catalog responses, invalidated by a catalog version counter.
+
+    Entries are keyed by (version, key). Every write to the catalog calls
+    `bump()` after committing, which makes all older entries unreachable at
+    once; they age out of the underlying LRU. Readers must capture `version`
+    before querying, so a response built from pre-write rows is never stored
+    under the post-write version.
+
+    The counter is per process: other workers' writes bump it through the
+    invalidation bus, and the TTL bounds how long they go unseen if the bus
+    is off.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.version = 0
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def bump(self) -> int:
+        with self._lock:
+            self.version += 1
+            return self.version
+
+    def get(self, version: int, key: Hashable) -> Optional[CachedResponse]:
+        return self.entries.get((version, key))
+
+    def store(
+        self,
+        version: int,
+        key: Hashable,
+        body: bytes,
+        headers: Optional[Dict[str, str]] = None
+    ) -> CachedResponse:
+        entry = CachedResponse(body, make_etag(body), headers or {})
+        self.entries.set((version, key), entry)
+        return entry
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        return {"version": self.version, **self.entries.stats()}
+
+
+def cached_response(entry: CachedResponse, if_none_match: Optional[str]) -> Response:
+    """200 with the cached body, or 304 if the client already has it"""
+    headers = {"ETag": entry.etag, "Cache-Control": CACHE_CONTROL, **entry.headers}
+    if etag_matches(if_none_match, entry.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=entry.body, media_type=JSON_MEDIA_TYPE, headers=headers)
+
+
+catalog_cache = CatalogCache(
+    maxsize=settings.CATALOG_CACHE_SIZE,
+    ttl=settings.CATALOG_CACHE_TTL_SECONDS
+)
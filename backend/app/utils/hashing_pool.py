@@ -0,0 +1,88 @@
+import asyncio
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import settings
+from .passwords import get_password_hash, verify_password
+
+
+class PasswordHashingPool:
+    """Runs bcrypt hash/verify in a dedicated process pool with admission control.
+
+    bcrypt holds a core for 100-300 ms per call; on Starlette's shared
+    threadpool a burst of logins starves every other sync endpoint. A
+    separate pool keeps that work off the request threads and spreads it
+    across cores. At most `max_pending` operations may be queued or running;
+    beyond that callers get 503 with Retry-After instead of waiting.
+
+    With `workers=0` the work runs on the default threadpool (useful where
+    spawning processes is undesirable), still subject to admission control.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: workers only import app.utils.passwords, and forking a
+                # process that already runs threads is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many authentication requests, please retry shortly",
+                    headers={"Retry-After": "1"},
+                )
+            self.pending += 1
+        try:
+            if self.workers <= 0:
+                return await run_in_threadpool(fn, *args)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_workers = settings.PASSWORD_HASH_WORKERS
+if _workers is None:
+    _workers = os.cpu_count() or 1
+
+password_pool = PasswordHashingPool(
+    workers=_workers,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING or 8 * max(_workers, 1),
+)
+atexit.register(password_pool.shutdown)
@@ -0,0 +1,82 @@
+import asyncio
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import settings
+from .catalog_cache import catalog_cache
+from .imaging import generate_variants
+from .invalidation_bus import CATALOG_TOPIC, invalidation_bus
+
+logger = logging.getLogger(__name__)
+
+
+class ImageVariantPool:
+    """Generates image variants in a dedicated process pool.
+
+    Decoding and resizing images is CPU-bound and can take hundreds of
+    milliseconds for a large photo, so it runs outside the server process
+    instead of on the event loop or the request threadpool. With `workers=0`
+    the work runs on the default threadpool instead.
+    """
+
+    def __init__(self, workers: int, widths: Sequence[int]):
+        self.workers = workers
+        self.widths = tuple(widths)
+        self.completed = 0
+        self.failed = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: workers only import app.utils.imaging (Pillow), and
+                # forking a process that already runs threads is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    async def generate(self, image_path: Path, url_prefix: str) -> List[dict]:
+        """Create the variants of `image_path` and return their descriptions"""
+        args = (str(image_path), self.widths, url_prefix)
+        if self.workers <= 0:
+            return await run_in_threadpool(generate_variants, *args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), generate_variants, *args)
+
+    async def generate_in_background(self, image_path: Path, url_prefix: str) -> None:
+        """BackgroundTasks entry point: generate variants, logging instead of raising"""
+        try:
+            await self.generate(image_path, url_prefix)
+        except Exception:
+            self.failed += 1
+            logger.exception("Generating variants for %s failed", image_path)
+            return
+        self.completed += 1
+        # Cached catalog responses may list this image without its variants
+        catalog_cache.bump()
+        invalidation_bus.publish(CATALOG_TOPIC, [])
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_workers = settings.IMAGE_VARIANT_WORKERS
+if _workers is None:
+    _workers = os.cpu_count() or 1
+
+image_pool = ImageVariantPool(workers=_workers, widths=settings.IMAGE_VARIANT_WIDTHS)
+atexit.register(image_pool.shutdown)
@@ -0,0 +1,89 @@
+"""
+Image derivative generation.
+
+Runs inside worker processes, so it only depends on Pillow and the standard
+library (no app settings or database imports).
+"""
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import List, Sequence
+
+from PIL import Image, ImageOps
+
+MANIFEST_SUFFIX = ".variants.json"
+
+# Resized copies keep the original's format, except GIF (first frame only) which becomes PNG
+_THUMBNAIL_FORMATS = {".jpg": ("JPEG", ".jpg"), ".png": ("PNG", ".png"), ".gif": ("PNG", ".png")}
+
+
+def manifest_path(image_path: Path) -> Path:
+    """Where the variant list for `image_path` is recorded"""
+    return image_path.with_name(image_path.stem + MANIFEST_SUFFIX)
+
+
+def variant_name(image_path: Path, width: int, extension: str) -> str:
+    return f"{image_path.stem}-{width}w{extension}"
+
+
+def _save_atomic(image: Image.Image, path: Path, image_format: str, **options) -> None:
+    temp_path = path.with_name(f".{uuid.uuid4().hex}.part")
+    try:
+        image.save(temp_path, format=image_format, **options)
+        os.replace(temp_path, path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+
+def _write_manifest(path: Path, variants: list) -> None:
+    temp_path = path.with_name(f".{uuid.uuid4().hex}.part")
+    temp_path.write_text(json.dumps(variants))
+    os.replace(temp_path, path)
+
+
+def generate_variants(image_path: str, widths: Sequence[int], url_prefix: str) -> List[dict]:
+    """Write resized copies of an image next to it and return their descriptions.
+
+    For each configured width smaller than the image, writes a WebP and (for
+    JPEG/PNG/GIF originals) a same-format thumbnail, then records them in
+    the manifest file, which is written last so its presence means every
+    variant is complete. Returns a list of ``{"width", "url", "webp_url"}``
+    dicts, smallest first, with URLs under `url_prefix`. Already generated
+    images are left alone, so the job is safe to repeat.
+    """
+    path = Path(image_path)
+    manifest = manifest_path(path)
+    if manifest.exists():
+        return json.loads(manifest.read_text())
+
+    thumbnail_format = _THUMBNAIL_FORMATS.get(path.suffix.lower())
+    variants = []
+    with Image.open(path) as original:
+        original.seek(0)
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+        for width in sorted(set(widths)):
+            if width >= image.width:
+                continue
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS)
+
+            webp_name = variant_name(path, width, ".webp")
+            _save_atomic(resized, path.with_name(webp_name), "WEBP", quality=80, method=4)
+            url_name = webp_name
+            if thumbnail_format is not None:
+                image_format, extension = thumbnail_format
+                url_name = variant_name(path, width, extension)
+                thumbnail = resized.convert("RGB") if image_format == "JPEG" else resized
+                _save_atomic(thumbnail, path.with_name(url_name), image_format, optimize=True, quality=85)
+            variants.append({
+                "width": width,
+                "url": f"{url_prefix}/{url_name}",
+                "webp_url": f"{url_prefix}/{webp_name}",
+            })
+
+    _write_manifest(manifest, variants)
+    return variants
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import orjson
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Topics published by the app
+CATALOG_TOPIC = "catalog"
+STREAM_RESET_TOPIC = "stream_reset"
+USER_TOPIC = "user"
+TOKEN_REVOKED_TOPIC = "token_revoked"
+UPLOAD_DELETED_TOPIC = "upload_deleted"
+
+_SCHEMA = """CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    origin TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    payload BLOB
+)"""
+
+
+class InvalidationBus:
+    """Tells the other worker processes which cached data changed.
+
+    Every worker keeps its own caches (catalog responses, user snapshots,
+    upload lookups, stream deltas). After a write, the worker that made it
+    publishes (topic, payload) here, and every other worker hands the
+    payload to the handlers it subscribed to that topic.
+
+    The bus is a small SQLite file shared by the workers on one host, so no
+    broker is needed. `publish` only appends to an in-memory outbox and is
+    safe from any thread; `run` flushes the outbox and reads the other
+    workers' events every `poll_interval` seconds, so changes reach the
+    other workers within about that long. AUTOINCREMENT ids are never
+    reused, so each worker reads from a cursor. Events older than
+    `retention` seconds are pruned; a worker that fell further behind
+    (suspended, say) runs its `on_gap` callbacks instead, which should drop
+    everything cached.
+
+    With no `path` the bus is off and `publish` does nothing.
+    """
+
+    def __init__(self, path: Optional[str], poll_interval: float, retention: float = 60):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.origin = f"{os.getpid()}-{os.urandom(4).hex()}"
+        self.handlers: Dict[str, List[Callable[[Any], None]]] = {}
+        self.on_gap: List[Callable[[], None]] = []
+        self.published = 0
+        self.received = 0
+        self.gaps = 0
+        self._outbox: List[Tuple[str, bytes]] = []
+        self._outbox_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._cursor = 0
+        self._pruned_at = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def subscribe(self, topic: str, handler: Callable[[Any], None]) -> None:
+        self.handlers.setdefault(topic, []).append(handler)
+
+    def publish(self, topic: str, payload: Any = None) -> None:
+        """Queue an event for the other workers (JSON-serializable payload)"""
+        if self.path is None:
+            return
+        with self._outbox_lock:
+            self._outbox.append((topic, orjson.dumps(payload)))
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # Events are only useful while the workers run: durability buys nothing
+        connection.execute("PRAGMA synchronous=OFF")
+        connection.execute(_SCHEMA)
+        return connection
+
+    def sync(self, now: Optional[float] = None) -> Tuple[List[Tuple[str, Any]], bool]:
+        """Flush the outbox and fetch other workers' new events (blocking).
+
+        Returns ([(topic, payload)], whether events were missed).
+        """
+        now = time.time() if now is None else now
+        with self._sync_lock:
+            if self._connection is None:
+                self._connection = self._connect()
+                # Start from now: earlier events describe caches this worker never had
+                self._cursor = self._last_id()
+            connection = self._connection
+
+            with self._outbox_lock:
+                outbox, self._outbox = self._outbox, []
+            prune = now - self._pruned_at >= self.retention / 4
+            if outbox or prune:
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    connection.executemany(
+                        "INSERT INTO events (ts, origin, topic, payload) VALUES (?, ?, ?, ?)",
+                        [(now, self.origin, topic, payload) for topic, payload in outbox]
+                    )
+                    if prune:
+                        connection.execute("DELETE FROM events WHERE ts < ?", (now - self.retention,))
+                    connection.execute("COMMIT")
+                except BaseException:
+                    connection.execute("ROLLBACK")
+                    with self._outbox_lock:
+                        self._outbox[:0] = outbox
+                    raise
+                if prune:
+                    self._pruned_at = now
+                self.published += len(outbox)
+
+            # One snapshot for both reads, or an event committed in between
+            # would be skipped
+            connection.execute("BEGIN")
+            try:
+                rows = connection.execute(
+                    "SELECT id, origin, topic, payload FROM events WHERE id > ? ORDER BY id", (self._cursor,)
+                ).fetchall()
+                last_id = rows[-1][0] if rows else self._last_id()
+            finally:
+                connection.execute("COMMIT")
+            # Ids are contiguous, so a hole right after the cursor was pruned unread
+            missed = last_id > self._cursor and (not rows or rows[0][0] != self._cursor + 1)
+            self._cursor = max(self._cursor, last_id)
+
+        events = [(topic, orjson.loads(payload)) for _, origin, topic, payload in rows if origin != self.origin]
+        self.received += len(events)
+        return events, missed
+
+    def _last_id(self) -> int:
+        row = self._connection.execute("SELECT seq FROM sqlite_sequence WHERE name = 'events'").fetchone()
+        return row[0] if row else 0
+
+    def dispatch(self, events: List[Tuple[str, Any]], missed: bool) -> None:
+        """Apply fetched events with the subscribed handlers (on the event loop)"""
+        if missed:
+            self.gaps += 1
+            logger.warning("Missed cache invalidation events; dropping local caches")
+            for callback in self.on_gap:
+                callback()
+        for topic, payload in events:
+            for handler in self.handlers.get(topic, ()):
+                try:
+                    handler(payload)
+                except Exception:
+                    logger.exception("Invalidation handler for %r failed", topic)
+
+    async def run(self) -> None:
+        """Exchange events every `poll_interval` seconds until cancelled"""
+        while True:
+            try:
+                self.dispatch(*await run_in_threadpool(self.sync))
+            except Exception:
+                logger.exception("Syncing the invalidation bus failed")
+            await asyncio.sleep(self.poll_interval)
+
+    def close(self) -> None:
+        """Send whatever is still queued, then close the connection"""
+        if self._outbox:
+            try:
+                self.sync()
+            except Exception:
+                logger.exception("Flushing the invalidation bus failed")
+        with self._sync_lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def stats(self) -> dict:
+        return {"published": self.published, "received": self.received, "gaps": self.gaps}
+
+
+invalidation_bus = InvalidationBus(
+    settings.INVALIDATION_BUS_PATH,
+    poll_interval=settings.INVALIDATION_BUS_POLL_SECONDS
+)
@@ -0,0 +1,299 @@
+import bisect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import fastapi.routing
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# (name, type, help, [(labels, value)]) as returned by Metrics.collectors
+MetricFamily = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+class RequestStats:
+    """Where one request's time went, filled in while it runs.
+
+    `db_seconds` and `queries` cover every statement the request's code
+    executes, on any thread it hands work to; `stages` holds time spent in
+    sections wrapped with `timed` (auth, serialize).
+    """
+
+    __slots__ = ("start", "queries", "db_seconds", "stages")
+
+    def __init__(self, start: float):
+        self.start = start
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.stages: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def server_timing(self, now: float) -> str:
+        """Server-Timing header value (durations in ms)"""
+        parts = [f'db;dur={self.db_seconds * 1000:.2f};desc="{self.queries} queries"']
+        parts += [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in self.stages.items()]
+        parts.append(f"total;dur={(now - self.start) * 1000:.2f}")
+        return ", ".join(parts)
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Add the time spent in the block to the current request's `stage`"""
+    stats = _request_stats.get()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add(stage, time.perf_counter() - start)
+
+
+def timed_stage(stage: str) -> Callable:
+    """Decorator form of `timed` for sync functions"""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            stats = _request_stats.get()
+            if stats is None:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                stats.add(stage, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _request_stats.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _request_stats.get()
+    if stats is not None and conn.info.get("query_started"):
+        stats.db_seconds += time.perf_counter() - conn.info["query_started"].pop()
+        stats.queries += 1
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    started = exception_context.connection is not None and exception_context.connection.info.get("query_started")
+    if started and _request_stats.get() is not None:
+        started.pop()
+
+
+def instrument_response_serialization() -> None:
+    """Time FastAPI's response_model validation and encoding as the "serialize" stage.
+
+    FastAPI has no hook around it short of OpenTelemetry, so this wraps the
+    module-level `fastapi.routing.serialize_response` that route handlers
+    call. Idempotent; a no-op on FastAPI versions without that function.
+    """
+    original = getattr(fastapi.routing, "serialize_response", None)
+    if original is None or getattr(original, "_timed", False):
+        return
+
+    @wraps(original)
+    async def serialize_response(*args, **kwargs):
+        stats = _request_stats.get()
+        if stats is None:
+            return await original(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return await original(*args, **kwargs)
+        finally:
+            stats.add("serialize", time.perf_counter() - start)
+
+    serialize_response._timed = True
+    fastapi.routing.serialize_response = serialize_response
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Prometheus histogram with fixed buckets, one series per label tuple"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, value: float) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def count(self, labels: tuple) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {total}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Metrics:
+    """Per-route request histograms plus whatever `collectors` report.
+
+    Observations come from `MetricsMiddleware` on the event loop, and so
+    does rendering, so nothing here locks. Numbers are per worker process.
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        self.duration = Histogram(
+            "http_request_duration_seconds", "Time to serve a request, by route template",
+            ("method", "route", "status"), LATENCY_BUCKETS
+        )
+        self.db_time = Histogram(
+            "http_request_db_seconds", "Statement execution time per request",
+            ("method", "route"), LATENCY_BUCKETS
+        )
+        self.db_queries = Histogram(
+            "http_request_db_queries", "Statements executed per request",
+            ("method", "route"), QUERY_COUNT_BUCKETS
+        )
+        self.serialize_time = Histogram(
+            "http_request_serialize_seconds", "Response validation and encoding time per request",
+            ("method", "route"), LATENCY_BUCKETS
+        )
+        self.auth_time = Histogram(
+            "http_request_auth_seconds", "Token decoding and user lookup time per request (DB time excluded)",
+            ("method", "route"), LATENCY_BUCKETS
+        )
+        self.collectors: List[Callable[[], Iterable[MetricFamily]]] = []
+
+    def observe(self, method: str, route: str, status: int, seconds: float, stats: RequestStats) -> None:
+        labels = (method, route)
+        self.duration.observe((method, route, str(status)), seconds)
+        self.db_time.observe(labels, stats.db_seconds)
+        self.db_queries.observe(labels, stats.queries)
+        self.serialize_time.observe(labels, stats.stages.get("serialize", 0.0))
+        self.auth_time.observe(labels, stats.stages.get("auth", 0.0))
+
+    def render(self) -> bytes:
+        lines = [
+            "# HELP http_requests_in_flight Requests being served",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+        ]
+        for histogram in (self.duration, self.db_time, self.db_queries, self.serialize_time, self.auth_time):
+            lines.extend(histogram.render())
+        for collect in self.collectors:
+            for name, kind, documentation, samples in collect():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {value}")
+        return ("\n".join(lines) + "\n").encode()
+
+
+def route_label(scope) -> str:
+    """Route template that served `scope` (e.g. /api/sweets/{sweet_id}), so ids don't explode the label set"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request.
+
+    Each request gets a `RequestStats` in a context variable, which the
+    SQLAlchemy listeners and `timed` sections fill in. The response carries
+    the breakdown in a Server-Timing header (as far as it is known when the
+    headers go out), and the totals are recorded per route when it ends.
+    Event streams are left out of the histograms, since their duration is
+    just how long the client stayed. With a `profiler`, requests slower than
+    its threshold leave a stack sample dump behind.
+    """
+
+    def __init__(self, app, metrics: Metrics, profiler=None):
+        self.app = app
+        self.metrics = metrics
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(time.perf_counter())
+        token = _request_stats.set(stats)
+        status = 500
+        streaming = False
+
+        async def send_with_timing(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", ()))
+                streaming = any(
+                    name.lower() == b"content-type" and value.startswith(b"text/event-stream")
+                    for name, value in headers
+                )
+                headers.append((b"server-timing", stats.server_timing(time.perf_counter()).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        self.metrics.in_flight += 1
+        if self.profiler is not None:
+            self.profiler.request_started()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stats.reset(token)
+            self.metrics.in_flight -= 1
+            end = time.perf_counter()
+            route = route_label(scope)
+            if not streaming:
+                self.metrics.observe(scope["method"], route, status, end - stats.start, stats)
+            if self.profiler is not None:
+                await self.profiler.request_finished(
+                    stats.start, end, f"{scope['method']} {route}", slow=not streaming
+                )
+
+
+metrics = Metrics()
@@ -0,0 +1,21 @@
+"""
+Password hashing primitives.
+
+Kept free of app imports so worker processes in the hashing pool can load
+this module without pulling in settings, the database engine or FastAPI.
+"""
+from passlib.context import CryptContext
+
+# Password hashing context
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def get_password_hash(password: str) -> str:
+    # bcrypt only uses first 72 bytes
+    if len(password.encode("utf-8")) > 72:
+        password = password.encode("utf-8")[:72].decode("utf-8", errors="ignore")
+    return pwd_context.hash(password)
@@ -0,0 +1,145 @@
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# Leaf frames of threads that are just waiting for work
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+}
+
+
+class SlowRequestProfiler:
+    """Sampling profiler that keeps the stacks behind slow requests.
+
+    While any request is in flight, a background thread records every
+    thread's Python stack each `interval` seconds into a bounded ring (about
+    `max_samples` ticks). When a request takes at least `threshold` seconds,
+    the samples taken during it are written to `directory` in the collapsed
+    stack format that flamegraph.pl, speedscope and inferno read: one
+    ``thread;outer;...;inner count`` line per distinct stack.
+
+    Samples are process-wide, so a dump also shows whatever else ran
+    concurrently. Threads waiting for work are skipped, but a thread
+    blocked inside a C call (a socket read, say) shows its Python caller as
+    the innermost frame. Only the newest `max_files` dumps are kept.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        interval: float,
+        directory: str,
+        max_files: int = 100,
+        max_samples: int = 20000
+    ):
+        self.threshold = threshold
+        self.interval = interval
+        self.directory = Path(directory)
+        self.max_files = max_files
+        self.dumps = 0
+        self._in_flight = 0
+        self._active = threading.Event()
+        self._samples: Deque[Tuple[float, Tuple[str, ...]]] = deque(maxlen=max_samples)
+        self._samples_lock = threading.Lock()
+        self._labels: Dict[object, str] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def request_started(self) -> None:
+        self._in_flight += 1
+        self._active.set()
+        if self._thread is None:
+            with self._thread_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+                    self._thread.start()
+
+    async def request_finished(self, start: float, end: float, label: str, slow: bool = True) -> Optional[Path]:
+        """Call when a request ends; dumps its samples if it was slow"""
+        self._in_flight -= 1
+        if not self._in_flight:
+            self._active.clear()
+        if not slow or end - start < self.threshold:
+            return None
+        return await run_in_threadpool(self.dump, start, end, label)
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while True:
+            self._active.wait()
+            now = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = tuple(
+                stack
+                for thread_id, frame in sys._current_frames().items()
+                if thread_id != own_id
+                for stack in (self._collapse(names.get(thread_id, str(thread_id)), frame),)
+                if stack is not None
+            )
+            with self._samples_lock:
+                self._samples.append((now, stacks))
+            time.sleep(self.interval)
+
+    def _frame_label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            path = Path(code.co_filename)
+            where = "/".join(path.parts[-2:])
+            label = f"{getattr(code, 'co_qualname', code.co_name)} ({where}:{code.co_firstlineno})"
+            # ';' separates frames in the collapsed format
+            label = self._labels[code] = label.replace(";", ",")
+        return label
+
+    def _collapse(self, thread_name: str, frame) -> Optional[str]:
+        leaf = frame.f_code
+        if (os.path.basename(leaf.co_filename), leaf.co_name) in _IDLE_LEAVES:
+            return None
+        frames: List[str] = []
+        while frame is not None:
+            frames.append(self._frame_label(frame.f_code))
+            frame = frame.f_back
+        frames.append(thread_name.replace(";", ","))
+        frames.reverse()
+        return ";".join(frames)
+
+    def collapsed(self, start: float, end: float) -> Counter:
+        """Distinct stacks sampled between `start` and `end` (perf_counter), with counts"""
+        with self._samples_lock:
+            samples = list(self._samples)
+        counts = Counter()
+        for ts, stacks in samples:
+            if start <= ts <= end:
+                counts.update(stacks)
+        return counts
+
+    def dump(self, start: float, end: float, label: str) -> Optional[Path]:
+        """Write the samples taken during a request; returns the file, if any were taken"""
+        counts = self.collapsed(start, end)
+        if not counts:
+            return None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", label).strip("_")
+        path = self.directory / f"{time.time():.3f}-{slug}-{(end - start) * 1000:.0f}ms.folded"
+        path.write_text("".join(f"{stack} {count}\n" for stack, count in counts.most_common()))
+        self.dumps += 1
+        self._prune()
+        logger.info("Slow request %s took %.0f ms; stack samples in %s", label, (end - start) * 1000, path)
+        return path
+
+    def _prune(self) -> None:
+        dumps = sorted(self.directory.glob("*.folded"), key=lambda path: path.stat().st_mtime)
+        for path in dumps[:max(0, len(dumps) - self.max_files)]:
+            path.unlink(missing_ok=True)
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import case, func, literal, select, union_all, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models import (
+    MOVEMENT_PURCHASE,
+    MOVEMENT_RESTOCK,
+    ROLLUP_ALL_TIME,
+    ROLLUP_BUCKET_SIZES,
+    RollupWatermark,
+    SalesRollup,
+    StockMovement,
+    Sweet,
+)
+
+logger = logging.getLogger(__name__)
+
+SALES_WATERMARK = "sales"
+
+# Summed rollup columns, in the order every rollup-shaped SELECT emits them
+MEASURES = ("orders", "units_sold", "revenue", "units_restocked")
+
+
+def movement_buckets(bucket_size: int, after_id, up_to_id):
+    """SELECT aggregating stock movements with after_id < id <= up_to_id into rollup rows.
+
+    Emits (bucket, sweet_id, category, *MEASURES), grouped by `bucket_size`
+    buckets; the bounds may be SQL expressions. Movements of deleted
+    sweets are filed under an empty category.
+    """
+    purchase = StockMovement.kind == MOVEMENT_PURCHASE
+    restock = StockMovement.kind == MOVEMENT_RESTOCK
+    category = func.coalesce(Sweet.category, "")
+    if bucket_size == ROLLUP_ALL_TIME:
+        bucket = literal(0, SalesRollup.bucket.type)
+        group_by = (StockMovement.sweet_id, category)
+    else:
+        bucket = StockMovement.ts // (bucket_size * 1000) * bucket_size
+        group_by = (bucket, StockMovement.sweet_id, category)
+
+    query = (
+        select(
+            bucket.label("bucket"),
+            StockMovement.sweet_id.label("sweet_id"),
+            category.label("category"),
+            func.sum(case((purchase, 1), else_=0)).label("orders"),
+            func.sum(case((purchase, -StockMovement.delta), else_=0)).label("units_sold"),
+            func.sum(case((purchase, -StockMovement.delta * StockMovement.unit_price), else_=0.0)).label("revenue"),
+            func.sum(case((restock, StockMovement.delta), else_=0)).label("units_restocked"),
+        )
+        .select_from(StockMovement)
+        .outerjoin(Sweet, Sweet.id == StockMovement.sweet_id)
+        .where(StockMovement.id > after_id, StockMovement.id <= up_to_id)
+        .group_by(*group_by)
+    )
+    return query
+
+
+def sales_rows(bucket_size: int, start: Optional[int] = None, end: Optional[int] = None):
+    """Subquery of rollup rows for [start, end) (epoch seconds, bucket aligned).
+
+    Compacted rollups are combined with the movements the compactor has
+    not reached yet, aggregated on the fly, so results are exact while the
+    work stays proportional to buckets x sweets plus a short ledger tail,
+    however long the sales history is. The watermark is read inside the
+    same statement, so a concurrent compaction can't double count.
+    """
+    watermark = (
+        select(RollupWatermark.last_movement_id)
+        .where(RollupWatermark.name == SALES_WATERMARK)
+        .scalar_subquery()
+    )
+    compacted = select(
+        SalesRollup.bucket, SalesRollup.sweet_id, SalesRollup.category,
+        *(getattr(SalesRollup, measure) for measure in MEASURES)
+    ).where(SalesRollup.bucket_size == bucket_size)
+    # Bounding the tail on both sides keeps SQLite on a rowid range; open-ended,
+    # it may walk the whole ledger through an index to save the GROUP BY sort
+    newest = select(func.max(StockMovement.id)).scalar_subquery()
+    tail = movement_buckets(bucket_size, func.coalesce(watermark, 0), newest)
+    if start is not None:
+        compacted = compacted.where(SalesRollup.bucket >= start)
+        tail = tail.where(StockMovement.ts >= start * 1000)
+    if end is not None:
+        compacted = compacted.where(SalesRollup.bucket < end)
+        tail = tail.where(StockMovement.ts < end * 1000)
+    return union_all(compacted, tail).subquery("sales")
+
+
+def _dialect_insert(db: Session):
+    """INSERT construct supporting ON CONFLICT for the session's database"""
+    return postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+
+
+def _upsert_rollups(db: Session, bucket_size: int, rows) -> None:
+    insert = _dialect_insert(db)
+    rows = rows.add_columns(literal(bucket_size).label("bucket_size"))
+    stmt = insert(SalesRollup).from_select(
+        ["bucket", "sweet_id", "category", *MEASURES, "bucket_size"], rows
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["bucket_size", "bucket", "sweet_id", "category"],
+        set_={measure: getattr(SalesRollup, measure) + stmt.excluded[measure] for measure in MEASURES}
+    )
+    db.execute(stmt)
+
+
+class SalesRollupCompactor:
+    """Folds new stock movements into the sales rollups.
+
+    Each batch takes up to `batch_size` movements past the watermark,
+    aggregates them into hour, day and all-time buckets with one
+    INSERT ... SELECT ... ON CONFLICT DO UPDATE per bucket size, and moves
+    the watermark, all in one short write transaction. A batch stops short of any
+    movement younger than `settle_seconds`, so a slow transaction that
+    commits a lower id late (possible with Postgres sequences) is not
+    skipped.
+    """
+
+    def __init__(self, batch_size: int, settle_seconds: float = 2):
+        self.batch_size = batch_size
+        self.settle_seconds = settle_seconds
+        self.movements_compacted = 0
+        self.batches = 0
+        self._lock = threading.Lock()
+
+    def compact_batch(self, db: Session, now: Optional[float] = None) -> bool:
+        """Compact one batch; returns True if more settled movements are waiting"""
+        now = time.time() if now is None else now
+        with self._lock:
+            last_id = db.execute(
+                select(RollupWatermark.last_movement_id).where(RollupWatermark.name == SALES_WATERMARK)
+            ).scalar()
+            if last_id is None:
+                db.execute(
+                    _dialect_insert(db)(RollupWatermark)
+                    .values(name=SALES_WATERMARK, last_movement_id=0)
+                    .on_conflict_do_nothing()
+                )
+                db.commit()
+                last_id = 0
+
+            # Stop at the first unsettled movement: the watermark promises every
+            # id up to it is compacted
+            unsettled = (
+                select(func.min(StockMovement.id))
+                .where(StockMovement.id > last_id, StockMovement.ts > int((now - self.settle_seconds) * 1000))
+                .scalar_subquery()
+            )
+            settled = (
+                select(StockMovement.id)
+                .where(StockMovement.id > last_id)
+                .where((unsettled.is_(None)) | (StockMovement.id < unsettled))
+                .order_by(StockMovement.id)
+                .limit(max(1, self.batch_size))
+                .subquery()
+            )
+            up_to_id, count = db.execute(select(func.max(settled.c.id), func.count())).one()
+            db.rollback()
+            if not count:
+                return False
+
+            # Writing first takes SQLite's write lock before anything else is
+            # read, and the guard makes a concurrent compactor (another
+            # process) lose cleanly instead of folding the batch twice
+            moved = db.execute(
+                update(RollupWatermark)
+                .where(RollupWatermark.name == SALES_WATERMARK, RollupWatermark.last_movement_id == last_id)
+                .values(last_movement_id=up_to_id)
+            ).rowcount
+            if not moved:
+                db.rollback()
+                return True
+            for bucket_size in ROLLUP_BUCKET_SIZES:
+                _upsert_rollups(db, bucket_size, movement_buckets(bucket_size, last_id, up_to_id))
+            db.commit()
+            self.movements_compacted += count
+            self.batches += 1
+            return count == self.batch_size
+
+    def compact(self, db: Session, now: Optional[float] = None) -> None:
+        """Compact until every settled movement is in the rollups"""
+        while self.compact_batch(db, now):
+            pass
+
+    def _compact_with_session(self, session_factory) -> None:
+        db = session_factory()
+        try:
+            self.compact(db)
+        finally:
+            db.close()
+
+    async def run(self, session_factory, interval: float) -> None:
+        """Compact every `interval` seconds until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await run_in_threadpool(self._compact_with_session, session_factory)
+            except Exception:
+                logger.exception("Compacting sales rollups failed")
+
+
+rollup_compactor = SalesRollupCompactor(batch_size=settings.ROLLUP_BATCH_SIZE)
@@ -0,0 +1,80 @@
+from typing import Optional, Tuple
+
+from sqlalchemy import column, func, literal_column, or_, table, text
+
+from ..models import Sweet, SWEETS_FTS_TABLE, SWEETS_SEARCH_DOCUMENT
+
+# Trigram tokens need at least three characters; shorter terms fall back to LIKE
+MIN_TRIGRAM_LENGTH = 3
+
+# bm25 weights for the name, category and description columns
+_BM25_RANK = f"bm25({SWEETS_FTS_TABLE}, 10.0, 5.0, 1.0)"
+
+_fts = table(SWEETS_FTS_TABLE, column("rowid"))
+
+
+def _phrase(term: str) -> str:
+    """Quote `term` as an FTS5 string so user input is never parsed as query syntax"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _contains(term: str, field: Optional[str]):
+    """Case-insensitive substring filter on one column, or on any searchable column"""
+    if field is not None:
+        return getattr(Sweet, field).icontains(term, autoescape=True)
+    return or_(
+        Sweet.name.icontains(term, autoescape=True),
+        Sweet.category.icontains(term, autoescape=True),
+        Sweet.description.icontains(term, autoescape=True),
+    )
+
+
+def apply_text_search(
+    query,
+    dialect: str,
+    q: Optional[str] = None,
+    name: Optional[str] = None,
+    category: Optional[str] = None
+) -> Tuple[object, bool]:
+    """Restrict a Sweet query to rows matching the given text terms.
+
+    `q` matches anywhere in name, category or description; `name` and
+    `category` match within their own column. All are case-insensitive
+    substring matches. On SQLite the terms become one FTS5 MATCH over the
+    trigram index, ranked by bm25 when `q` or `name` is given; on Postgres
+    they are ILIKE filters served by the pg_trgm indexes and ranked by
+    similarity to `q`. Returns the new query and whether it is already
+    ordered by relevance.
+    """
+    terms = [
+        (field, term) for field, term in ((None, q), ("name", name), ("category", category)) if term
+    ]
+    if not terms:
+        return query, False
+
+    if dialect == "sqlite":
+        match = []
+        for field, term in terms:
+            if len(term) < MIN_TRIGRAM_LENGTH:
+                query = query.filter(_contains(term, field))
+            else:
+                match.append(f"{field} : {_phrase(term)}" if field else _phrase(term))
+        if not match:
+            return query, False
+        query = query.join(_fts, _fts.c.rowid == Sweet.id).filter(
+            text(f"{SWEETS_FTS_TABLE} MATCH :fts_query").bindparams(fts_query=" AND ".join(match))
+        )
+        if not (q or name):
+            # A category filter alone has nothing to rank by
+            return query, False
+        return query.order_by(literal_column(_BM25_RANK), Sweet.id), True
+
+    document = literal_column(SWEETS_SEARCH_DOCUMENT)
+    for field, term in terms:
+        if field is None and dialect == "postgresql":
+            query = query.filter(document.icontains(term, autoescape=True))
+        else:
+            query = query.filter(_contains(term, field))
+    if q and dialect == "postgresql":
+        return query.order_by(func.similarity(document, q).desc(), Sweet.id), True
+    return query, False
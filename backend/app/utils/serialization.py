@@ -0,0 +1,41 @@
+from typing import Iterable, Sequence
+
+import orjson
+from sqlalchemy import select
+
+from ..models import Sweet
+from ..schemas import SweetResponse
+from .metrics import timed_stage
+from .uploads import image_variants
+
+# Columns in SweetResponse field order, so the fast path emits the same JSON
+# documents the response model describes (computed fields are added last)
+SWEET_FIELDS = tuple(SweetResponse.model_fields)
+SWEET_COLUMNS = tuple(getattr(Sweet, field) for field in SWEET_FIELDS)
+
+
+def select_sweet_rows():
+    """SELECT of exactly the SweetResponse columns, returning plain rows.
+
+    Rows skip the ORM identity map and pydantic entirely; pair with
+    `sweet_rows_json` / `sweet_row_json` to build the response bytes.
+    """
+    return select(*SWEET_COLUMNS)
+
+
+def _sweet_document(row: Sequence) -> dict:
+    document = dict(zip(SWEET_FIELDS, row))
+    document["image_variants"] = image_variants(document["image_url"])
+    return document
+
+
+@timed_stage("serialize")
+def sweet_row_json(row: Sequence) -> bytes:
+    """One sweet row as a JSON object"""
+    return orjson.dumps(_sweet_document(row))
+
+
+@timed_stage("serialize")
+def sweet_rows_json(rows: Iterable[Sequence]) -> bytes:
+    """Sweet rows as a JSON array, encoded in one pass into a single buffer"""
+    return orjson.dumps([_sweet_document(row) for row in rows])
@@ -0,0 +1,68 @@
+import logging
+import time
+from typing import Callable, Iterable, List, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+
+class LowStockEvent(NamedTuple):
+    sweet_id: int
+    name: str
+    quantity: int
+    reorder_threshold: int
+    # Epoch seconds
+    ts: float
+
+
+def crossed_reorder_threshold(quantity: int, reorder_threshold: int, sold: int) -> bool:
+    """Whether selling `sold` units just took stock from at or above the threshold to below it"""
+    return quantity < reorder_threshold <= quantity + sold
+
+
+class StockAlerts:
+    """In-process notifier for sweets dropping below their reorder threshold.
+
+    Purchase endpoints publish a `LowStockEvent` after committing a sale
+    that crossed the threshold (once per crossing, not for every later sale
+    while the sweet stays low). Subscribers are plain callables run in
+    order on the event loop, so they must not block: hand slow work to a
+    queue or task. A failing subscriber is logged and skipped.
+    """
+
+    def __init__(self):
+        self.subscribers: List[Callable[[LowStockEvent], None]] = []
+        self.published = 0
+
+    def subscribe(self, callback: Callable[[LowStockEvent], None]) -> Callable[[LowStockEvent], None]:
+        """Register `callback` for future events; returns it, so this works as a decorator"""
+        self.subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback: Callable[[LowStockEvent], None]) -> None:
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def publish(self, events: Iterable[LowStockEvent]) -> None:
+        for event in events:
+            self.published += 1
+            logger.info(
+                "Sweet %s (%s) is below its reorder threshold: %s left, threshold %s",
+                event.sweet_id, event.name, event.quantity, event.reorder_threshold
+            )
+            for callback in list(self.subscribers):
+                try:
+                    callback(event)
+                except Exception:
+                    logger.exception("Low-stock subscriber %r failed", callback)
+
+    def publish_sales(self, sweets: Iterable, sold: dict) -> None:
+        """Publish events for the sold sweets (SweetResponse after the sale) that crossed their threshold"""
+        now = time.time()
+        self.publish(
+            LowStockEvent(sweet.id, sweet.name, sweet.quantity, sweet.reorder_threshold, now)
+            for sweet in sweets
+            if crossed_reorder_threshold(sweet.quantity, sweet.reorder_threshold, sold[sweet.id])
+        )
+
+
+stock_alerts = StockAlerts()
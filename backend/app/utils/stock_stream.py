@@ -0,0 +1,185 @@
+import asyncio
+import os
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+
+import orjson
+
+from ..config import settings
+
+EVENT_STREAM_MEDIA_TYPE = "text/event-stream"
+
+# Sent once per connection; tells EventSource how long to wait before reconnecting
+RETRY_FRAME = b"retry: 3000\n\n"
+HEARTBEAT_FRAME = b": keep-alive\n\n"
+
+
+class StockBroadcaster:
+    """Fans catalog changes out to any number of stream subscribers.
+
+    Instead of a queue per subscriber there is one shared, coalesced change
+    log: for every recently changed sweet it keeps the latest value of each
+    changed field and the sequence number of that change, ordered by last
+    change. A subscriber is just a cursor (the last sequence number it has
+    sent); when it wakes it collects the fields changed past its cursor,
+    so a slow client skips intermediate values and catches up in a single
+    frame, never buffering more than one pending delta per sweet, and an
+    idle one costs no more than its connection.
+
+    The log keeps the `max_tracked` most recently changed sweets. A cursor
+    older than anything evicted (or than a `reset`, for writes too large to
+    describe) can't be served deltas; the subscriber is told to resync from
+    the REST API instead.
+
+    Event ids are ``<epoch>.<seq>``: the epoch is random per broadcaster, so
+    a client resuming on another worker process (or after a restart), where
+    its sequence number means nothing, gets a resync too.
+
+    Publish and subscribe on the event loop; nothing here is thread-safe.
+    """
+
+    def __init__(self, max_tracked: int, max_subscribers: int):
+        self.max_tracked = max_tracked
+        self.max_subscribers = max_subscribers
+        self.epoch = os.urandom(4).hex().encode()
+        self.seq = 0
+        # Changes up to this sequence number may have been dropped
+        self.floor = 0
+        self.subscribers = 0
+        # sweet id -> (sequence of its last change, {field: (sequence, value)})
+        self._changes: "OrderedDict[int, Tuple[int, Dict[str, tuple]]]" = OrderedDict()
+        self._waiters: Set[asyncio.Future] = set()
+        # Encoded frames by cursor, shared by every subscriber at that cursor
+        # until the next publish
+        self._frames: Dict[int, bytes] = {}
+
+    def publish(self, changes: Iterable[Tuple[int, dict]]) -> None:
+        """Record (sweet_id, changed fields) pairs and wake every subscriber.
+
+        A ``{"deleted": True}`` change replaces whatever was known about the
+        sweet; any other change drops an earlier deletion marker.
+        """
+        for sweet_id, fields in changes:
+            self.seq += 1
+            entry = self._changes.pop(sweet_id, None)
+            known = {} if entry is None or fields.get("deleted") else entry[1]
+            known.pop("deleted", None)
+            for name, value in fields.items():
+                known[name] = (self.seq, value)
+            self._changes[sweet_id] = (self.seq, known)
+            if len(self._changes) > self.max_tracked:
+                _, (evicted_seq, _) = self._changes.popitem(last=False)
+                self.floor = max(self.floor, evicted_seq)
+        self._wake()
+
+    def reset(self) -> None:
+        """Forget all deltas, e.g. after a bulk import; every subscriber resyncs"""
+        self.seq += 1
+        self.floor = self.seq
+        self._changes.clear()
+        self._wake()
+
+    def _wake(self) -> None:
+        self._frames = {}
+        waiters, self._waiters = self._waiters, set()
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def changes_since(self, cursor: int) -> Tuple[int, Optional[List[dict]]]:
+        """(new cursor, deltas past `cursor` in change order), or None deltas to resync"""
+        if cursor < self.floor or cursor > self.seq:
+            return self.seq, None
+        deltas = []
+        for sweet_id, (last_seq, fields) in reversed(self._changes.items()):
+            if last_seq <= cursor:
+                break
+            delta = {name: value for name, (seq, value) in fields.items() if seq > cursor}
+            deltas.append({"id": sweet_id, **delta})
+        deltas.reverse()
+        return self.seq, deltas
+
+    def event_id(self, seq: int) -> bytes:
+        return b"%s.%d" % (self.epoch, seq)
+
+    def cursor_for(self, last_event_id: Optional[str]) -> int:
+        """Cursor to resume from after `last_event_id`; -1 (always a resync) if it isn't ours"""
+        if last_event_id is None:
+            return self.seq
+        epoch, _, seq = last_event_id.encode().partition(b".")
+        if epoch != self.epoch or not seq.isdigit():
+            return -1
+        return int(seq)
+
+    def frame_since(self, cursor: int) -> Tuple[int, bytes]:
+        """(new cursor, SSE frame for the changes past `cursor`, empty if there are none)"""
+        frame = self._frames.get(cursor)
+        if frame is None:
+            seq, deltas = self.changes_since(cursor)
+            if deltas is None:
+                frame = event_frame("resync", self.event_id(seq), {})
+            else:
+                frame = event_frame("stock", self.event_id(seq), deltas) if deltas else b""
+            self._frames[cursor] = frame
+        return self.seq, frame
+
+    async def wait(self, cursor: int, timeout: float) -> None:
+        """Return once something is published past `cursor`, or after `timeout` seconds"""
+        if cursor != self.seq:
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._waiters.discard(waiter)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": self.subscribers,
+            "seq": self.seq,
+            "tracked_sweets": len(self._changes),
+        }
+
+
+def event_frame(event: str, event_id: bytes, data) -> bytes:
+    return b"id: %s\nevent: %s\ndata: %s\n\n" % (event_id, event.encode(), orjson.dumps(data))
+
+
+async def stream_frames(
+    broadcaster: StockBroadcaster,
+    last_event_id: Optional[str],
+    heartbeat: float
+) -> AsyncIterator[bytes]:
+    """Server-sent event frames for one subscriber, until the client goes away.
+
+    A fresh connection starts from the current sequence number; one that
+    reconnects with Last-Event-ID receives what it missed in one frame, or
+    a `resync` if that is no longer available (or the id came from another
+    worker). Each later frame is a
+    ``stock`` event carrying a JSON array of per-sweet deltas.
+    """
+    broadcaster.subscribers += 1
+    try:
+        cursor = broadcaster.cursor_for(last_event_id)
+        # An id-only frame sets the client's Last-Event-ID without dispatching anything
+        yield RETRY_FRAME + b"id: %s\n\n" % broadcaster.event_id(broadcaster.seq)
+        while True:
+            cursor, frame = broadcaster.frame_since(cursor)
+            if frame:
+                yield frame
+            await broadcaster.wait(cursor, heartbeat)
+            if cursor == broadcaster.seq:
+                # Idle: comment frames keep proxies from closing the connection
+                # and surface dead clients on the next send
+                yield HEARTBEAT_FRAME
+    finally:
+        broadcaster.subscribers -= 1
+
+
+stock_broadcaster = StockBroadcaster(
+    max_tracked=settings.STREAM_MAX_TRACKED_SWEETS,
+    max_subscribers=settings.STREAM_MAX_SUBSCRIBERS
+)
@@ -0,0 +1,75 @@
+import csv
+import io
+from typing import AsyncIterator, Callable, Sequence
+
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from sqlalchemy.orm import Session
+
+from ..database import close_db
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+CSV_MEDIA_TYPE = "text/csv"
+
+
+async def _partitions(db, statement, batch_size: int):
+    """Yield lists of up to `batch_size` result rows from a server-side cursor.
+
+    Works with a sync Session (each fetch runs on the threadpool) or an
+    AsyncSession (rows come from ``AsyncSession.stream``).
+    """
+    statement = statement.execution_options(yield_per=batch_size)
+    if isinstance(db, Session):
+        result = await run_in_threadpool(db.execute, statement)
+        async for partition in iterate_in_threadpool(result.partitions()):
+            yield partition
+    else:
+        result = await db.stream(statement)
+        async for partition in result.partitions():
+            yield partition
+
+
+async def iter_ndjson(
+    db,
+    statement,
+    serialize: Callable[[object], bytes],
+    batch_size: int = 500
+) -> AsyncIterator[bytes]:
+    """Stream the rows of `statement` as NDJSON, one chunk of `batch_size` rows at a time.
+
+    `serialize` turns one row into a JSON document.
+
+    Rows are pulled from a server-side cursor (``yield_per``), so memory stays
+    bounded by the batch size instead of the table size. The session is closed
+    once the stream is exhausted or the client disconnects.
+    """
+    try:
+        async for partition in _partitions(db, statement, batch_size):
+            yield b"\n".join(serialize(row) for row in partition) + b"\n"
+    finally:
+        await close_db(db)
+
+
+async def iter_csv(
+    db,
+    statement,
+    columns: Sequence[str],
+    batch_size: int = 500
+) -> AsyncIterator[bytes]:
+    """Stream column-tuple results of `statement` as CSV with a header row.
+
+    Same memory profile as `iter_ndjson`: rows come off a server-side cursor
+    and are flushed every `batch_size` rows.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    try:
+        async for partition in _partitions(db, statement, batch_size):
+            writer.writerows(partition)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+    finally:
+        await close_db(db)
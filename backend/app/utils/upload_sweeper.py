@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from itertools import islice
+from typing import Callable, Iterator, List, NamedTuple, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models import Sweet
+from .uploads import ALLOWED_IMAGE_TYPES, SWEET_IMAGES_URL_PREFIX, sweet_images_dir, variants_cache
+
+logger = logging.getLogger(__name__)
+
+# Stored images, their variants and manifest all start with the image's hash
+_CONTENT_HASH_PREFIX = re.compile(r"^[0-9a-f]{64}(?=[-.])")
+
+
+class StoredFile(NamedTuple):
+    name: str
+    size: int
+    mtime: float
+
+
+def referencing_urls(filename: str) -> List[str]:
+    """The image_url values that keep `filename` in use.
+
+    A variant or manifest belongs to the image with the same hash, whatever
+    its extension; older uploads (random names) only match themselves.
+    Temporary dot-files are never referenced.
+    """
+    if filename.startswith("."):
+        return []
+    match = _CONTENT_HASH_PREFIX.match(filename)
+    if match is None:
+        return [f"{SWEET_IMAGES_URL_PREFIX}/{filename}"]
+    return [f"{SWEET_IMAGES_URL_PREFIX}/{match.group()}{extension}" for extension in ALLOWED_IMAGE_TYPES]
+
+
+class UploadSweeper:
+    """Incrementally deletes uploaded files that no sweet references.
+
+    Each call to `sweep_batch` examines the next `batch_size` entries of the
+    upload directory (one directory scan is spread over a whole cycle) and
+    deletes those older than `grace_seconds` whose image is not any sweet's
+    `image_url`. The grace period covers images uploaded but not yet saved
+    on a sweet; re-uploading existing content restarts it. Storage totals
+    are published at the end of each full cycle.
+    """
+
+    def __init__(self, grace_seconds: float, batch_size: int):
+        self.grace_seconds = grace_seconds
+        self.batch_size = batch_size
+        # Called with the filename after each deletion, e.g. to drop caches
+        self.on_delete: List[Callable[[str], None]] = []
+        self.files: Optional[int] = None
+        self.bytes: Optional[int] = None
+        self.cycles = 0
+        self.last_cycle_at: Optional[float] = None
+        self.orphans_reclaimed = 0
+        self.bytes_reclaimed = 0
+        self._scan: Optional[Iterator[StoredFile]] = None
+        self._scan_files = 0
+        self._scan_bytes = 0
+        # Batches hold _sweep_lock; _stats_lock only guards the counters, so
+        # stats() never waits on a batch's file system and database work
+        self._sweep_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def _stored_files(self) -> Iterator[StoredFile]:
+        try:
+            with os.scandir(sweet_images_dir()) as entries:
+                for entry in entries:
+                    try:
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        stat_result = entry.stat(follow_symlinks=False)
+                    except FileNotFoundError:
+                        continue
+                    yield StoredFile(entry.name, stat_result.st_size, stat_result.st_mtime)
+        except FileNotFoundError:
+            return
+
+    def _remove(self, stored: StoredFile, now: float) -> bool:
+        path = sweet_images_dir() / stored.name
+        try:
+            # Re-check right before unlinking in case it was just re-uploaded
+            if now - path.stat().st_mtime < self.grace_seconds:
+                return False
+            path.unlink()
+        except FileNotFoundError:
+            return False
+        variants_cache.pop(f"{SWEET_IMAGES_URL_PREFIX}/{stored.name}")
+        for callback in self.on_delete:
+            callback(stored.name)
+        return True
+
+    def sweep_batch(self, db: Session, now: Optional[float] = None) -> bool:
+        """Examine the next batch of files; returns True when a cycle just finished"""
+        now = time.time() if now is None else now
+        with self._sweep_lock:
+            if self._scan is None:
+                self._scan = self._stored_files()
+            batch_size = max(1, self.batch_size)
+            batch = list(islice(self._scan, batch_size))
+
+            expired = {stored for stored in batch if now - stored.mtime >= self.grace_seconds}
+            urls = {url for stored in expired for url in referencing_urls(stored.name)}
+            referenced = set()
+            if urls:
+                referenced = set(db.execute(select(Sweet.image_url).where(Sweet.image_url.in_(urls))).scalars())
+                db.rollback()
+
+            for stored in batch:
+                orphaned = stored in expired and referenced.isdisjoint(referencing_urls(stored.name))
+                if orphaned and self._remove(stored, now):
+                    with self._stats_lock:
+                        self.orphans_reclaimed += 1
+                        self.bytes_reclaimed += stored.size
+                    logger.info("Deleted unreferenced upload %s", stored.name)
+                else:
+                    self._scan_files += 1
+                    self._scan_bytes += stored.size
+
+            if len(batch) == batch_size:
+                return False
+            with self._stats_lock:
+                self.files, self.bytes = self._scan_files, self._scan_bytes
+                self.cycles += 1
+                self.last_cycle_at = now
+            self._scan, self._scan_files, self._scan_bytes = None, 0, 0
+            return True
+
+    def sweep(self, db: Session, now: Optional[float] = None) -> None:
+        """Run batches until a full pass over the directory completes"""
+        while not self.sweep_batch(db, now):
+            pass
+
+    def _sweep_batch_with_session(self, session_factory) -> None:
+        db = session_factory()
+        try:
+            self.sweep_batch(db)
+        finally:
+            db.close()
+
+    async def run(self, session_factory, interval: float) -> None:
+        """Sweep one batch every `interval` seconds until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await run_in_threadpool(self._sweep_batch_with_session, session_factory)
+            except Exception:
+                logger.exception("Sweeping uploads failed")
+
+    def stats(self) -> dict:
+        """Storage totals as of the last full cycle, and what has been reclaimed"""
+        with self._stats_lock:
+            return {
+                "files": self.files,
+                "bytes": self.bytes,
+                "orphans_reclaimed": self.orphans_reclaimed,
+                "bytes_reclaimed": self.bytes_reclaimed,
+                "cycles": self.cycles,
+                "last_cycle_at": self.last_cycle_at,
+            }
+
+
+upload_sweeper = UploadSweeper(
+    grace_seconds=settings.UPLOAD_ORPHAN_GRACE_SECONDS,
+    batch_size=settings.UPLOAD_SWEEP_BATCH_SIZE
+)
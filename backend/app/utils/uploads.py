@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import List, Optional
+
+import anyio
+from fastapi import HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import settings
+from .cache import TTLCache
+from .imaging import manifest_path
+
+# Bytes read from the upload and written to disk per step
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Public URL prefix the upload directory is mounted under in app.main
+UPLOADS_URL_PREFIX = "/uploads"
+SWEET_IMAGES_SUBDIR = "sweets"
+
+ALLOWED_IMAGE_TYPES = {
+    ".jpg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+}
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """File extension for the image format `head` starts with, judged by magic bytes"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return ".gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+
+# Seconds before an image without variants is checked for them again
+MISSING_VARIANTS_RECHECK_SECONDS = 5
+
+SWEET_IMAGES_URL_PREFIX = f"{UPLOADS_URL_PREFIX}/{SWEET_IMAGES_SUBDIR}"
+
+
+def sweet_images_dir() -> Path:
+    return Path(settings.UPLOAD_DIR) / SWEET_IMAGES_SUBDIR
+
+
+# Variant lists keyed by image URL. Stored images never change (names are
+# content hashes), so a found manifest is cached for the full TTL; a missing
+# one is only remembered briefly while generation may still be running.
+variants_cache = TTLCache(maxsize=10000, ttl=3600)
+
+
+def image_variants(image_url: Optional[str]) -> List[dict]:
+    """Resized copies available for an uploaded image, smallest first.
+
+    Each entry is ``{"width", "url", "webp_url"}``. Empty for images that
+    were not uploaded here, are smaller than every configured width, or
+    whose variants are still being generated.
+    """
+    if not image_url or not image_url.startswith(SWEET_IMAGES_URL_PREFIX + "/"):
+        return []
+    variants = variants_cache.get(image_url)
+    if variants is not None:
+        return variants
+    name = image_url[len(SWEET_IMAGES_URL_PREFIX) + 1:]
+    if "/" in name or "\\" in name or name.startswith("."):
+        return []
+    manifest = manifest_path(sweet_images_dir() / name)
+    try:
+        variants = json.loads(manifest.read_text())
+    except (OSError, ValueError):
+        variants_cache.set(image_url, [], expires_at=time.time() + MISSING_VARIANTS_RECHECK_SECONDS)
+        return []
+    variants_cache.set(image_url, variants)
+    return variants
+
+
+def _discard(path: Path) -> None:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _publish(temp_path: Path, final_path: Path) -> None:
+    """Move a finished upload into place, or drop it if the same content is already stored"""
+    if final_path.exists():
+        try:
+            # Restart the orphan grace period: the caller is about to reference it
+            os.utime(final_path)
+        except FileNotFoundError:
+            pass  # swept in the meantime; store this copy instead
+        else:
+            _discard(temp_path)
+            return
+    # Atomic on POSIX and Windows: readers see the old state or the whole file
+    os.replace(temp_path, final_path)
+
+
+async def save_sweet_image(file: UploadFile, max_bytes: Optional[int] = None) -> Path:
+    """Stream an uploaded image to disk and return where it was stored.
+
+    The upload is copied in UPLOAD_CHUNK_SIZE chunks with file I/O off the
+    event loop, and abandoned with 413 as soon as it exceeds `max_bytes`
+    (default MAX_UPLOAD_BYTES). The format comes from the leading magic
+    bytes, not the client's filename or content type. Data goes to a
+    temporary file that is renamed into place only when complete; the final
+    name is the SHA-256 of the content, so identical images share one file.
+    """
+    if max_bytes is None:
+        max_bytes = settings.MAX_UPLOAD_BYTES
+
+    head = await file.read(UPLOAD_CHUNK_SIZE)
+    extension = sniff_image_type(head)
+    if extension is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid file type. Allowed types: {', '.join(ALLOWED_IMAGE_TYPES)}"
+        )
+
+    upload_dir = sweet_images_dir()
+    await anyio.Path(upload_dir).mkdir(parents=True, exist_ok=True)
+    temp_path = upload_dir / f".{uuid.uuid4().hex}.part"
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with await anyio.open_file(temp_path, "wb") as out:
+            chunk = head
+            while chunk:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"File too large. Maximum size: {max_bytes} bytes"
+                    )
+                digest.update(chunk)
+                await out.write(chunk)
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        filename = f"{digest.hexdigest()}{extension}"
+        await run_in_threadpool(_publish, temp_path, upload_dir / filename)
+    except BaseException:
+        await run_in_threadpool(_discard, temp_path)
+        raise
+
+    return upload_dir / filename
+
+
+def sweet_image_url(path: Path) -> str:
+    return f"{SWEET_IMAGES_URL_PREFIX}/{path.name}"
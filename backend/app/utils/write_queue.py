@@ -0,0 +1,203 @@
+import asyncio
+import atexit
+import contextvars
+import logging
+import queue
+import threading
+from typing import Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session, sessionmaker
+
+from ..config import settings
+from ..database import engine, run_db
+
+logger = logging.getLogger(__name__)
+
+class _Job:
+    __slots__ = ("fn", "args", "loop", "future", "context")
+
+    def __init__(self, fn: Callable, args: tuple, loop, future):
+        self.fn = fn
+        self.args = args
+        self.loop = loop
+        self.future = future
+        # The submitter's context, so per-request instrumentation sees the job's queries
+        self.context = contextvars.copy_context()
+
+    def resolve(self, result=None, error: Optional[BaseException] = None) -> None:
+        try:
+            self.loop.call_soon_threadsafe(_settle, self.future, result, error)
+        except RuntimeError:
+            # The submitter's event loop has closed; nobody is waiting for this result
+            pass
+
+
+def _settle(future, result, error) -> None:
+    # The awaiting request may have been cancelled (client disconnect)
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class WriteQueue:
+    """Funnels short write transactions through one thread and group-commits them.
+
+    SQLite allows a single writer at a time; with many request threads each
+    committing its own purchase, writers queue on the database lock and every
+    commit pays its own fsync. Here a dedicated thread drains up to
+    `max_batch` queued jobs, runs them back to back in one transaction and
+    commits once, so N purchases cost one lock acquisition and one WAL sync.
+
+    A job is ``fn(session, *args)``. It must not commit or roll back, must
+    return plain data (it is read after the commit), and may raise
+    HTTPException only before it has written anything, since the rest of
+    its group is still committed. Any other exception rolls the group back,
+    fails that job and re-runs the others.
+    """
+
+    def __init__(self, session_factory: sessionmaker, max_batch: int = 64):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.commits = 0
+        self.jobs = 0
+        self._queue: "queue.SimpleQueue[Optional[_Job]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    async def submit(self, fn: Callable, *args):
+        """Run ``fn(session, *args)`` in the next group commit and return its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._ensure_started()
+        self._queue.put(_Job(fn, args, loop, future))
+        return await future
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            # Also replaces a writer thread that died, so submissions never wait on nothing
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            batch = [job]
+            while len(batch) < self.max_batch:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    self._commit_group_safely(batch)
+                    return
+                batch.append(job)
+            self._commit_group_safely(batch)
+
+    def _commit_group_safely(self, jobs: List[_Job]) -> None:
+        # One bad group must not take the writer thread (and every later write) with it
+        try:
+            self._commit_group(jobs)
+        except Exception as exc:
+            logger.exception("Write queue group commit failed")
+            for job in jobs:
+                job.resolve(error=exc)
+
+    def _commit_group(self, jobs: List[_Job]) -> None:
+        while jobs:
+            outcomes = []
+            session = self.session_factory()
+            try:
+                for job in jobs:
+                    try:
+                        outcomes.append((job, job.context.run(job.fn, session, *job.args), None))
+                    except HTTPException as exc:
+                        outcomes.append((job, None, exc))
+                session.commit()
+            except Exception as exc:
+                session.rollback()
+                # Drop the job that failed (or all of them if the commit did) and retry the rest
+                failed = jobs[len(outcomes)] if len(outcomes) < len(jobs) else None
+                for job in jobs if failed is None else [failed]:
+                    job.resolve(error=exc)
+                jobs = [] if failed is None else [job for job in jobs if job is not failed]
+                continue
+            finally:
+                session.close()
+            self.commits += 1
+            self.jobs += len(outcomes)
+            for job, result, error in outcomes:
+                job.resolve(result, error)
+            return
+
+    def shutdown(self) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+
+# One queue per engine that opted in via register_write_queue
+_write_queues: Dict[object, WriteQueue] = {}
+
+
+def register_write_queue(engine, max_batch: int = 64) -> WriteQueue:
+    """Route run_write calls for sessions bound to `engine` through a WriteQueue"""
+    write_queue = WriteQueue(
+        sessionmaker(bind=engine, autoflush=False, expire_on_commit=False),
+        max_batch=max_batch
+    )
+    _write_queues[engine] = write_queue
+    return write_queue
+
+
+def unregister_write_queue(engine) -> None:
+    write_queue = _write_queues.pop(engine, None)
+    if write_queue is not None:
+        write_queue.shutdown()
+
+
+def write_queue_stats() -> dict:
+    """Group commits and jobs run so far, over every registered queue"""
+    queues = list(_write_queues.values())
+    return {
+        "commits": sum(write_queue.commits for write_queue in queues),
+        "jobs": sum(write_queue.jobs for write_queue in queues),
+    }
+
+
+def _commit_after(db: Session, fn: Callable, *args):
+    try:
+        result = fn(db, *args)
+    except Exception:
+        db.rollback()
+        raise
+    db.commit()
+    return result
+
+
+async def run_write(db, fn: Callable, *args):
+    """Run the write job ``fn(session, *args)`` in its own committed transaction.
+
+    Sessions bound to an engine with a registered WriteQueue hand the job to
+    its writer thread (group commit); anything else runs it on `db` via
+    run_db and commits, rolling back if it raises.
+    """
+    if isinstance(db, Session):
+        write_queue = _write_queues.get(db.get_bind())
+        if write_queue is not None:
+            return await write_queue.submit(fn, *args)
+    return await run_db(db, _commit_after, fn, *args)
+
+
+if settings.SQLITE_WRITE_QUEUE and engine.dialect.name == "sqlite":
+    atexit.register(
+        register_write_queue(engine, max_batch=settings.SQLITE_WRITE_BATCH_SIZE).shutdown
+    )
@@ -0,0 +1,155 @@
+"""
+Benchmark the analytics endpoints against a large synthetic order history.
+
+Fills the stock_movements ledger with synthetic purchases (plus a restock
+every 50th row) spread over --days days across --sweets sweets, growing it
+through each of the --checkpoints sizes (default up to 10M orders). At each
+checkpoint it times:
+
+  on the fly  the endpoints over a ledger that is never compacted, so
+              every request aggregates all of it (a separate database;
+              --naive-repeat requests, checkpoints up to --naive-max)
+  rollups     the endpoints after utils.rollups has compacted the ledger
+
+and reports p50/p99 latency per endpoint, plus compaction throughput.
+
+    python -m benchmarks.bench_analytics --checkpoints 1000000,10000000
+"""
+import argparse
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from benchmarks.common import override_db, percentile, seed_sweets, seed_user, temp_database
+from app.main import app
+from app.utils.rollups import SalesRollupCompactor
+
+DAY_MS = 86400 * 1000
+
+ENDPOINTS = [
+    ("sweets, all time", "/api/analytics/sweets"),
+    ("sweets, 30 days", "/api/analytics/sweets?start={month_ago}&end={last_day}"),
+    ("categories, all time", "/api/analytics/categories"),
+    ("hourly, 24 hours", "/api/analytics/timeseries?interval=hour&end={end}"),
+    ("daily, 365 days", "/api/analytics/timeseries?interval=day&start={year_ago}&end={end}"),
+]
+
+# One chunk of synthetic ledger rows, generated inside SQLite
+SEED_SQL = text("""
+WITH RECURSIVE seq(n) AS (
+    SELECT :first UNION ALL SELECT n + 1 FROM seq WHERE n < :last
+)
+INSERT INTO stock_movements (ts, sweet_id, user_id, kind, delta, unit_price)
+SELECT
+    :start_ms + n * :step_ms,
+    1 + abs(random()) % :sweets,
+    1 + abs(random()) % 10000,
+    CASE WHEN n % 50 = 0 THEN 2 ELSE 1 END,
+    CASE WHEN n % 50 = 0 THEN 100 ELSE -(1 + abs(random()) % 5) END,
+    0.5 + (abs(random()) % 2000) / 100.0
+FROM seq
+""")
+
+
+def grow_ledger(engine, current: int, target: int, start_ms: int, step_ms: int, sweets: int, chunk: int = 1_000_000):
+    for first in range(current + 1, target + 1, chunk):
+        last = min(first + chunk - 1, target)
+        with engine.begin() as conn:
+            conn.execute(SEED_SQL, {
+                "first": first, "last": last, "start_ms": start_ms, "step_ms": step_ms, "sweets": sweets
+            })
+
+
+def time_endpoints(client, headers, params, repeat: int) -> dict:
+    results = {}
+    for label, path in ENDPOINTS:
+        url = path.format(**params)
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = client.get(url, headers=headers)
+            samples.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, response.text
+        results[label] = samples
+    return results
+
+
+def report(title: str, results: dict):
+    print(f"  {title}")
+    for label, samples in results.items():
+        print(
+            f"    {label:<22} p50 {percentile(samples, 50):9.1f} ms  "
+            f"p99 {percentile(samples, 99):9.1f} ms  ({len(samples)} requests)"
+        )
+
+
+def run(checkpoints, args, compact: bool):
+    """Grow a fresh ledger through `checkpoints`, timing the endpoints at each"""
+    with temp_database() as (engine, session_factory):
+        seed_sweets(engine, args.sweets)
+        headers = seed_user(session_factory, "analyst", is_admin=True)
+        override_db(app, session_factory)
+        compactor = SalesRollupCompactor(batch_size=50_000, settle_seconds=0)
+
+        # History ends now, so "recent" reports cover real data
+        end_ms = int(time.time() * 1000)
+        start_ms = end_ms - args.days * DAY_MS
+        step_ms = max(1, (end_ms - start_ms) // max(checkpoints))
+        params = {
+            "end": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(end_ms / 1000)),
+            "last_day": time.strftime("%Y-%m-%d", time.gmtime(end_ms / 1000)),
+            "month_ago": time.strftime("%Y-%m-%d", time.gmtime(end_ms / 1000 - 29 * 86400)),
+            "year_ago": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(end_ms / 1000 - 364 * 86400)),
+        }
+
+        size = 0
+        with TestClient(app) as client:
+            for target in checkpoints:
+                start = time.perf_counter()
+                grow_ledger(engine, size, target, start_ms, step_ms, args.sweets)
+                added, size = target - size, target
+                print(f"{size:,} orders (seeded {added:,} in {time.perf_counter() - start:.1f} s)")
+                if not compact:
+                    report("on the fly", time_endpoints(client, headers, params, args.naive_repeat))
+                    continue
+
+                db = session_factory()
+                try:
+                    start = time.perf_counter()
+                    before = compactor.movements_compacted
+                    compactor.compact(db)
+                    elapsed = time.perf_counter() - start
+                    compacted = compactor.movements_compacted - before
+                    rollups = db.execute(text("SELECT count(*) FROM sales_rollups")).scalar()
+                finally:
+                    db.close()
+                print(
+                    f"  compacted {compacted:,} movements in {elapsed:.1f} s "
+                    f"({compacted / elapsed:,.0f}/s), {rollups:,} rollup rows"
+                )
+                report("rollups", time_endpoints(client, headers, params, args.repeat))
+        app.dependency_overrides.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checkpoints", default="100000,1000000,10000000")
+    parser.add_argument("--sweets", type=int, default=500)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--naive-repeat", type=int, default=3)
+    parser.add_argument("--naive-max", type=int, default=1_000_000)
+    args = parser.parse_args()
+    checkpoints = sorted(int(size) for size in args.checkpoints.split(","))
+
+    naive = [size for size in checkpoints if size <= args.naive_max]
+    if naive:
+        print("== aggregating the ledger per request (no rollups) ==")
+        run(naive, args, compact=False)
+    print("== served from rollups ==")
+    run(checkpoints, args, compact=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Load test: sync vs. async database mode at high connection counts.
+
+Starts a real uvicorn server once with ASYNC_DB=false (each request's DB work
+runs on the threadpool) and once with ASYNC_DB=true (aiosqlite engine), then
+holds --connections concurrent keep-alive clients open for --seconds. Each
+client loops over a mix of single-sweet reads, catalog pages and purchases.
+Reports throughput, p50/p99 latency and error counts per mode.
+
+    python -m benchmarks.bench_async_db --connections 1000 --seconds 15
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+
+import httpx
+
+from benchmarks.common import (
+    database_url, percentile, running_server, seed_sweets, seed_user, temp_database
+)
+
+
+async def client_loop(client, headers, size, stop_at, latencies, statuses, rng):
+    while time.monotonic() < stop_at:
+        roll = rng.random()
+        sweet_id = rng.randint(1, size)
+        start = time.perf_counter()
+        try:
+            if roll < 0.6:
+                response = await client.get(f"/api/sweets/{sweet_id}", headers=headers)
+            elif roll < 0.9:
+                response = await client.get(f"/api/sweets?limit=20&after={sweet_id}", headers=headers)
+            else:
+                response = await client.post(
+                    f"/api/sweets/{sweet_id}/purchase", json={"quantity": 1}, headers=headers
+                )
+        except httpx.HTTPError as exc:
+            statuses[type(exc).__name__] += 1
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+        statuses[response.status_code] += 1
+
+
+async def load(base_url, headers, size, connections, seconds):
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        latencies = []
+        statuses = Counter()
+        stop_at = time.monotonic() + seconds
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            client_loop(client, headers, size, stop_at, latencies, statuses, random.Random(i))
+            for i in range(connections)
+        ))
+        elapsed = time.perf_counter() - start
+    return latencies, statuses, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--size", type=int, default=10_000, help="Sweets in the catalog")
+    args = parser.parse_args()
+
+    for async_db in ("false", "true"):
+        with temp_database() as (engine, session_factory):
+            seed_sweets(engine, args.size)
+            headers = seed_user(session_factory)
+            env = {"ASYNC_DB": async_db, "PASSWORD_HASH_WORKERS": "0"}
+            with running_server(database_url(engine), env=env) as base_url:
+                latencies, statuses, elapsed = asyncio.run(
+                    load(base_url, headers, args.size, args.connections, args.seconds)
+                )
+        print(
+            f"ASYNC_DB={async_db:<5} | {args.connections} conns | "
+            f"{len(latencies) / elapsed:8.1f} req/s | "
+            f"p50 {percentile(latencies, 50):8.1f} ms | p99 {percentile(latencies, 99):8.1f} ms | "
+            f"statuses {dict(statuses)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Benchmark request throughput with and without the authenticated-user cache.
+
+Issues --requests sequential GET /api/sweets/{id} calls with one token, first
+with the cache disabled (every request looks the user up) and then enabled.
+
+    python -m benchmarks.bench_auth_cache --requests 3000
+"""
+import argparse
+import time
+
+from fastapi.testclient import TestClient
+
+from benchmarks.common import override_db, seed_sweets, seed_user, temp_database
+from app.main import app
+from app.utils.auth import user_cache
+
+
+def measure(client, headers, requests: int) -> float:
+    start = time.perf_counter()
+    for i in range(requests):
+        response = client.get(f"/api/sweets/{i % 100 + 1}", headers=headers)
+        assert response.status_code == 200
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3000)
+    args = parser.parse_args()
+
+    with temp_database() as (engine, session_factory):
+        seed_sweets(engine, 100)
+        headers = seed_user(session_factory)
+        override_db(app, session_factory)
+        configured_size = user_cache.maxsize
+        with TestClient(app) as client:
+            user_cache.maxsize = 0
+            user_cache.clear()
+            uncached = measure(client, headers, args.requests)
+
+            user_cache.maxsize = configured_size
+            user_cache.clear()
+            cached = measure(client, headers, args.requests)
+            stats = user_cache.stats()
+        app.dependency_overrides.clear()
+
+    print(f"cache off: {uncached:8.1f} req/s")
+    print(f"cache on:  {cached:8.1f} req/s ({(cached / uncached - 1) * 100:+.1f}%) | "
+          f"hits {stats['hits']} misses {stats['misses']} hit rate {stats['hit_rate']:.3f}")
+
+
+if __name__ == "__main__":
+    main()
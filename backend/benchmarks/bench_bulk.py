@@ -0,0 +1,77 @@
+"""
+Benchmark POST /api/sweets/bulk and GET /api/sweets/export.
+
+Generates a synthetic CSV body on the fly (never held in memory), streams it
+into the import endpoint, then streams the table back out, reporting elapsed
+time, rows/s and RSS growth for each direction.
+
+    python -m benchmarks.bench_bulk --rows 1000000
+"""
+import argparse
+import gc
+import json
+import random
+
+from benchmarks.common import (
+    CATEGORIES, asgi_request, override_db, rss_mb, seed_user, temp_database, timed
+)
+from app.main import app
+
+
+def csv_body(rows: int, rows_per_chunk: int = 2000, seed: int = 7):
+    rng = random.Random(seed)
+    yield b"name,category,price,quantity,description\n"
+    for start in range(0, rows, rows_per_chunk):
+        yield "".join(
+            f"Sweet {i},{rng.choice(CATEGORIES)},{rng.uniform(0.5, 20):.2f},{rng.randint(0, 500)},"
+            f"\"Synthetic sweet, number {i}\"\n"
+            for i in range(start, min(start + rows_per_chunk, rows))
+        ).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with temp_database() as (engine, session_factory):
+        headers = seed_user(session_factory, is_admin=True)
+        override_db(app, session_factory)
+        peak = {"rss": 0.0}
+
+        gc.collect()
+        start_rss = rss_mb()
+
+        def sampled_body():
+            for count, chunk in enumerate(csv_body(args.rows)):
+                if count % 50 == 0:
+                    peak["rss"] = max(peak["rss"], rss_mb() - start_rss)
+                yield chunk
+
+        (status, _, body), elapsed = timed(
+            asgi_request, app, "POST", "/api/sweets/bulk",
+            {**headers, "Content-Type": "text/csv"}, body=sampled_body(), keep_body=True
+        )
+        result = json.loads(body)
+        assert status == 200, body[:500]
+        print(
+            f"import {result['inserted']} rows ({result['failed']} failed) in {elapsed:6.2f} s "
+            f"= {result['inserted'] / elapsed:9.0f} rows/s | RSS +{peak['rss']:6.1f} MiB"
+        )
+
+        gc.collect()
+        start_rss = rss_mb()
+        peak["rss"] = 0.0
+
+        def sample(_size):
+            peak["rss"] = max(peak["rss"], rss_mb() - start_rss)
+
+        (_, size, _), elapsed = timed(
+            asgi_request, app, "GET", "/api/sweets/export", headers, on_chunk=sample
+        )
+        print(f"export {size / 1e6:6.1f} MB in {elapsed:6.2f} s | RSS +{peak['rss']:6.1f} MiB")
+        app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark GET /api/sweets: keyset pages and NDJSON streaming vs. the full list.
+
+Reports p50/p99 latency and RSS growth for 100-row pages at random cursors,
+the time and server-side RSS growth for streaming the whole catalog as NDJSON,
+and (for sizes up to --full-list-max) the latency of the unpaginated list.
+
+    python -m benchmarks.bench_catalog --sizes 10000 100000 1000000
+"""
+import argparse
+import gc
+import random
+
+from fastapi.testclient import TestClient
+
+from benchmarks.common import (
+    asgi_request, override_db, percentile, rss_mb, seed_sweets, seed_user, temp_database, timed
+)
+from app.main import app
+
+
+def run(size: int, requests: int, page_size: int, full_list_max: int):
+    with temp_database() as (engine, session_factory):
+        seed_sweets(engine, size)
+        headers = seed_user(session_factory)
+        override_db(app, session_factory)
+        rng = random.Random(size)
+        with TestClient(app) as client:
+            gc.collect()
+            rss_before = rss_mb()
+            latencies = []
+            for _ in range(requests):
+                after = rng.randint(0, max(size - page_size, 0))
+                response, elapsed = timed(
+                    client.get, f"/api/sweets?limit={page_size}&after={after}", headers=headers
+                )
+                assert response.status_code == 200
+                latencies.append(elapsed * 1000)
+            page_rss = rss_mb() - rss_before
+
+            gc.collect()
+            start_rss = rss_mb()
+            stream_rss_peak = 0.0
+
+            def sample(_received):
+                nonlocal stream_rss_peak
+                stream_rss_peak = max(stream_rss_peak, rss_mb() - start_rss)
+
+            (_, streamed, _), stream_elapsed = timed(
+                asgi_request, app, "GET", "/api/sweets?format=ndjson", headers, on_chunk=sample
+            )
+
+            full_ms = None
+            if size <= full_list_max:
+                _, elapsed = timed(client.get, "/api/sweets", headers=headers)
+                full_ms = elapsed * 1000
+        app.dependency_overrides.clear()
+
+    print(
+        f"{size:>9} sweets | page p50 {percentile(latencies, 50):7.2f} ms "
+        f"p99 {percentile(latencies, 99):7.2f} ms | page RSS +{page_rss:6.1f} MiB | "
+        f"ndjson {streamed / 1e6:.0f} MB in {stream_elapsed:6.2f} s, RSS +{stream_rss_peak:6.1f} MiB | "
+        f"full list {'%.1f ms' % full_ms if full_ms is not None else 'skipped'}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--full-list-max", type=int, default=100_000)
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.requests, args.page_size, args.full_list_max)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark the catalog response cache under a frontend polling pattern.
+
+Simulated dashboards repeatedly poll GET /api/sweets (the whole catalog, as
+the Dashboard page loads it) and the detail of one sweet, sending back the
+last ETag in If-None-Match as a browser does. Every --write-every polls a
+purchase changes the catalog. Runs with the cache disabled (every poll
+queries and serializes; matching ETags still get 304) and enabled, and
+reports throughput, 304 share and cache hit rate.
+
+    python -m benchmarks.bench_catalog_cache --size 200 --polls 3000
+"""
+import argparse
+import random
+import time
+
+from fastapi.testclient import TestClient
+
+from benchmarks.common import override_db, seed_sweets, seed_user, temp_database
+from app.main import app
+from app.utils.catalog_cache import catalog_cache
+
+
+def measure(client, headers, size: int, polls: int, write_every: int, dashboards: int):
+    rng = random.Random(7)
+    etags = {}
+    not_modified = 0
+    start = time.perf_counter()
+    for i in range(polls):
+        dashboard = i % dashboards
+        if i and i % write_every == 0:
+            response = client.post(
+                f"/api/sweets/{rng.randint(1, size)}/purchase", json={"quantity": 1}, headers=headers
+            )
+            assert response.status_code in (200, 400)
+        path = "/api/sweets" if rng.random() < 0.7 else f"/api/sweets/{rng.randint(1, size)}"
+        key = (dashboard, path)
+        request_headers = dict(headers)
+        if key in etags:
+            request_headers["If-None-Match"] = etags[key]
+        response = client.get(path, headers=request_headers)
+        assert response.status_code in (200, 304)
+        not_modified += response.status_code == 304
+        etags[key] = response.headers["ETag"]
+    return polls / (time.perf_counter() - start), not_modified / polls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=200, help="Sweets in the catalog")
+    parser.add_argument("--polls", type=int, default=3000)
+    parser.add_argument("--write-every", type=int, default=50, help="Polls between purchases")
+    parser.add_argument("--dashboards", type=int, default=20, help="Distinct polling clients")
+    args = parser.parse_args()
+
+    configured_size = catalog_cache.entries.maxsize
+    results = {}
+    for label, maxsize in (("cache off", 0), ("cache on", configured_size)):
+        with temp_database() as (engine, session_factory):
+            seed_sweets(engine, args.size)
+            headers = seed_user(session_factory)
+            override_db(app, session_factory)
+            catalog_cache.entries.maxsize = maxsize
+            catalog_cache.clear()
+            with TestClient(app) as client:
+                results[label] = measure(
+                    client, headers, args.size, args.polls, args.write_every, args.dashboards
+                ) + (catalog_cache.stats(),)
+            app.dependency_overrides.clear()
+    catalog_cache.entries.maxsize = configured_size
+
+    baseline = results["cache off"][0]
+    for label, (throughput, not_modified, stats) in results.items():
+        print(
+            f"{label:<9}: {throughput:8.1f} polls/s ({(throughput / baseline - 1) * 100:+.1f}%) | "
+            f"304 {not_modified:.1%} | cache hits {stats['hits']} misses {stats['misses']} "
+            f"hit rate {stats['hit_rate']:.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+Scripted load test of the whole API, with a stored baseline to compare against.
+
+Seeds --users shoppers (plus one admin) and --sweets sweets into a throwaway
+database, launches the server (serve.py, so --workers > 1 works too) and
+drives it for --seconds from --clients processes of --concurrency
+connections each. Every request is one of these operations, picked at
+random in proportion to --mix:
+
+  browse    a catalog page (after a random id), or a single sweet (1 in 4)
+  search    GET /api/sweets/search on a name fragment or a category
+  purchase  one unit of a random sweet, as a random shopper
+  login     a random shopper logs in (a bcrypt verify on the server)
+  restock   the admin restocks a random sweet
+
+Random choices come from --seed, so two runs send the same request sequence
+per connection. Requests/s, p50/p95/p99 latency and the error rate (any
+non-2xx response or transport failure, counted by status) are recorded per
+operation and overall, printed, and written to --output as JSON. Logins
+are kept rare in the default mix: each costs a bcrypt verify, and on a
+small machine a few per second saturate the hashing pool, which then
+answers 503.
+
+With --baseline (benchmarks/baseline.json by default) the run is compared
+against a stored result and the script exits with status 1 when any
+operation regressed by more than --threshold: requests/s fell, or p95/p99
+rose, by more than that fraction (ignoring latency changes under
+--latency-slack-ms), or its error rate rose by more than --error-slack.
+Operations with fewer than --min-requests requests are not compared.
+Numbers only compare on the same machine with the same options; the
+comparison warns when the baseline was recorded elsewhere. Record a new
+baseline with --save-baseline after an intended change.
+
+    python -m benchmarks.bench_load --seconds 20
+    python -m benchmarks.bench_load --seconds 20 --save-baseline
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import httpx
+from sqlalchemy import insert, select
+
+from benchmarks.common import BACKEND_DIR, database_url, percentile, seed_sweets, server_process, temp_database
+from app.models import Sweet, User
+from app.utils.auth import create_access_token, get_password_hash
+
+OPERATIONS = ("browse", "search", "purchase", "login", "restock")
+DEFAULT_MIX = "browse=60,search=20,purchase=12,restock=7,login=1"
+DEFAULT_BASELINE = BACKEND_DIR / "benchmarks" / "baseline.json"
+PASSWORD = "benchpass123"
+SEARCH_TERMS = ["Sweet 1", "Sweet 42", "Sweet 7", "Sweet 99"]
+SEARCH_CATEGORIES = ["Chocolate", "Gummies", "Toffee"]
+
+
+def parse_mix(text: str) -> dict:
+    """"browse=50,login=5" -> {"browse": 50.0, "login": 5.0}"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r}; expected one of {', '.join(OPERATIONS)}")
+        mix[name] = float(weight)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("the mix needs at least one operation with a positive weight")
+    return mix
+
+
+def seed_users(engine, count: int) -> list:
+    """Insert `count` shoppers and an admin; returns their usernames, admin last"""
+    # Hashing once keeps seeding fast; logins still verify against bcrypt
+    hashed = get_password_hash(PASSWORD)
+    usernames = [f"shopper{i}" for i in range(count)] + ["stocker"]
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"username": name, "email": f"{name}@example.com", "hashed_password": hashed,
+             "is_admin": name == "stocker"}
+            for name in usernames
+        ])
+    return usernames
+
+
+class Workload:
+    """One connection's request script, deterministic for a given seed"""
+
+    def __init__(self, seed: int, mix: dict, sweet_ids: list, tokens: dict):
+        self.rng = random.Random(seed)
+        self.operations = list(mix)
+        self.weights = list(mix.values())
+        self.sweet_ids = sweet_ids
+        self.shoppers = [name for name in tokens if name != "stocker"]
+        self.tokens = tokens
+
+    def headers(self, username: str) -> dict:
+        return {"Authorization": f"Bearer {self.tokens[username]}"}
+
+    async def step(self, client: httpx.AsyncClient) -> tuple:
+        """Send one request; returns (operation, status code)"""
+        rng = self.rng
+        operation = rng.choices(self.operations, self.weights)[0]
+        sweet_id = rng.choice(self.sweet_ids)
+        shopper = rng.choice(self.shoppers)
+        if operation == "browse":
+            if rng.random() < 0.25:
+                response = await client.get(f"/api/sweets/{sweet_id}", headers=self.headers(shopper))
+            else:
+                response = await client.get(f"/api/sweets?limit=20&after={sweet_id}", headers=self.headers(shopper))
+        elif operation == "search":
+            params = (
+                {"name": rng.choice(SEARCH_TERMS)} if rng.random() < 0.5
+                else {"category": rng.choice(SEARCH_CATEGORIES)}
+            )
+            response = await client.get("/api/sweets/search", params={**params, "limit": 20},
+                                        headers=self.headers(shopper))
+        elif operation == "purchase":
+            response = await client.post(f"/api/sweets/{sweet_id}/purchase", json={"quantity": 1},
+                                         headers=self.headers(shopper))
+        elif operation == "login":
+            response = await client.post("/api/auth/login", json={"username": shopper, "password": PASSWORD})
+        else:
+            response = await client.post(f"/api/sweets/{sweet_id}/restock", json={"quantity": 1},
+                                         headers=self.headers("stocker"))
+        return operation, response.status_code
+
+
+async def client_load(base_url: str, concurrency: int, seconds: float, mix: dict, sweet_ids: list,
+                      tokens: dict, seed: int) -> list:
+    """Run `concurrency` scripted connections; returns [(operation, ms, status)]"""
+    samples = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+        stop_at = time.monotonic() + seconds
+
+        async def loop(workload: Workload):
+            while time.monotonic() < stop_at:
+                start = time.perf_counter()
+                try:
+                    operation, status = await workload.step(client)
+                except httpx.HTTPError as exc:
+                    operation, status = "transport", type(exc).__name__
+                samples.append((operation, (time.perf_counter() - start) * 1000, status))
+
+        await asyncio.gather(*(
+            loop(Workload(seed * 1000 + i, mix, sweet_ids, tokens)) for i in range(concurrency)
+        ))
+    return samples
+
+
+def run_client(args):
+    return asyncio.run(client_load(*args))
+
+
+def summarize(samples: list, seconds: float) -> dict:
+    def stats(group):
+        latencies = [ms for _, ms, _ in group]
+        errors = Counter(str(status) for _, _, status in group if not (isinstance(status, int) and status < 300))
+        return {
+            "requests": len(group),
+            "rps": round(len(group) / seconds, 1),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "error_rate": round(sum(errors.values()) / len(group), 4) if group else 0.0,
+            "errors": dict(sorted(errors.items())),
+        }
+
+    by_operation = defaultdict(list)
+    for sample in samples:
+        by_operation[sample[0]].append(sample)
+    return {
+        "total": stats(samples),
+        "operations": {operation: stats(group) for operation, group in sorted(by_operation.items())},
+    }
+
+
+def compare(result: dict, baseline: dict, threshold: float, latency_slack_ms: float, error_slack: float,
+            min_requests: int) -> list:
+    """Regressions of `result` against `baseline`, as human-readable lines"""
+    regressions = []
+    current = {"total": result["total"], **result["operations"]}
+    previous = {"total": baseline["total"], **baseline["operations"]}
+    for name, stats in current.items():
+        before = previous.get(name)
+        # Percentiles of a handful of requests are noise
+        if before is None or min(stats["requests"], before["requests"]) < min_requests:
+            continue
+        if before["rps"] and stats["rps"] < before["rps"] * (1 - threshold):
+            regressions.append(f"{name}: {stats['rps']} req/s, baseline {before['rps']}")
+        for key in ("p95_ms", "p99_ms"):
+            if stats[key] > before[key] * (1 + threshold) and stats[key] - before[key] > latency_slack_ms:
+                regressions.append(f"{name}: {key[:3]} {stats[key]} ms, baseline {before[key]} ms")
+        if stats["error_rate"] > before["error_rate"] + error_slack:
+            regressions.append(f"{name}: error rate {stats['error_rate']:.2%}, baseline {before['error_rate']:.2%}")
+    return regressions
+
+
+def machine() -> dict:
+    return {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100, help="shoppers to seed")
+    parser.add_argument("--sweets", type=int, default=1000, help="sweets to seed")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--workers", type=int, default=1, help="server worker processes")
+    parser.add_argument("--clients", type=int, default=1, help="client processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="connections per client process")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=2, help="seconds of load before measuring")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", type=Path, help="write the result as JSON here")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="result to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed fractional drop in req/s or rise in p95/p99 (default 0.2)")
+    parser.add_argument("--latency-slack-ms", type=float, default=2.0,
+                        help="latency rises smaller than this never count as regressions")
+    parser.add_argument("--error-slack", type=float, default=0.01,
+                        help="allowed absolute rise in an operation's error rate")
+    parser.add_argument("--min-requests", type=int, default=50,
+                        help="operations with fewer requests than this are not compared")
+    args = parser.parse_args()
+
+    with temp_database() as (engine, session_factory):
+        seed_sweets(engine, args.sweets)
+        # Enough stock that purchases never run out during the run
+        with engine.begin() as conn:
+            conn.exec_driver_sql("UPDATE sweets SET quantity = 1000000")
+            sweet_ids = list(conn.scalars(select(Sweet.id)))
+        tokens = {name: create_access_token({"sub": name}) for name in seed_users(engine, args.users)}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {"INVALIDATION_BUS_PATH": str(Path(tmp) / "bus.db")}
+            command = [sys.executable, "serve.py", "--workers", str(args.workers)]
+            with server_process(database_url(engine), env=env, command=command) as (base_url, _):
+                if args.warmup:
+                    asyncio.run(client_load(base_url, args.concurrency, args.warmup, args.mix, sweet_ids, tokens,
+                                            seed=0))
+                jobs = [
+                    (base_url, args.concurrency, args.seconds, args.mix, sweet_ids, tokens, args.seed + i)
+                    for i in range(args.clients)
+                ]
+                with multiprocessing.get_context("spawn").Pool(args.clients) as pool:
+                    samples = [sample for result in pool.map(run_client, jobs) for sample in result]
+
+    result = {
+        "config": {
+            "users": args.users, "sweets": args.sweets, "mix": args.mix, "workers": args.workers,
+            "clients": args.clients, "concurrency": args.concurrency, "seconds": args.seconds, "seed": args.seed,
+        },
+        "machine": machine(),
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        **summarize(samples, args.seconds),
+    }
+    for name, stats in {**result["operations"], "total": result["total"]}.items():
+        print(
+            f"{name:<9} {stats['rps']:8.1f} req/s | p50 {stats['p50_ms']:7.1f} ms  p95 {stats['p95_ms']:7.1f} ms  "
+            f"p99 {stats['p99_ms']:7.1f} ms | errors {stats['error_rate']:6.2%} of {stats['requests']}"
+            + (f" {stats['errors']}" if stats["errors"] else "")
+        )
+    if args.output:
+        args.output.write_text(json.dumps(result, indent=2) + "\n")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(result, indent=2) + "\n")
+        print(f"Saved baseline to {args.baseline}")
+        return
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one")
+        return
+    baseline = json.loads(args.baseline.read_text())
+    if baseline["config"] != result["config"]:
+        print("Warning: the baseline was recorded with different options")
+    if baseline["machine"] != result["machine"]:
+        print(f"Warning: the baseline was recorded on another machine ({baseline['machine']})")
+    regressions = compare(
+        result, baseline, args.threshold, args.latency_slack_ms, args.error_slack, args.min_requests
+    )
+    if regressions:
+        print(f"Regressions against {args.baseline} (threshold {args.threshold:.0%}):")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"No regressions against {args.baseline} (threshold {args.threshold:.0%})")
+
+
+if __name__ == "__main__":
+    main()
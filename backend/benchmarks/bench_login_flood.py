@@ -0,0 +1,85 @@
+"""
+Load test: catalog latency while a flood of logins hammers bcrypt.
+
+Starts a real uvicorn server, measures GET /api/sweets?limit=50 latency on
+its own, then again while --flood concurrent clients log in continuously.
+Runs once with the hashing pool disabled (PASSWORD_HASH_WORKERS=0, bcrypt on
+the shared threadpool) and once with the process pool.
+
+    python -m benchmarks.bench_login_flood --flood 64 --seconds 10
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+
+from benchmarks.common import (
+    database_url, percentile, running_server, seed_sweets, seed_user, temp_database
+)
+
+
+async def catalog_probe(client, headers, stop_at, latencies):
+    while time.monotonic() < stop_at:
+        start = time.perf_counter()
+        response = await client.get("/api/sweets?limit=50", headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200
+
+
+async def login_loop(client, stop_at, statuses):
+    while time.monotonic() < stop_at:
+        try:
+            response = await client.post(
+                "/api/auth/login", json={"username": "bench", "password": "benchpass123"}
+            )
+            statuses[response.status_code] += 1
+            if response.status_code == 503:
+                # Well-behaved clients back off as told
+                await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+        except httpx.HTTPError:
+            statuses["error"] += 1
+
+
+async def scenario(base_url, headers, flood, seconds):
+    limits = httpx.Limits(max_connections=flood + 8)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        quiet = []
+        await catalog_probe(client, headers, time.monotonic() + seconds / 2, quiet)
+
+        loaded = []
+        statuses = Counter()
+        stop_at = time.monotonic() + seconds
+        await asyncio.gather(
+            catalog_probe(client, headers, stop_at, loaded),
+            *(login_loop(client, stop_at, statuses) for _ in range(flood)),
+        )
+    return quiet, loaded, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--flood", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    with temp_database() as (engine, session_factory):
+        seed_sweets(engine, 1000)
+        headers = seed_user(session_factory)
+        for label, workers in (("threadpool bcrypt", "0"), ("process pool bcrypt", "")):
+            env = {"PASSWORD_HASH_WORKERS": workers} if workers else {}
+            with running_server(database_url(engine), env=env) as base_url:
+                quiet, loaded, statuses = asyncio.run(
+                    scenario(base_url, headers, args.flood, args.seconds)
+                )
+            print(
+                f"{label:20} | catalog p50/p99 quiet {percentile(quiet, 50):6.1f}/{percentile(quiet, 99):6.1f} ms, "
+                f"during flood {percentile(loaded, 50):6.1f}/{percentile(loaded, 99):6.1f} ms "
+                f"({len(loaded)} reads) | logins {dict(statuses)} "
+                f"= {statuses[200] / args.seconds:5.1f}/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark concurrent POST /api/sweets/{id}/purchase against a single sweet.
+
+Fires --requests purchases of one unit from --threads client threads at a
+sweet stocked with --stock units, then reports throughput, how many purchases
+succeeded, how many failed, and whether stock was oversold.
+
+    python -m benchmarks.bench_purchase --requests 2000 --threads 16
+"""
+import argparse
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.testclient import TestClient
+
+from benchmarks.common import override_db, seed_user, temp_database
+from app.main import app
+from app.models import Sweet
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--stock", type=int, default=1000)
+    args = parser.parse_args()
+
+    with temp_database() as (engine, session_factory):
+        headers = seed_user(session_factory)
+        db = session_factory()
+        sweet = Sweet(name="Bench Bar", category="Chocolate", price=1.0, quantity=args.stock)
+        db.add(sweet)
+        db.commit()
+        sweet_id = sweet.id
+        db.close()
+        override_db(app, session_factory)
+
+        with TestClient(app, raise_server_exceptions=False) as client:
+            def buy(_):
+                response = client.post(
+                    f"/api/sweets/{sweet_id}/purchase", json={"quantity": 1}, headers=headers
+                )
+                return response.status_code
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.threads) as pool:
+                statuses = Counter(pool.map(buy, range(args.requests)))
+            elapsed = time.perf_counter() - start
+        app.dependency_overrides.clear()
+
+        db = session_factory()
+        remaining = db.get(Sweet, sweet_id).quantity
+        db.close()
+
+    sold = statuses.get(200, 0)
+    print(
+        f"{args.requests} purchases / {args.threads} threads: {args.requests / elapsed:7.1f} req/s | "
+        f"status codes {dict(statuses)} | stock {args.stock} -> {remaining} | "
+        f"oversold {max(0, sold - args.stock)} (units sold {sold}, stock consumed {args.stock - remaining})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark the FTS5 trigram search path against the old ILIKE scan.
+
+Seeds --rows sweets, then runs each query term through:
+  * ilike-all: the old endpoint (ILIKE on every column, every match fetched)
+  * ilike-50:  the same scan stopped after 50 matches
+  * fts-50:    apply_text_search (trigram MATCH ranked by bm25), top 50
+
+    python -m benchmarks.bench_search --rows 1000000
+"""
+import argparse
+import time
+
+from sqlalchemy import or_
+
+from benchmarks.common import percentile, seed_sweets, temp_database
+from app.models import Sweet
+from app.utils.search import apply_text_search
+
+TERMS = ["Sweet 123456", "number 4242", "987654", "Licorice", "nonexistent"]
+
+
+def time_query(build, repeat):
+    samples = []
+    rows = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = len(build().all())
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with temp_database() as (engine, session_factory):
+        start = time.perf_counter()
+        seed_sweets(engine, args.rows)
+        print(f"seeded {args.rows} rows (with FTS triggers) in {time.perf_counter() - start:.1f} s")
+        db = session_factory()
+
+        def ilike(term):
+            return db.query(Sweet).filter(or_(
+                Sweet.name.ilike(f"%{term}%"),
+                Sweet.category.ilike(f"%{term}%"),
+                Sweet.description.ilike(f"%{term}%"),
+            ))
+
+        def fts(term):
+            query, _ = apply_text_search(db.query(Sweet), "sqlite", q=term)
+            return query.limit(50)
+
+        for term in TERMS:
+            results = {
+                "ilike-all": time_query(lambda: ilike(term), args.repeat),
+                "ilike-50": time_query(lambda: ilike(term).limit(50), args.repeat),
+                "fts-50": time_query(lambda: fts(term), args.repeat),
+            }
+            print(f"{term!r:16} " + " | ".join(
+                f"{label} p50 {percentile(samples, 50):8.1f} ms ({rows} rows)"
+                for label, (samples, rows) in results.items()
+            ))
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Microbenchmark: cost of turning --rows sweets into a JSON response body.
+
+Compares, per --rows rows (default 10k):
+
+  fastapi   ORM entities -> SweetResponse.model_validate -> jsonable_encoder
+            -> json.dumps (what a plain `return sweets` with response_model did)
+  pydantic  ORM entities -> TypeAdapter(List[SweetResponse]) dump_json
+  fast      column rows -> orjson (app.utils.serialization)
+
+Each is timed for serialization alone and for query + serialization.
+
+    python -m benchmarks.bench_serialization --rows 10000
+"""
+import argparse
+import json
+import time
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy import select
+
+from benchmarks.common import seed_sweets, temp_database
+from app.models import Sweet
+from app.schemas import SweetResponse
+from app.utils.serialization import select_sweet_rows, sweet_rows_json
+
+sweet_list = TypeAdapter(List[SweetResponse])
+
+
+def fastapi_path(sweets) -> bytes:
+    content = jsonable_encoder([SweetResponse.model_validate(sweet) for sweet in sweets])
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def pydantic_path(sweets) -> bytes:
+    return sweet_list.dump_json(sweet_list.validate_python(sweets, from_attributes=True))
+
+
+def best_of(repeat: int, fn, *args) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with temp_database() as (engine, session_factory):
+        seed_sweets(engine, args.rows)
+        db = session_factory()
+        try:
+            def load_entities():
+                db.expunge_all()
+                return db.execute(select(Sweet).order_by(Sweet.id)).scalars().all()
+
+            def load_rows():
+                return db.execute(select_sweet_rows().order_by(Sweet.id)).all()
+
+            entities = load_entities()
+            rows = load_rows()
+            assert json.loads(fastapi_path(entities)) == json.loads(sweet_rows_json(rows))
+
+            cases = {
+                "fastapi": (fastapi_path, entities, load_entities),
+                "pydantic": (pydantic_path, entities, load_entities),
+                "fast": (sweet_rows_json, rows, load_rows),
+            }
+            print(f"{args.rows} rows, best of {args.repeat}")
+            baseline = None
+            for label, (serialize, data, load) in cases.items():
+                serialize_ms = best_of(args.repeat, serialize, data)
+                total_ms = best_of(args.repeat, lambda: serialize(load()))
+                baseline = baseline or total_ms
+                print(
+                    f"{label:<9} serialize {serialize_ms:8.2f} ms | "
+                    f"query+serialize {total_ms:8.2f} ms ({baseline / total_ms:4.1f}x)"
+                )
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
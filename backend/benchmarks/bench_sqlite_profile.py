@@ -0,0 +1,97 @@
+"""
+Load test: mixed read/write throughput with and without the SQLite profile.
+
+Starts uvicorn against a seeded SQLite file twice: once with
+SQLITE_TUNING/SQLITE_WRITE_QUEUE off (rollback journal, every purchase
+commits on its own request thread) and once with both on (WAL, pragmas,
+group-committed purchases/restocks). --clients concurrent clients each loop
+over reads (single sweet, catalog page, search) and, with probability
+--write-ratio, a purchase or restock. Reports throughput, read/write p50/p99
+and any 5xx (e.g. "database is locked").
+
+    python -m benchmarks.bench_sqlite_profile --clients 64 --seconds 15
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+
+import httpx
+
+from benchmarks.common import (
+    database_url, percentile, running_server, seed_sweets, seed_user, temp_database
+)
+
+
+async def client_loop(client, headers, admin_headers, size, write_ratio, stop_at, results, rng):
+    while time.monotonic() < stop_at:
+        sweet_id = rng.randint(1, size)
+        is_write = rng.random() < write_ratio
+        start = time.perf_counter()
+        if is_write:
+            if rng.random() < 0.9:
+                request = client.post(f"/api/sweets/{sweet_id}/purchase", json={"quantity": 1}, headers=headers)
+            else:
+                request = client.post(f"/api/sweets/{sweet_id}/restock", json={"quantity": 10}, headers=admin_headers)
+        else:
+            roll = rng.random()
+            if roll < 0.5:
+                request = client.get(f"/api/sweets/{sweet_id}", headers=headers)
+            elif roll < 0.8:
+                request = client.get(f"/api/sweets?limit=50&after={sweet_id}", headers=headers)
+            else:
+                request = client.get("/api/sweets/search?category=Toffee&max_price=5&limit=20", headers=headers)
+        response = await request
+        elapsed = (time.perf_counter() - start) * 1000
+        results["write" if is_write else "read"].append(elapsed)
+        results["status"][response.status_code] += 1
+
+
+async def load(base_url, headers, admin_headers, args):
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    results = {"read": [], "write": [], "status": Counter()}
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        stop_at = time.monotonic() + args.seconds
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            client_loop(client, headers, admin_headers, args.size, args.write_ratio, stop_at, results, random.Random(i))
+            for i in range(args.clients)
+        ))
+        results["elapsed"] = time.perf_counter() - start
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--size", type=int, default=10_000, help="Sweets in the catalog")
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    args = parser.parse_args()
+
+    for tuned in ("false", "true"):
+        with temp_database() as (engine, session_factory):
+            seed_sweets(engine, args.size)
+            headers = seed_user(session_factory)
+            admin_headers = seed_user(session_factory, username="benchadmin", is_admin=True)
+            env = {
+                "SQLITE_TUNING": tuned,
+                "SQLITE_WRITE_QUEUE": tuned,
+                "PASSWORD_HASH_WORKERS": "0",
+            }
+            with running_server(database_url(engine), env=env, args=["--workers", str(args.workers)]) as base_url:
+                results = asyncio.run(load(base_url, headers, admin_headers, args))
+        reads, writes = results["read"], results["write"]
+        print(
+            f"profile={'on ' if tuned == 'true' else 'off'} | "
+            f"{(len(reads) + len(writes)) / results['elapsed']:7.1f} req/s | "
+            f"read p50 {percentile(reads, 50):7.1f} p99 {percentile(reads, 99):7.1f} ms | "
+            f"write p50 {percentile(writes, 50):7.1f} p99 {percentile(writes, 99):7.1f} ms | "
+            f"statuses {dict(results['status'])}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark serving uploaded images: plain StaticFiles vs app.utils.upload_files.
+
+Writes --files images of --size-kb each into a temp upload directory and
+launches uvicorn twice on a minimal app mounting it under /uploads, once with
+each static-files class. Clients fetch random images with --concurrency
+requests in flight, as a browser would on a catalog page:
+
+  cold        no validators: every request downloads the file
+  revalidate  If-None-Match with the last ETag (browser reload)
+  range       Range: bytes=0-65535 (media previews, resumed downloads)
+
+For each it reports requests/s, MB/s and server CPU time per request and per
+MB served (read from /proc, so client overhead is excluded). With
+UploadFiles, a browser honouring `immutable` skips the revalidate requests
+entirely.
+
+    python -m benchmarks.bench_static_uploads --files 50 --size-kb 256
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+
+from benchmarks.common import process_cpu_seconds, server_process
+from app.utils.upload_files import UploadFiles
+
+
+def build_app(files_class):
+    directory = os.environ.get("BENCH_UPLOAD_DIR")
+    if directory is None:
+        return None
+    return Starlette(routes=[
+        Route("/health", lambda request: PlainTextResponse("ok")),
+        Mount("/uploads", files_class(directory=directory)),
+    ])
+
+
+# uvicorn targets for the two server runs
+baseline_app = build_app(StaticFiles)
+upload_app = build_app(UploadFiles)
+
+
+def write_files(directory: Path, count: int, size_kb: int) -> list:
+    rng = random.Random(3)
+    names = []
+    for _ in range(count):
+        data = rng.randbytes(size_kb * 1024)
+        name = f"{os.urandom(32).hex()}.jpg"
+        (directory / name).write_bytes(b"\xff\xd8\xff" + data[3:])
+        names.append(name)
+    return names
+
+
+async def run_mode(base_url: str, names: list, mode: str, requests: int, concurrency: int):
+    import httpx
+
+    rng = random.Random(11)
+    etags = {}
+    if mode == "revalidate":
+        async with httpx.AsyncClient(base_url=base_url) as client:
+            for name in names:
+                etags[name] = (await client.get(f"/uploads/{name}")).headers["etag"]
+    paths = [rng.choice(names) for _ in range(requests)]
+    served = {"bytes": 0, "statuses": {}}
+
+    async def worker():
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+            while paths:
+                name = paths.pop()
+                headers = {}
+                if mode == "revalidate":
+                    headers["If-None-Match"] = etags[name]
+                elif mode == "range":
+                    headers["Range"] = "bytes=0-65535"
+                response = await client.get(f"/uploads/{name}", headers=headers)
+                served["bytes"] += len(response.content)
+                served["statuses"][response.status_code] = served["statuses"].get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, served
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--size-kb", type=int, default=256)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        names = write_files(Path(tmp), args.files, args.size_kb)
+        print(f"{args.files} files x {args.size_kb} KiB, {args.requests} requests, concurrency {args.concurrency}")
+        for label, target in (("StaticFiles", "baseline_app"), ("UploadFiles", "upload_app")):
+            with server_process(
+                "sqlite://", env={"BENCH_UPLOAD_DIR": tmp},
+                app_target=f"benchmarks.bench_static_uploads:{target}"
+            ) as (base_url, process):
+                for mode in ("cold", "revalidate", "range"):
+                    cpu_before = process_cpu_seconds(process.pid)
+                    elapsed, served = asyncio.run(
+                        run_mode(base_url, names, mode, args.requests, args.concurrency)
+                    )
+                    cpu = process_cpu_seconds(process.pid) - cpu_before
+                    mb = served["bytes"] / (1024 * 1024)
+                    cpu_per_mb = f"{cpu * 1000 / mb:7.2f} ms/MB" if mb >= 1 else "        n/a"
+                    print(
+                        f"{label:<12} {mode:<10} {args.requests / elapsed:8.0f} req/s "
+                        f"{mb / elapsed:8.1f} MB/s  server cpu {cpu * 1000 / args.requests:5.2f} ms/req {cpu_per_mb}  "
+                        f"statuses {served['statuses']}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Benchmark GET /api/sweets/stream with many idle subscribers on one worker.
+
+Launches a single uvicorn worker, then opens --subscribers SSE connections
+in steps, printing the server's resident memory at each step. With every
+subscriber connected it measures:
+
+  fan-out     one purchase: time until each subscriber has its delta, and
+              server CPU per subscriber
+  burst       --burst restocks spread over --burst-sweets sweets, fired
+              back to back: delivery time, frames per subscriber (at most
+              one per write, fewer when a subscriber falls behind and its
+              changes coalesce), memory afterwards
+
+Server memory per subscriber stays flat because a subscriber is only a
+cursor into one shared change log; slow readers are not buffered for.
+
+    python -m benchmarks.bench_stream --subscribers 10000
+"""
+import argparse
+import asyncio
+import resource
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from benchmarks.common import (
+    database_url, percentile, process_cpu_seconds, rss_mb, seed_sweets, seed_user, server_process, temp_database
+)
+
+
+class Subscriber:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.frames = 0
+
+    async def next_event(self) -> bytes:
+        """Read frames until the next one carrying an event"""
+        while True:
+            frame = await self.reader.readuntil(b"\n\n")
+            if b"\nevent: " in frame or frame.startswith(b"event: "):
+                self.frames += 1
+                return frame
+
+
+async def subscribe(host: str, port: int, token_header: str) -> Subscriber:
+    reader, writer = await asyncio.open_connection(host, port, limit=1 << 20)
+    writer.write(
+        f"GET /api/sweets/stream HTTP/1.1\r\nHost: {host}\r\n"
+        f"Authorization: {token_header}\r\nAccept: text/event-stream\r\n\r\n".encode()
+    )
+    head = await reader.readuntil(b"\r\n\r\n")
+    if not head.startswith(b"HTTP/1.1 200"):
+        raise RuntimeError(head.decode(errors="replace"))
+    # Chunked transfer encoding: read past the first chunk (retry + id)
+    await reader.readuntil(b"\n\n")
+    return Subscriber(reader, writer)
+
+
+async def deliver(subscribers, trigger) -> list:
+    """Run `trigger`, then return each subscriber's delay (ms) until its next event"""
+    start = time.perf_counter()
+    waits = [asyncio.ensure_future(subscriber.next_event()) for subscriber in subscribers]
+    await trigger()
+    delays = []
+    for wait in asyncio.as_completed(waits):
+        await wait
+        delays.append((time.perf_counter() - start) * 1000)
+    return delays
+
+
+async def drain(subscribers, done: asyncio.Event, quiet: float = 2):
+    """Read frames until `done` is set and the stream has been quiet for `quiet` seconds"""
+    async def read_all(subscriber):
+        while True:
+            try:
+                await asyncio.wait_for(subscriber.next_event(), quiet)
+            except asyncio.TimeoutError:
+                if done.is_set():
+                    return
+    await asyncio.gather(*(read_all(subscriber) for subscriber in subscribers))
+
+
+async def run(args, base_url: str, pid: int, user: dict, admin: dict):
+    url = urlsplit(base_url)
+    subscribers = []
+    baseline = rss_mb(pid)
+    print(f"server rss with no subscribers: {baseline:.1f} MiB")
+    steps = sorted({min(step, args.subscribers) for step in (1000, 2500, 5000, args.subscribers)})
+    for step in steps:
+        while len(subscribers) < step:
+            batch = min(500, step - len(subscribers))
+            subscribers += await asyncio.gather(*(
+                subscribe(url.hostname, url.port, user["Authorization"]) for _ in range(batch)
+            ))
+        await asyncio.sleep(0.5)
+        rss = rss_mb(pid)
+        print(
+            f"{len(subscribers):>6} subscribers: server rss {rss:7.1f} MiB "
+            f"(+{(rss - baseline) * 1024 / len(subscribers):5.1f} KiB per subscriber)"
+        )
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        async def purchase():
+            response = await client.post("/api/sweets/1/purchase", json={"quantity": 1}, headers=user)
+            response.raise_for_status()
+
+        cpu = process_cpu_seconds(pid)
+        delays = await deliver(subscribers, purchase)
+        cpu = process_cpu_seconds(pid) - cpu
+        print(
+            f"fan-out of 1 purchase to {len(subscribers)}: p50 {percentile(delays, 50):.0f} ms, "
+            f"p99 {percentile(delays, 99):.0f} ms, last {max(delays):.0f} ms, "
+            f"server cpu {cpu * 1e6 / len(subscribers):.0f} us per subscriber"
+        )
+
+        for subscriber in subscribers:
+            subscriber.frames = 0
+
+        done = asyncio.Event()
+
+        async def burst():
+            for i in range(args.burst):
+                response = await client.post(
+                    f"/api/sweets/{1 + i % args.burst_sweets}/restock", json={"quantity": 1}, headers=admin
+                )
+                response.raise_for_status()
+            done.set()
+
+        start = time.perf_counter()
+        await asyncio.gather(burst(), drain(subscribers, done))
+        elapsed = time.perf_counter() - start - 2
+        frames = [subscriber.frames for subscriber in subscribers]
+        print(
+            f"burst of {args.burst} restocks over {args.burst_sweets} sweets: delivered in {elapsed:.1f} s, "
+            f"frames per subscriber p50 {percentile(frames, 50):.0f} max {max(frames)}, "
+            f"server rss {rss_mb(pid):.1f} MiB"
+        )
+
+    for subscriber in subscribers:
+        subscriber.writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=10000)
+    parser.add_argument("--burst", type=int, default=200)
+    parser.add_argument("--burst-sweets", type=int, default=20)
+    args = parser.parse_args()
+
+    # One socket per subscriber on each side
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    if hard < args.subscribers + 100:
+        raise SystemExit(f"open file limit {hard} is too low for {args.subscribers} subscribers")
+
+    with temp_database() as (engine, session_factory):
+        seed_sweets(engine, max(100, args.burst_sweets))
+        user = seed_user(session_factory, "watcher")
+        admin = seed_user(session_factory, "stocker", is_admin=True)
+        with server_process(
+            database_url(engine), env={"STREAM_HEARTBEAT_SECONDS": "60"}, args=["--backlog", "4096"]
+        ) as (base_url, process):
+            asyncio.run(run(args, base_url, process.pid, user, admin))
+
+
+if __name__ == "__main__":
+    main()
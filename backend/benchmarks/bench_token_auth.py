@@ -0,0 +1,115 @@
+"""
+Benchmark per-request authentication cost with and without the token cache.
+
+Compares three setups: the token cache off with a token lacking the
+uid/is_admin claims (how every request was authenticated before), the token
+cache on with that token, and the token cache on with a token as
+/api/auth/login issues it. For each, first calls the auth dependencies
+directly, --calls times each:
+
+  user    get_current_user with the user cache warm, so what remains is
+          verifying the token (python-jose HMAC + JSON parsing) or, with the
+          token cache, a dict lookup
+  admin   get_current_admin_user with the user cache cleared before every
+          call (a worker that has not seen this user yet): a user lookup
+          unless the token's claims can be trusted
+
+then issues --requests GET /api/sweets/{id} (served from the catalog cache,
+so auth is a large share of the work) and reports requests/s and the auth
+stage of the Server-Timing header.
+
+    python -m benchmarks.bench_token_auth --calls 20000 --requests 3000
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+
+from benchmarks.common import override_db, seed_sweets, seed_user, temp_database
+from app.main import app
+from app.utils.auth import create_access_token, get_current_admin_user, get_current_user, token_cache, user_cache
+
+
+def per_call_us(session_factory, dependency, token: str, calls: int, cold_user_cache: bool) -> float:
+    async def run():
+        db = session_factory()
+        try:
+            start = time.perf_counter()
+            for _ in range(calls):
+                if cold_user_cache:
+                    user_cache.clear()
+                await dependency(token, db)
+            return (time.perf_counter() - start) / calls * 1e6
+        finally:
+            db.close()
+
+    return asyncio.run(run())
+
+
+def requests_per_second(client, token: str, requests: int) -> tuple:
+    headers = {"Authorization": f"Bearer {token}"}
+    auth_ms = 0.0
+    start = time.perf_counter()
+    for i in range(requests):
+        response = client.get(f"/api/sweets/{i % 100 + 1}", headers=headers)
+        assert response.status_code == 200
+        auth_ms += sum(
+            float(metric.split("dur=")[1])
+            for metric in response.headers["server-timing"].split(", ")
+            if metric.startswith("auth;")
+        )
+    return requests / (time.perf_counter() - start), auth_ms / requests * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=3000)
+    args = parser.parse_args()
+
+    with temp_database() as (engine, session_factory):
+        seed_sweets(engine, 100)
+        seed_user(session_factory, "stocker", is_admin=True)
+        plain_token = create_access_token({"sub": "stocker"})
+        # What /api/auth/login issues
+        login_token = create_access_token(
+            {"sub": "stocker", "uid": 1, "is_admin": True, "iat": int(time.time()) - 5}
+        )
+        configured_size = token_cache.maxsize
+        setups = {
+            "before": (0, plain_token),
+            "token cache": (configured_size, plain_token),
+            "cache + claims": (configured_size, login_token),
+        }
+        results = {}
+        for label, (size, token) in setups.items():
+            token_cache.maxsize = size
+            token_cache.clear()
+            user_cache.clear()
+            user_us = per_call_us(session_factory, get_current_user, token, args.calls, cold_user_cache=False)
+            admin_us = per_call_us(
+                session_factory, get_current_admin_user, token, args.calls // 10, cold_user_cache=True
+            )
+            results[label] = (user_us, admin_us)
+
+        override_db(app, session_factory)
+        with TestClient(app) as client:
+            for label, (size, token) in setups.items():
+                token_cache.maxsize = size
+                token_cache.clear()
+                results[label] += requests_per_second(client, token, args.requests)
+        app.dependency_overrides.clear()
+        token_cache.maxsize = configured_size
+
+    baseline = results["before"]
+    for label, (user_us, admin_us, rps, auth_us) in results.items():
+        print(
+            f"{label:<14}: user {user_us:6.1f} us/call | admin, cold user cache {admin_us:6.1f} us/call | "
+            f"GET /api/sweets/{{id}} {rps:7.1f} req/s ({(rps / baseline[2] - 1) * 100:+.1f}%), "
+            f"auth stage {auth_us:6.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
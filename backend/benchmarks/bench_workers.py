@@ -0,0 +1,163 @@
+"""
+Benchmark throughput as serve.py scales from 1 to N worker processes.
+
+For each worker count, launches serve.py against a throwaway database and
+drives a mixed load from --clients client processes (each running
+--concurrency connections for --seconds): purchases (--write-ratio, 10% by
+default), the rest split 7:2 between catalog pages and single sweets. Prints requests/s and latency percentiles, then,
+with more than one worker, checks cache coherence: every worker first
+caches a sweet, then one restock is made and fresh connections (landing on
+whichever worker accepts them) poll until all of them see it. The time that
+takes is bounded by the invalidation bus poll interval, not the catalog
+cache TTL.
+
+Worker processes only add throughput when there are idle cores for them
+(the client processes need some too): on a single CPU expect flat or lower
+numbers as workers are added. Server CPU per request, summed over the
+launcher and its workers, shows what the extra processes cost: if it stays
+flat, throughput is limited by cores, not by the workers getting in each
+other's way.
+
+    python -m benchmarks.bench_workers --max-workers 4 --seconds 10
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+from benchmarks.common import (
+    database_url, percentile, process_cpu_seconds, seed_sweets, seed_user, server_process, temp_database
+)
+
+SWEETS = 1000
+
+
+async def client_load(base_url: str, headers: dict, concurrency: int, seconds: float, write_ratio: float,
+                      seed: int):
+    rng = random.Random(seed)
+    latencies = []
+    statuses = Counter()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, timeout=30, limits=limits) as client:
+        stop_at = time.monotonic() + seconds
+
+        async def loop():
+            while time.monotonic() < stop_at:
+                sweet_id = rng.randint(1, SWEETS)
+                start = time.perf_counter()
+                try:
+                    if rng.random() < write_ratio:
+                        response = await client.post(f"/api/sweets/{sweet_id}/purchase", json={"quantity": 1})
+                    elif rng.random() < 7 / 9:
+                        response = await client.get(f"/api/sweets?limit=20&after={sweet_id}")
+                    else:
+                        response = await client.get(f"/api/sweets/{sweet_id}")
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError:
+                    statuses["error"] += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        await asyncio.gather(*(loop() for _ in range(concurrency)))
+    return latencies, statuses
+
+
+def process_tree(pid: int) -> list:
+    """`pid` and all its descendants (Linux only)"""
+    pids = [pid]
+    for child in Path(f"/proc/{pid}/task/{pid}/children").read_text().split():
+        pids += process_tree(int(child))
+    return pids
+
+
+def run_client(args):
+    return asyncio.run(client_load(*args))
+
+
+def fresh_get(base_url: str, path: str, headers: dict) -> dict:
+    """GET over a new connection, so the kernel may hand it to any worker"""
+    with httpx.Client(base_url=base_url, headers=headers, timeout=10) as client:
+        return client.get(path).json()
+
+
+def coherence_ms(base_url: str, user: dict, admin: dict, workers: int) -> float:
+    """ms until the last stale read of a restock made through one of the workers"""
+    path = "/api/sweets/1"
+    # Enough fresh connections that each worker has likely cached the sweet
+    for _ in range(workers * 8):
+        fresh_get(base_url, path, user)
+    with httpx.Client(base_url=base_url, timeout=10) as client:
+        quantity = client.post("/api/sweets/1/restock", json={"quantity": 1}, headers=admin).json()["quantity"]
+    start = time.perf_counter()
+    last_stale = 0.0
+    consecutive = 0
+    while consecutive < workers * 8:
+        if fresh_get(base_url, path, user)["quantity"] == quantity:
+            consecutive += 1
+        else:
+            consecutive = 0
+            last_stale = time.perf_counter() - start
+        if time.perf_counter() - start > 30:
+            raise RuntimeError("workers still serve the old quantity after 30 s")
+    return last_stale * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--clients", type=int, default=2, help="client processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="connections per client process")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.1, help="share of requests that are purchases")
+    args = parser.parse_args()
+
+    counts = sorted({1, *(2 ** i for i in range(1, 8) if 2 ** i < args.max_workers), args.max_workers})
+    with temp_database() as (engine, session_factory):
+        seed_sweets(engine, SWEETS)
+        # Enough stock that purchases never run out during the run
+        with engine.begin() as connection:
+            connection.exec_driver_sql("UPDATE sweets SET quantity = 1000000")
+        user = seed_user(session_factory, "shopper")
+        admin = seed_user(session_factory, "stocker", is_admin=True)
+
+        baseline = None
+        for workers in counts:
+            with tempfile.TemporaryDirectory() as tmp:
+                env = {"INVALIDATION_BUS_PATH": str(Path(tmp) / "bus.db")}
+                command = [sys.executable, "serve.py", "--workers", str(workers)]
+                with server_process(database_url(engine), env=env, command=command) as (base_url, server):
+                    # Warm every worker up before measuring
+                    asyncio.run(client_load(base_url, user, args.concurrency, 1, args.write_ratio, seed=0))
+                    jobs = [
+                        (base_url, user, args.concurrency, args.seconds, args.write_ratio, seed)
+                        for seed in range(1, args.clients + 1)
+                    ]
+                    server_pids = process_tree(server.pid)
+                    cpu = sum(process_cpu_seconds(pid) for pid in server_pids)
+                    with multiprocessing.get_context("spawn").Pool(args.clients) as pool:
+                        results = pool.map(run_client, jobs)
+                    cpu = sum(process_cpu_seconds(pid) for pid in server_pids) - cpu
+                    coherent = coherence_ms(base_url, user, admin, workers) if workers > 1 else None
+
+            latencies = [latency for result, _ in results for latency in result]
+            statuses = sum((result_statuses for _, result_statuses in results), Counter())
+            rps = len(latencies) / args.seconds
+            baseline = baseline or rps
+            errors = sum(count for code, count in statuses.items() if code != 200)
+            print(
+                f"{workers:>3} workers: {rps:8.1f} req/s ({rps / baseline:4.2f}x) | "
+                f"p50 {percentile(latencies, 50):6.1f} ms  p99 {percentile(latencies, 99):7.1f} ms | "
+                f"server cpu {cpu * 1000 / len(latencies):4.2f} ms/req | errors {errors}"
+                + (f" | last stale read {coherent:.0f} ms" if coherent is not None else "")
+            )
+
+
+if __name__ == "__main__":
+    main()
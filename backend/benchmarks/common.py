@@ -0,0 +1,234 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks run in-process against a throwaway SQLite file so they never touch
+sweet_shop.db. Run them from the backend directory, e.g.:
+
+    python -m benchmarks.bench_catalog
+"""
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production")
+# Benchmark databases are throwaway, so the sweeper would see every real
+# upload as unreferenced
+os.environ.setdefault("UPLOAD_SWEEP_INTERVAL_SECONDS", "0")
+# Likewise keep rollups out of the real database
+os.environ.setdefault("ROLLUP_INTERVAL_SECONDS", "0")
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import Sweet, User
+from app.utils.auth import create_access_token, get_password_hash
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+CATEGORIES = ["Chocolate", "Gummies", "Hard Candy", "Toffee", "Licorice", "Marshmallow"]
+
+
+@contextmanager
+def temp_database():
+    """Yield (engine, SessionLocal) bound to a fresh SQLite file"""
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        Base.metadata.create_all(bind=engine)
+        try:
+            yield engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        finally:
+            engine.dispose()
+
+
+def database_url(engine) -> str:
+    return f"sqlite:///{engine.url.database}"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def running_server(db_url: str, env: dict = None, args: list = None, startup_timeout: float = 30):
+    """Launch uvicorn on a free port against `db_url` and yield its base URL"""
+    with server_process(db_url, env, args, startup_timeout) as (base_url, _):
+        yield base_url
+
+
+@contextmanager
+def server_process(db_url: str, env: dict = None, args: list = None, startup_timeout: float = 30,
+                   app_target: str = "app.main:app", command: list = None):
+    """Like running_server, but yield (base_url, Popen) and serve `app_target`
+
+    `command` replaces ``python -m uvicorn app_target`` as the launcher; it
+    must accept uvicorn's --host, --port and --log-level.
+    """
+    import httpx
+
+    port = free_port()
+    process = subprocess.Popen(
+        [*(command or [sys.executable, "-m", "uvicorn", app_target]), "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning", *(args or [])],
+        cwd=BACKEND_DIR,
+        env={**os.environ, "DATABASE_URL": db_url, **(env or {})},
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + startup_timeout
+        while True:
+            try:
+                if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("server failed to start")
+            time.sleep(0.2)
+        yield base_url, process
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def seed_sweets(engine, count: int, chunk_size: int = 10_000, seed: int = 42):
+    """Insert `count` synthetic sweets in chunked executemany batches"""
+    rng = random.Random(seed)
+    with engine.begin() as conn:
+        for start in range(0, count, chunk_size):
+            rows = [
+                {
+                    "name": f"Sweet {i}",
+                    "category": rng.choice(CATEGORIES),
+                    "price": round(rng.uniform(0.5, 20), 2),
+                    "quantity": rng.randint(0, 500),
+                    "description": f"Synthetic sweet number {i}",
+                }
+                for i in range(start, min(start + chunk_size, count))
+            ]
+            conn.execute(insert(Sweet), rows)
+
+
+def seed_user(session_factory, username: str = "bench", is_admin: bool = False) -> dict:
+    """Create a user and return Authorization headers for it"""
+    db = session_factory()
+    try:
+        db.add(User(
+            username=username,
+            email=f"{username}@example.com",
+            hashed_password=get_password_hash("benchpass123"),
+            is_admin=is_admin
+        ))
+        db.commit()
+    finally:
+        db.close()
+    return {"Authorization": f"Bearer {create_access_token({'sub': username})}"}
+
+
+def override_db(app, session_factory):
+    """Point the app's get_db dependency at `session_factory`"""
+    from app.database import get_db
+
+    def _get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = _get_db
+
+
+def asgi_request(app, method: str, path: str, headers: dict, body=None, on_chunk=None, keep_body=False):
+    """Call the ASGI app directly, streaming the request and response bodies.
+
+    Unlike TestClient (which buffers whole bodies on both sides), this feeds
+    the request from the `body` iterable of byte chunks and discards response
+    chunks as they arrive (unless `keep_body`), so RSS measurements reflect
+    the server's own memory use. Returns (status, body_size, body).
+    """
+    import asyncio
+
+    raw_path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.4"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": raw_path,
+        "raw_path": raw_path.encode(),
+        "query_string": query.encode(),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+        "root_path": "",
+    }
+    chunks = iter(body or ())
+    response = {"status": None, "size": 0, "body": []}
+
+    async def receive():
+        chunk = next(chunks, None)
+        if chunk is None:
+            return {"type": "http.request", "body": b"", "more_body": False}
+        return {"type": "http.request", "body": chunk, "more_body": True}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            chunk = message.get("body", b"")
+            response["size"] += len(chunk)
+            if keep_body:
+                response["body"].append(chunk)
+            if on_chunk is not None:
+                on_chunk(response["size"])
+
+    asyncio.run(app(scope, receive, send))
+    return response["status"], response["size"], b"".join(response["body"])
+
+
+def process_cpu_seconds(pid: int) -> float:
+    """User + system CPU time consumed so far by process `pid` (Linux only)"""
+    with open(f"/proc/{pid}/stat") as stat_file:
+        fields = stat_file.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def rss_mb(pid="self") -> float:
+    """Current resident set size of this process (or process `pid`) in MiB"""
+    try:
+        with open(f"/proc/{pid}/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * resource.getpagesize() / (1024 * 1024)
+    except OSError:
+        # Fall back to peak RSS where /proc is unavailable (macOS reports bytes)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if peak > 1 << 32 else peak / 1024
+
+
+def timed(fn, *args, **kwargs):
+    """Return (result, elapsed seconds)"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
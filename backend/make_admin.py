@@ -1,18 +1,33 @@
 """
 Script to make a user an admin
 Usage: python make_admin.py
+
+The change is recorded in token_revocations, which every running server
+worker re-reads each TOKEN_REVOCATION_POLL_SECONDS, dropping its cached copy
+of the user; the user's existing tokens get the new role from then on. Run
+with INVALIDATION_BUS_PATH set to the servers' bus file and it is announced
+there as well, reaching the workers within INVALIDATION_BUS_POLL_SECONDS.
+The schema is created or upgraded first, as the server would, so the
+script also works on a database no current server has opened yet.
 """
-from app.database import SessionLocal
+from app.database import SessionLocal, init_db
 from app.models import User
+# Importing app.utils.auth registers the User listeners that record the
+# revocation and announce it on the bus
+import app.utils.auth
+from app.utils.invalidation_bus import invalidation_bus
 
 def make_admin(username: str):
     """Make a user an admin"""
+    # The promotion records a token revocation, whose table may not exist yet
+    init_db()
     db = SessionLocal()
     try:
         user = db.query(User).filter(User.username == username).first()
         if user:
             user.is_admin = True
             db.commit()
+            invalidation_bus.close()
             print(f"✓ {username} is now an admin!")
             return True
         else:
@@ -0,0 +1,80 @@
+"""
+Production launcher for the Sweet Shop Backend
+
+Runs the API in several uvicorn worker processes sharing one listening
+socket (default: one per CPU, or WEB_CONCURRENCY), without auto-reload:
+
+    python serve.py --workers 4 --port 8000
+
+The database schema is created or upgraded once, here, before any worker
+starts; workers are started with INIT_DB_ON_STARTUP off, so they only read
+the database at startup and never race each other through the upgrade. Each worker
+keeps its own caches; they stay coherent through the invalidation bus, a
+small SQLite file (--bus-path, default sweet_shop_bus.db) that every worker
+publishes its writes to and polls for the others'.
+
+The parent process supervises the workers (restarting any that die or stop
+answering health checks) and handles signals:
+
+    SIGHUP           rolling restart: each worker is replaced only once its
+                     replacement is serving, e.g. after deploying new code
+    SIGTTIN/SIGTTOU  add/remove one worker
+    SIGTERM/SIGINT   stop accepting connections, let in-flight requests
+                     finish (up to --graceful-timeout seconds), then exit
+
+With --workers 1 the app runs in the launcher process itself, unsupervised.
+"""
+import argparse
+import os
+
+
+def default_workers() -> int:
+    return int(os.environ.get("WEB_CONCURRENCY") or os.cpu_count() or 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--keep-alive", type=int, default=5, help="idle keep-alive timeout, seconds")
+    parser.add_argument("--graceful-timeout", type=int, default=30,
+                        help="seconds in-flight requests get to finish on shutdown or restart")
+    parser.add_argument("--bus-path", default=os.environ.get("INVALIDATION_BUS_PATH", "sweet_shop_bus.db"),
+                        help="invalidation bus file shared by the workers")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    workers = max(1, args.workers)
+
+    # Settings are read from the environment when app.config is imported, so
+    # set up the workers' environment first; spawned workers inherit it
+    if workers > 1:
+        os.environ["INVALIDATION_BUS_PATH"] = args.bus_path
+        # Split the CPUs between the workers' bcrypt and image pools instead
+        # of giving every worker a process per CPU
+        pool_size = str(max(1, (os.cpu_count() or 1) // workers))
+        os.environ.setdefault("PASSWORD_HASH_WORKERS", pool_size)
+        os.environ.setdefault("IMAGE_VARIANT_WORKERS", pool_size)
+
+    # Done once below, not again by each worker
+    os.environ["INIT_DB_ON_STARTUP"] = "false"
+
+    import uvicorn
+    from app.database import init_db
+
+    init_db()
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        backlog=args.backlog,
+        timeout_keep_alive=args.keep_alive,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        log_level=args.log_level,
+    )
+
+
+if __name__ == "__main__":
+    main()
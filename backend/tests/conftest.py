@@ -1,13 +1,27 @@
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
+# The app's own engine (startup, background jobs, scripts) and uploads go to a
+# scratch directory, so running the suite never touches sweet_shop.db or uploads/
+_scratch = tempfile.TemporaryDirectory(prefix="sweet_shop_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_scratch.name, 'app.db')}"
+os.environ["UPLOAD_DIR"] = os.path.join(_scratch.name, "uploads")
+
+from app.config import settings
 from app.main import app
 from app.database import Base, get_db
 from app.models import User, Sweet
-from app.utils.auth import get_password_hash
+from app.utils.auth import get_password_hash, token_cache, token_revocations, user_cache
+from app.utils.catalog_cache import catalog_cache
 
 # Create test database
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -19,6 +33,29 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Background jobs use the app's own database, not the test one
+settings.UPLOAD_SWEEP_INTERVAL_SECONDS = 0
+settings.ROLLUP_INTERVAL_SECONDS = 0
+settings.TOKEN_REVOCATION_POLL_SECONDS = 0
+
+@pytest.fixture(autouse=True)
+def clear_user_cache():
+    """Tables are recreated per test, so cached user snapshots and revocations must not leak"""
+    user_cache.clear()
+    token_cache.clear()
+    token_revocations.clear()
+    yield
+    user_cache.clear()
+    token_cache.clear()
+    token_revocations.clear()
+
+@pytest.fixture(autouse=True)
+def clear_catalog_cache():
+    """Same for cached catalog responses"""
+    catalog_cache.clear()
+    yield
+    catalog_cache.clear()
+
 @pytest.fixture(scope="function")
 def db_session():
     """Create a fresh database for each test"""
@@ -30,6 +67,53 @@ def db_session():
         db.close()
         Base.metadata.drop_all(bind=engine)
 
+class QueryCounter:
+    """Records every statement the test engine executes, with its duration.
+
+    Wrap requests in `budget` to fail the test when they issue more
+    statements, or spend more time in the database, than allowed:
+
+        with query_counter.budget(3):
+            client.put(...)
+    """
+
+    def __init__(self, bind):
+        self.bind = bind
+        self.statements: List[Tuple[str, float]] = []
+        self._started: List[float] = []
+        event.listen(bind, "before_cursor_execute", self._before)
+        event.listen(bind, "after_cursor_execute", self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        self._started.append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append((statement, time.perf_counter() - self._started.pop()))
+
+    @contextmanager
+    def budget(self, max_statements: int, max_db_ms: Optional[float] = 50):
+        """Assert the block issues at most `max_statements` statements taking at most `max_db_ms` in total"""
+        start = len(self.statements)
+        yield
+        issued = self.statements[start:]
+        db_ms = sum(seconds for _, seconds in issued) * 1000
+        listing = "".join(f"\n  {seconds * 1000:6.2f} ms  {' '.join(sql.split())}" for sql, seconds in issued)
+        if len(issued) > max_statements:
+            pytest.fail(f"{len(issued)} statements issued, budget is {max_statements}:{listing}")
+        if max_db_ms is not None and db_ms > max_db_ms:
+            pytest.fail(f"{db_ms:.2f} ms of statements, budget is {max_db_ms} ms:{listing}")
+
+    def close(self) -> None:
+        event.remove(self.bind, "before_cursor_execute", self._before)
+        event.remove(self.bind, "after_cursor_execute", self._after)
+
+@pytest.fixture
+def query_counter():
+    """Statement counts and DB time for requests made in the test; see QueryCounter.budget"""
+    counter = QueryCounter(engine)
+    yield counter
+    counter.close()
+
 @pytest.fixture(scope="function")
 def client(db_session):
     """Create a test client with database override"""
@@ -0,0 +1,165 @@
+import time
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import status
+
+from app.models import MOVEMENT_PURCHASE, MOVEMENT_RESTOCK, SalesRollup, StockMovement
+from app.utils.rollups import SalesRollupCompactor
+
+HOUR_MS = 3600 * 1000
+
+
+def auth(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def compactor():
+    return SalesRollupCompactor(batch_size=2, settle_seconds=0)
+
+
+@pytest.fixture
+def ledger(db_session, multiple_sweets):
+    """Movements spread over two hours of one day, written straight to the ledger"""
+    gummy, lollipop, chocolate = multiple_sweets[0], multiple_sweets[1], multiple_sweets[2]
+    base = int(datetime(2024, 3, 1, 10, tzinfo=timezone.utc).timestamp() * 1000)
+    rows = [
+        (base, gummy, MOVEMENT_PURCHASE, -2, 3.99),
+        (base + 60_000, lollipop, MOVEMENT_PURCHASE, -10, 1.50),
+        (base + HOUR_MS, gummy, MOVEMENT_PURCHASE, -1, 4.50),
+        (base + HOUR_MS, chocolate, MOVEMENT_RESTOCK, 20, 4.99),
+        (base + HOUR_MS + 1, chocolate, MOVEMENT_PURCHASE, -3, 4.99),
+    ]
+    for ts, sweet, kind, delta, price in rows:
+        db_session.add(StockMovement(ts=ts, sweet_id=sweet.id, user_id=1, kind=kind, delta=delta, unit_price=price))
+    db_session.commit()
+    return multiple_sweets
+
+
+class TestSalesReports:
+    """Test cases for the analytics endpoints"""
+    
+    def sweets_report(self, client, token, **params):
+        response = client.get("/api/analytics/sweets", params=params, headers=auth(token))
+        assert response.status_code == status.HTTP_200_OK
+        return response.json()
+    
+    def test_reports_match_before_and_after_compaction(self, client, admin_token, ledger, compactor, db_session):
+        """Test results are exact whether movements are compacted, pending, or split between both"""
+        expected = [
+            {"sweet_id": ledger[1].id, "name": "Lollipop", "category": "Hard Candy",
+             "orders": 1, "units_sold": 10, "revenue": 15.0, "units_restocked": 0},
+            {"sweet_id": ledger[2].id, "name": "Dark Chocolate", "category": "Chocolate",
+             "orders": 1, "units_sold": 3, "revenue": 14.97, "units_restocked": 20},
+            {"sweet_id": ledger[0].id, "name": "Gummy Bears", "category": "Gummies",
+             "orders": 2, "units_sold": 3, "revenue": 12.48, "units_restocked": 0},
+        ]
+        assert self.sweets_report(client, admin_token) == expected
+        
+        assert compactor.compact_batch(db_session) is True
+        assert self.sweets_report(client, admin_token) == expected
+        assert self.sweets_report(client, admin_token, start="2024-03-01", end="2024-03-01") == expected
+        
+        compactor.compact(db_session)
+        assert compactor.movements_compacted == 5
+        assert self.sweets_report(client, admin_token) == expected
+        assert self.sweets_report(client, admin_token, start="2024-03-02") == []
+        assert db_session.query(SalesRollup).filter_by(bucket_size=3600).count() == 4
+    
+    def test_categories_keep_sales_where_they_were_made(self, client, admin_token, ledger, compactor, db_session):
+        """Test recategorizing a sweet does not move its compacted history"""
+        compactor.compact(db_session)
+        client.put(f"/api/sweets/{ledger[0].id}", json={"category": "Chocolate"}, headers=auth(admin_token))
+        client.post(f"/api/sweets/{ledger[0].id}/purchase", json={"quantity": 1}, headers=auth(admin_token))
+        
+        response = client.get("/api/analytics/categories", headers=auth(admin_token))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == [
+            {"category": "Chocolate", "orders": 2, "units_sold": 4, "revenue": 18.96, "units_restocked": 20},
+            {"category": "Hard Candy", "orders": 1, "units_sold": 10, "revenue": 15.0, "units_restocked": 0},
+            {"category": "Gummies", "orders": 2, "units_sold": 3, "revenue": 12.48, "units_restocked": 0},
+        ]
+    
+    def test_timeseries_is_zero_filled(self, client, admin_token, ledger, compactor, db_session):
+        """Test hourly buckets cover the range, with sweet and category filters"""
+        compactor.compact_batch(db_session)
+        params = {"interval": "hour", "start": "2024-03-01T09:00:00Z", "end": "2024-03-01T12:00:00Z"}
+        response = client.get("/api/analytics/timeseries", params=params, headers=auth(admin_token))
+        assert response.status_code == status.HTTP_200_OK
+        assert [(bucket["start"][11:13], bucket["units_sold"], bucket["revenue"]) for bucket in response.json()] == [
+            ("09", 0, 0.0), ("10", 12, 22.98), ("11", 4, 19.47),
+        ]
+        
+        gummies = client.get(
+            "/api/analytics/timeseries", params={**params, "category": "gummies"}, headers=auth(admin_token)
+        ).json()
+        assert [bucket["orders"] for bucket in gummies] == [0, 1, 1]
+        by_day = client.get(
+            "/api/analytics/timeseries",
+            params={"interval": "day", "start": "2024-03-01", "end": "2024-03-02", "sweet_id": ledger[2].id},
+            headers=auth(admin_token)
+        ).json()
+        assert by_day == [{
+            "start": "2024-03-01T00:00:00Z", "orders": 1, "units_sold": 3, "revenue": 14.97, "units_restocked": 20
+        }]
+    
+    def test_timeseries_range_is_capped(self, client, admin_token):
+        """Test overly long hourly ranges are refused"""
+        response = client.get(
+            "/api/analytics/timeseries",
+            params={"interval": "hour", "start": "2020-01-01T00:00:00", "end": "2024-01-01T00:00:00"},
+            headers=auth(admin_token)
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_analytics_are_admin_only(self, client, user_token):
+        """Test regular users are refused"""
+        for path in ("/api/analytics/sweets", "/api/analytics/categories", "/api/analytics/timeseries"):
+            assert client.get(path, headers=auth(user_token)).status_code == status.HTTP_403_FORBIDDEN
+
+
+class TestRollupCompactor:
+    """Test cases for incremental rollup maintenance"""
+    
+    def test_unsettled_movements_wait(self, ledger, db_session):
+        """Test compaction stops before movements younger than the settle time"""
+        db_session.add(StockMovement(
+            ts=int(time.time() * 1000), sweet_id=ledger[0].id, user_id=1, kind=MOVEMENT_PURCHASE, delta=-1, unit_price=1.0
+        ))
+        db_session.commit()
+        compactor = SalesRollupCompactor(batch_size=100, settle_seconds=60)
+        compactor.compact(db_session)
+        assert compactor.movements_compacted == 5
+        compactor.compact(db_session, now=time.time() + 120)
+        assert compactor.movements_compacted == 6
+    
+    def test_concurrent_compactor_loses_cleanly(self, ledger, db_session, monkeypatch):
+        """Test a batch whose watermark moved underneath it folds nothing"""
+        racer = SalesRollupCompactor(batch_size=100, settle_seconds=0)
+        loser = SalesRollupCompactor(batch_size=100, settle_seconds=0)
+        rollback = db_session.rollback
+        
+        def rollback_then_race():
+            # Between the loser's read and its write, another compactor commits
+            rollback()
+            monkeypatch.setattr(db_session, "rollback", rollback)
+            racer.compact(db_session)
+        
+        monkeypatch.setattr(db_session, "rollback", rollback_then_race)
+        assert loser.compact_batch(db_session) is True
+        assert (racer.movements_compacted, loser.movements_compacted) == (5, 0)
+        assert loser.compact_batch(db_session) is False
+        units = dict(db_session.query(SalesRollup.sweet_id, SalesRollup.units_sold).filter_by(bucket_size=0))
+        assert units == {ledger[0].id: 3, ledger[1].id: 10, ledger[2].id: 3}
+    
+    def test_purchases_flow_into_rollups(self, client, user_token, test_sweet, db_session):
+        """Test API purchases show up in reports before and after compaction"""
+        for quantity in (1, 2):
+            client.post(f"/api/sweets/{test_sweet.id}/purchase", json={"quantity": quantity}, headers=auth(user_token))
+        compactor = SalesRollupCompactor(batch_size=100, settle_seconds=0)
+        compactor.compact(db_session)
+        rollup = db_session.query(SalesRollup).filter_by(bucket_size=0).one()
+        assert (rollup.sweet_id, rollup.category, rollup.orders, rollup.units_sold, rollup.revenue) == (
+            test_sweet.id, "Chocolate", 2, 3, 7.5
+        )
@@ -0,0 +1,139 @@
+"""
+Run the API against an AsyncSession (the ASYNC_DB=true path).
+
+Handlers dispatch on the session type they are given, so overriding get_db
+with an aiosqlite-backed AsyncSession exercises the same code the async
+engine serves in production.
+"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.main import app
+from app.database import Base, async_database_url, get_db
+from app.models import User
+
+
+@pytest.fixture
+def async_client(tmp_path):
+    url = f"sqlite:///{tmp_path / 'async.db'}"
+    sync_engine = create_engine(url)
+    Base.metadata.create_all(bind=sync_engine)
+    sync_engine.dispose()
+
+    async_engine = create_async_engine(async_database_url(url))
+    session_factory = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_db():
+        async with session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as test_client:
+        yield test_client
+        test_client.portal.call(async_engine.dispose)
+    app.dependency_overrides.clear()
+
+
+def _admin_headers(client):
+    client.post("/api/auth/register", json={
+        "username": "asyncadmin", "email": "asyncadmin@example.com", "password": "asyncpass123"
+    })
+    # Promote through the API's own database, then log in for a fresh token
+    async def promote():
+        async for db in app.dependency_overrides[get_db]():
+            await db.execute(update(User).where(User.username == "asyncadmin").values(is_admin=True))
+            await db.commit()
+
+    client.portal.call(promote)
+    response = client.post("/api/auth/login", json={"username": "asyncadmin", "password": "asyncpass123"})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_async_database_url():
+    assert async_database_url("sqlite:///./sweet_shop.db") == "sqlite+aiosqlite:///./sweet_shop.db"
+    assert async_database_url("postgresql://u:p@db/shop") == "postgresql+asyncpg://u:p@db/shop"
+    # An explicitly chosen driver is left alone
+    assert async_database_url("postgresql+psycopg://u:p@db/shop") == "postgresql+psycopg://u:p@db/shop"
+
+
+def test_auth_flow(async_client):
+    response = async_client.post("/api/auth/register", json={
+        "username": "asyncuser", "email": "async@example.com", "password": "asyncpass123"
+    })
+    assert response.status_code == 201
+    assert response.json()["username"] == "asyncuser"
+
+    duplicate = async_client.post("/api/auth/register", json={
+        "username": "asyncuser", "email": "other@example.com", "password": "asyncpass123"
+    })
+    assert duplicate.status_code == 400
+
+    response = async_client.post("/api/auth/login", json={"username": "asyncuser", "password": "asyncpass123"})
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    me = async_client.get("/api/auth/me", headers=headers)
+    assert me.status_code == 200
+    assert me.json()["email"] == "async@example.com"
+
+
+def test_sweet_lifecycle(async_client):
+    headers = _admin_headers(async_client)
+
+    created = async_client.post("/api/sweets", json={
+        "name": "Dark Chocolate", "category": "Chocolate", "price": 2.5, "quantity": 10
+    }, headers=headers)
+    assert created.status_code == 201
+    sweet_id = created.json()["id"]
+
+    assert async_client.get(f"/api/sweets/{sweet_id}", headers=headers).json()["name"] == "Dark Chocolate"
+    assert async_client.get("/api/sweets/999", headers=headers).status_code == 404
+
+    updated = async_client.put(f"/api/sweets/{sweet_id}", json={"price": 3.0}, headers=headers)
+    assert updated.json()["price"] == 3.0
+
+    results = async_client.get("/api/sweets/search?q=chocolate", headers=headers).json()
+    assert [sweet["id"] for sweet in results] == [sweet_id]
+
+    purchased = async_client.post(f"/api/sweets/{sweet_id}/purchase", json={"quantity": 4}, headers=headers)
+    assert purchased.json()["quantity"] == 6
+    oversold = async_client.post(f"/api/sweets/{sweet_id}/purchase", json={"quantity": 7}, headers=headers)
+    assert oversold.status_code == 400
+    assert "Available: 6" in oversold.json()["detail"]
+
+    batch = async_client.post("/api/sweets/purchase-batch", json={
+        "items": [{"sweet_id": sweet_id, "quantity": 1}, {"sweet_id": sweet_id, "quantity": 2}]
+    }, headers=headers)
+    assert batch.json()[0]["quantity"] == 3
+
+    restocked = async_client.post(f"/api/sweets/{sweet_id}/restock", json={"quantity": 7}, headers=headers)
+    assert restocked.json()["quantity"] == 10
+
+    assert async_client.delete(f"/api/sweets/{sweet_id}", headers=headers).status_code == 204
+    assert async_client.get(f"/api/sweets/{sweet_id}", headers=headers).status_code == 404
+
+
+def test_bulk_pagination_and_streaming(async_client):
+    headers = _admin_headers(async_client)
+    body = "name,category,price,quantity\n" + "".join(
+        f"Sweet {i},Gummies,1.5,{i}\n" for i in range(25)
+    )
+    imported = async_client.post(
+        "/api/sweets/bulk", content=body, headers={**headers, "Content-Type": "text/csv"}
+    )
+    assert imported.json()["inserted"] == 25
+
+    page = async_client.get("/api/sweets?limit=10", headers=headers)
+    assert len(page.json()) == 10
+    assert page.headers["X-Next-Cursor"] == str(page.json()[-1]["id"])
+
+    streamed = async_client.get("/api/sweets?format=ndjson", headers=headers)
+    assert len(streamed.text.splitlines()) == 25
+
+    exported = async_client.get("/api/sweets/export", headers=headers)
+    lines = exported.text.splitlines()
+    assert lines[0].startswith("id,name,category")
+    assert len(lines) == 26
@@ -1,5 +1,23 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+from pathlib import Path
+
 import pytest
 from fastapi import status
+from jose import jwt
+from sqlalchemy import event, text
+
+from app import main as app_main
+from app.config import settings
+from app.database import SessionLocal, engine as app_engine, init_db
+from app.models import TokenRevocation
+from app.routers import auth as auth_router
+from app.utils import auth as auth_utils
+from app.utils.auth import create_access_token, token_cache, token_revocations, user_cache
+from app.utils.hashing_pool import password_pool
 
 class TestUserRegistration:
     """Test cases for user registration"""
@@ -48,6 +66,29 @@ class TestUserRegistration:
         assert response.status_code == status.HTTP_400_BAD_REQUEST
         assert "Email already registered" in response.json()["detail"]
     
+    @pytest.mark.parametrize("username,email,detail", [
+        ("testuser", "different@example.com", "Username already registered"),
+        ("differentuser", "test@example.com", "Email already registered"),
+    ])
+    def test_register_concurrent_duplicate(self, client, test_user, monkeypatch, username, email, detail):
+        """Test a duplicate registered after the pre-check still gets a 400, not a 500"""
+        find_existing_names = auth_router._find_existing_names
+        calls = []
+        
+        def racing_check(db, *args):
+            # The first check runs before the other registration commits
+            calls.append(args)
+            return [] if len(calls) == 1 else find_existing_names(db, *args)
+        
+        monkeypatch.setattr(auth_router, "_find_existing_names", racing_check)
+        response = client.post(
+            "/api/auth/register",
+            json={"username": username, "email": email, "password": "password123"}
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()["detail"] == detail
+        assert len(calls) == 2
+    
     def test_register_invalid_email(self, client):
         """Test registration with invalid email format fails"""
         response = client.post(
@@ -135,6 +176,36 @@ class TestUserLogin:
         assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
 
 
+class TestPasswordHashingPool:
+    """Test cases for admission control on the password hashing pool"""
+    
+    def test_login_rejected_when_pool_saturated(self, client, test_user, monkeypatch):
+        """Test logins get 503 with Retry-After once the hashing queue is full"""
+        monkeypatch.setattr(password_pool, "max_pending", 0)
+        response = client.post(
+            "/api/auth/login",
+            json={"username": "testuser", "password": "testpass123"}
+        )
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.headers["Retry-After"] == "1"
+    
+    def test_register_rejected_when_pool_saturated(self, client, monkeypatch):
+        """Test registration is refused before creating a user when saturated"""
+        monkeypatch.setattr(password_pool, "max_pending", 0)
+        response = client.post(
+            "/api/auth/register",
+            json={"username": "newuser", "email": "newuser@example.com", "password": "password123"}
+        )
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        
+        monkeypatch.undo()
+        retry = client.post(
+            "/api/auth/register",
+            json={"username": "newuser", "email": "newuser@example.com", "password": "password123"}
+        )
+        assert retry.status_code == status.HTTP_201_CREATED
+
+
 class TestGetCurrentUser:
     """Test cases for getting current user info"""
     
@@ -173,3 +244,266 @@ class TestGetCurrentUser:
         data = response.json()
         assert data["username"] == "admin"
         assert data["is_admin"] is True
+
+
+class TestUserCache:
+    """Test cases for the authenticated-user cache"""
+    
+    def test_repeat_requests_hit_cache(self, client, test_user, user_token):
+        """Test the user row is looked up once per token"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        for _ in range(3):
+            assert client.get("/api/auth/me", headers=headers).status_code == status.HTTP_200_OK
+        stats = user_cache.stats()
+        assert stats["misses"] == 1
+        assert stats["hits"] == 2
+    
+    def test_admin_promotion_invalidates_cache(self, client, db_session, test_user, user_token):
+        """Test changing is_admin is visible on the next request"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        assert client.get("/api/auth/me", headers=headers).json()["is_admin"] is False
+        
+        test_user.is_admin = True
+        db_session.commit()
+        
+        assert client.get("/api/auth/me", headers=headers).json()["is_admin"] is True
+    
+    def test_deleted_user_is_rejected(self, client, db_session, test_user, user_token):
+        """Test a deleted user's cached snapshot is dropped"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        assert client.get("/api/auth/me", headers=headers).status_code == status.HTTP_200_OK
+        
+        db_session.delete(test_user)
+        db_session.commit()
+        
+        assert client.get("/api/auth/me", headers=headers).status_code == status.HTTP_401_UNAUTHORIZED
+
+class TestTokenClaims:
+    """Test cases for cached token verification and claims-based admin checks"""
+    
+    def test_login_token_carries_claims(self, client, admin_user, admin_token):
+        """Test tokens name the user's id and admin flag and when they were issued"""
+        payload = jwt.decode(admin_token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        assert payload["sub"] == "admin"
+        assert payload["uid"] == admin_user.id
+        assert payload["is_admin"] is True
+        assert payload["iat"] <= payload["exp"]
+    
+    def test_token_is_verified_once(self, client, test_user, user_token, monkeypatch):
+        """Test repeat requests with one token skip decoding it"""
+        decodes = []
+        real_decode = jwt.decode
+        
+        def counting_decode(*args, **kwargs):
+            decodes.append(args[0])
+            return real_decode(*args, **kwargs)
+        
+        monkeypatch.setattr(auth_utils.jwt, "decode", counting_decode)
+        headers = {"Authorization": f"Bearer {user_token}"}
+        for _ in range(3):
+            assert client.get("/api/auth/me", headers=headers).status_code == status.HTTP_200_OK
+        assert len(decodes) == 1
+        assert token_cache.stats()["hits"] == 2
+    
+    def test_tampered_token_is_rejected(self, client, test_user, user_token):
+        """Test only the exact verified token is served from the cache"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        assert client.get("/api/auth/me", headers=headers).status_code == status.HTTP_200_OK
+        header, payload, signature = user_token.split(".")
+        tampered = f"{header}.{payload}.{signature[:-2]}AA"
+        response = client.get("/api/auth/me", headers={"Authorization": f"Bearer {tampered}"})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    
+    def test_admin_check_needs_no_lookup(self, client, admin_token, user_token, query_counter):
+        """Test admin endpoints authorize from the claims, without the user cache or the database"""
+        with query_counter.budget(1):
+            response = client.get("/api/sweets/low-stock", headers={"Authorization": f"Bearer {admin_token}"})
+            assert response.status_code == status.HTTP_200_OK
+        with query_counter.budget(0):
+            response = client.get("/api/sweets/low-stock", headers={"Authorization": f"Bearer {user_token}"})
+            assert response.status_code == status.HTTP_403_FORBIDDEN
+        assert user_cache.stats()["size"] == 0
+    
+    def test_tokens_without_claims_are_looked_up(self, client, admin_user, query_counter):
+        """Test tokens issued before the claims existed still work, via the user lookup"""
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': 'admin'})}"}
+        with query_counter.budget(2):
+            assert client.get("/api/sweets/low-stock", headers=headers).status_code == status.HTTP_200_OK
+    
+    def test_claims_age_out_with_the_user_cache_ttl(self, client, admin_user, query_counter):
+        """Test claims older than USER_CACHE_TTL_SECONDS are checked against the database"""
+        token = create_access_token({
+            "sub": "admin", "uid": admin_user.id, "is_admin": True,
+            "iat": int(time.time()) - settings.USER_CACHE_TTL_SECONDS
+        })
+        with query_counter.budget(2):
+            response = client.get("/api/sweets/low-stock", headers={"Authorization": f"Bearer {token}"})
+            assert response.status_code == status.HTTP_200_OK
+        assert user_cache.stats()["size"] == 1
+    
+    def test_unrecorded_demotion_applies_once_claims_age_out(self, client, db_session, admin_user, admin_token,
+                                                             monkeypatch):
+        """Test a direct SQL demotion, which records no revocation, is bounded by USER_CACHE_TTL_SECONDS"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        db_session.execute(text("UPDATE users SET is_admin = 0 WHERE username = 'admin'"))
+        db_session.commit()
+        assert client.get("/api/sweets/low-stock", headers=headers).status_code == status.HTTP_200_OK
+        
+        # As if USER_CACHE_TTL_SECONDS had passed since login
+        monkeypatch.setattr(settings, "USER_CACHE_TTL_SECONDS", 0)
+        assert client.get("/api/sweets/low-stock", headers=headers).status_code == status.HTTP_403_FORBIDDEN
+    
+    def test_demoted_admin_is_refused(self, client, db_session, admin_user, admin_token):
+        """Test an admin flag change revokes the claims of tokens issued before it"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        assert client.get("/api/sweets/low-stock", headers=headers).status_code == status.HTTP_200_OK
+        
+        admin_user.is_admin = False
+        db_session.commit()
+        
+        assert client.get("/api/sweets/low-stock", headers=headers).status_code == status.HTTP_403_FORBIDDEN
+        assert db_session.get(TokenRevocation, "admin") is not None
+    
+    def test_promoted_user_is_allowed(self, client, db_session, test_user, user_token):
+        """Test a promotion takes effect for tokens whose claims say otherwise"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        assert client.get("/api/sweets/low-stock", headers=headers).status_code == status.HTTP_403_FORBIDDEN
+        
+        test_user.is_admin = True
+        db_session.commit()
+        
+        assert client.get("/api/sweets/low-stock", headers=headers).status_code == status.HTTP_200_OK
+    
+    def test_deleted_admin_is_rejected(self, client, db_session, admin_user, admin_token):
+        """Test a deleted admin's tokens stop working"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        db_session.delete(admin_user)
+        db_session.commit()
+        
+        assert client.get("/api/sweets/low-stock", headers=headers).status_code == status.HTTP_401_UNAUTHORIZED
+    
+    def test_revocations_survive_restart(self, client, db_session, admin_user, admin_token):
+        """Test a worker that starts after a demotion loads it from the database"""
+        admin_user.is_admin = False
+        db_session.commit()
+        
+        token_revocations.clear()
+        token_revocations.load(db_session)
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        assert client.get("/api/sweets/low-stock", headers=headers).status_code == status.HTTP_403_FORBIDDEN
+    
+    def test_init_db_prunes_expired_revocations(self):
+        """Test init_db drops revocations older than any valid token"""
+        init_db()
+        lifetime = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        with SessionLocal() as db:
+            db.merge(TokenRevocation(username="expired", revoked_at=time.time() - lifetime - 5))
+            db.merge(TokenRevocation(username="recent", revoked_at=time.time() - 5))
+            db.commit()
+            init_db()
+            assert {row.username for row in db.query(TokenRevocation)} == {"recent"}
+            db.query(TokenRevocation).delete()
+            db.commit()
+    
+    def test_worker_startup_makes_no_writes(self, monkeypatch):
+        """Test a worker started by serve.py (INIT_DB_ON_STARTUP off) only reads the database"""
+        init_db()
+        monkeypatch.setattr(settings, "INIT_DB_ON_STARTUP", False)
+        statements = []
+        
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement.split(None, 1)[0].upper())
+        
+        event.listen(app_engine, "before_cursor_execute", record)
+        try:
+            app_main.startup_event()
+        finally:
+            event.remove(app_engine, "before_cursor_execute", record)
+        assert statements == ["SELECT"]
+    
+    def test_revocation_from_another_process_is_polled(self, client, db_session, test_user, user_token):
+        """Test a promotion committed elsewhere (make_admin.py) applies once the table is reloaded"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        assert client.get("/api/auth/me", headers=headers).json()["is_admin"] is False
+        
+        # Another process's commit: no listener or bus event reaches this one
+        db_session.execute(text("UPDATE users SET is_admin = 1 WHERE username = 'testuser'"))
+        db_session.add(TokenRevocation(username="testuser", revoked_at=time.time() + 1))
+        db_session.commit()
+        assert client.get("/api/sweets/low-stock", headers=headers).status_code == status.HTTP_403_FORBIDDEN
+        
+        # What each worker's TOKEN_REVOCATION_POLL_SECONDS job does
+        token_revocations.load(db_session)
+        assert client.get("/api/sweets/low-stock", headers=headers).status_code == status.HTTP_200_OK
+        assert client.get("/api/auth/me", headers=headers).json()["is_admin"] is True
+    
+    def test_missed_bus_events_distrust_all_claims(self, client, admin_user, admin_token, query_counter):
+        """Test revoke_all sends every existing token through the user lookup"""
+        token_revocations.revoke_all()
+        with query_counter.budget(2):
+            response = client.get("/api/sweets/low-stock", headers={"Authorization": f"Bearer {admin_token}"})
+            assert response.status_code == status.HTTP_200_OK
+        assert user_cache.stats()["size"] == 1
+
+class TestMakeAdminScript:
+    """Test cases for make_admin.py"""
+    
+    # The schema of databases created before any of the server's upgrades
+    BASELINE_SCHEMA = """
+        CREATE TABLE users (
+            id INTEGER NOT NULL, username VARCHAR NOT NULL, email VARCHAR NOT NULL,
+            hashed_password VARCHAR NOT NULL, is_admin BOOLEAN, PRIMARY KEY (id)
+        );
+        CREATE UNIQUE INDEX ix_users_username ON users (username);
+        CREATE UNIQUE INDEX ix_users_email ON users (email);
+        CREATE TABLE sweets (
+            id INTEGER NOT NULL, name VARCHAR NOT NULL, category VARCHAR NOT NULL,
+            price FLOAT NOT NULL, quantity INTEGER NOT NULL, description VARCHAR, PRIMARY KEY (id)
+        );
+        INSERT INTO users (username, email, hashed_password, is_admin)
+        VALUES ('pat', 'pat@example.com', 'not-a-hash', 0);
+    """
+    
+    def test_make_admin_on_baseline_database(self, tmp_path):
+        """Test the script upgrades a database the server has not touched yet, then promotes"""
+        db_path = tmp_path / "baseline.db"
+        with sqlite3.connect(db_path) as connection:
+            connection.executescript(self.BASELINE_SCHEMA)
+        
+        result = subprocess.run(
+            [sys.executable, "make_admin.py"],
+            input="pat\n",
+            cwd=Path(__file__).resolve().parent.parent,
+            env={**os.environ, "DATABASE_URL": f"sqlite:///{db_path}"},
+            capture_output=True,
+            text=True,
+            timeout=60
+        )
+        assert result.returncode == 0, result.stderr
+        assert "pat is now an admin" in result.stdout
+        
+        with sqlite3.connect(db_path) as connection:
+            assert connection.execute("SELECT is_admin FROM users WHERE username = 'pat'").fetchone() == (1,)
+            assert connection.execute("SELECT username FROM token_revocations").fetchall() == [("pat",)]
+
+class TestQueryBudgets:
+    """Statement budgets for the auth endpoints"""
+    
+    def test_register_login_me(self, client, query_counter):
+        """Test each auth request stays within its statement budget, and /me is served from the user cache"""
+        with query_counter.budget(3):
+            response = client.post("/api/auth/register", json={
+                "username": "budgeted", "email": "budgeted@example.com", "password": "secret123"
+            })
+            assert response.status_code == status.HTTP_201_CREATED
+        with query_counter.budget(1):
+            response = client.post("/api/auth/login", json={"username": "budgeted", "password": "wrongpass"})
+            assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        with query_counter.budget(1):
+            response = client.post("/api/auth/login", json={"username": "budgeted", "password": "secret123"})
+            assert response.status_code == status.HTTP_200_OK
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        with query_counter.budget(1):
+            assert client.get("/api/auth/me", headers=headers).status_code == status.HTTP_200_OK
+        with query_counter.budget(0):
+            assert client.get("/api/auth/me", headers=headers).status_code == status.HTTP_200_OK
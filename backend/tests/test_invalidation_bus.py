@@ -0,0 +1,130 @@
+import pytest
+from fastapi import status
+
+from app.utils.auth import user_cache
+from app.utils.catalog_cache import catalog_cache
+from app.utils.invalidation_bus import CATALOG_TOPIC, USER_TOPIC, InvalidationBus, invalidation_bus
+from app.utils.stock_stream import stock_broadcaster
+
+
+@pytest.fixture
+def bus_path(tmp_path):
+    return str(tmp_path / "bus.db")
+
+
+@pytest.fixture
+def app_bus(bus_path, monkeypatch):
+    """Turn on this process's bus, as serve.py does for each worker"""
+    monkeypatch.setattr(invalidation_bus, "path", bus_path)
+    invalidation_bus.sync()
+    yield invalidation_bus
+    invalidation_bus.close()
+
+
+class TestInvalidationBus:
+    """Test cases for the cross-worker invalidation bus"""
+
+    def test_events_reach_other_workers_only(self, bus_path):
+        """Test a published event is delivered once to every other bus, never back to its sender"""
+        sender = InvalidationBus(bus_path, poll_interval=0.05)
+        receiver = InvalidationBus(bus_path, poll_interval=0.05)
+        sender.sync()
+        receiver.sync()
+
+        sender.publish(CATALOG_TOPIC, [[1, {"quantity": 4}]])
+        sender.publish(USER_TOPIC, "alice")
+        assert sender.sync() == ([], False)
+        assert receiver.sync() == ([(CATALOG_TOPIC, [[1, {"quantity": 4}]]), (USER_TOPIC, "alice")], False)
+        assert receiver.sync() == ([], False)
+        assert sender.stats()["published"] == 2
+        sender.close()
+        receiver.close()
+
+    def test_disabled_bus_drops_events(self):
+        """Test publishing without a path is a no-op"""
+        bus = InvalidationBus(None, poll_interval=0.05)
+        bus.publish(CATALOG_TOPIC, [])
+        assert not bus.enabled
+        assert bus._outbox == []
+
+    def test_missed_events_drop_everything(self, bus_path):
+        """Test a worker that fell behind the retention window runs its gap callbacks"""
+        sender = InvalidationBus(bus_path, poll_interval=0.05, retention=60)
+        receiver = InvalidationBus(bus_path, poll_interval=0.05, retention=60)
+        sender.sync(now=1000)
+        receiver.sync(now=1000)
+        sender.publish(CATALOG_TOPIC, [])
+        sender.sync(now=1000)
+        # Pruned before the receiver read it
+        sender.sync(now=2000)
+
+        dropped = []
+        receiver.on_gap.append(lambda: dropped.append(True))
+        receiver.dispatch(*receiver.sync(now=2000))
+        assert dropped == [True]
+        assert receiver.stats()["gaps"] == 1
+        assert receiver.sync(now=2000) == ([], False)
+        sender.close()
+        receiver.close()
+
+    def test_failing_handler_does_not_stop_dispatch(self):
+        """Test one broken handler is logged and the rest still run"""
+        bus = InvalidationBus(None, poll_interval=0.05)
+        seen = []
+        bus.subscribe(USER_TOPIC, lambda username: 1 / 0)
+        bus.subscribe(USER_TOPIC, seen.append)
+        bus.dispatch([(USER_TOPIC, "alice"), (USER_TOPIC, "bob")], False)
+        assert seen == ["alice", "bob"]
+
+
+class TestAppInvalidation:
+    """Test cases for the app's caches following other workers' writes"""
+
+    def test_remote_catalog_writes_apply_locally(self, client, user_token, test_sweet, app_bus, bus_path):
+        """Test another worker's purchase bumps the catalog cache and reaches stream subscribers"""
+        other_worker = InvalidationBus(bus_path, poll_interval=0.05)
+        other_worker.sync()
+        version = catalog_cache.version
+        cursor = stock_broadcaster.seq
+
+        other_worker.publish(CATALOG_TOPIC, [[test_sweet.id, {"quantity": 99}]])
+        other_worker.sync()
+        app_bus.dispatch(*app_bus.sync())
+        assert catalog_cache.version > version
+        assert stock_broadcaster.changes_since(cursor)[1] == [{"id": test_sweet.id, "quantity": 99}]
+        other_worker.close()
+
+    def test_local_writes_are_published(self, client, db_session, user_token, admin_token, test_user, test_sweet,
+                                        app_bus, bus_path):
+        """Test purchases and user changes here are announced to other workers"""
+        other_worker = InvalidationBus(bus_path, poll_interval=0.05)
+        other_worker.sync()
+
+        response = client.post(
+            f"/api/sweets/{test_sweet.id}/purchase",
+            headers={"Authorization": f"Bearer {user_token}"}, json={"quantity": 2}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        test_user.is_admin = True
+        db_session.commit()
+        app_bus.sync()
+
+        events, missed = other_worker.sync()
+        assert not missed
+        assert (CATALOG_TOPIC, [[test_sweet.id, {"quantity": 98}]]) in events
+        assert (USER_TOPIC, test_user.username) in events
+        other_worker.close()
+
+    def test_remote_user_change_drops_cached_user(self, client, user_token, test_user, app_bus, bus_path):
+        """Test another worker's user update evicts the cached snapshot here"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        assert client.get("/api/auth/me", headers=headers).status_code == status.HTTP_200_OK
+        assert user_cache.stats()["size"] == 1
+
+        other_worker = InvalidationBus(bus_path, poll_interval=0.05)
+        other_worker.sync()
+        other_worker.publish(USER_TOPIC, test_user.username)
+        other_worker.sync()
+        app_bus.dispatch(*app_bus.sync())
+        assert user_cache.stats()["size"] == 0
+        other_worker.close()
@@ -0,0 +1,137 @@
+import asyncio
+import re
+import threading
+import time
+
+from fastapi import status
+
+from app.utils.metrics import Histogram, metrics
+from app.utils.profiler import SlowRequestProfiler
+
+
+def auth(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def sample(text: str, name: str, **labels) -> float:
+    """Value of one sample in Prometheus text output"""
+    wanted = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(rf"^{re.escape(name)}\{{{re.escape(wanted)}\}} (\S+)$", text, re.MULTILINE)
+    assert match, f"{name}{{{wanted}}} not found"
+    return float(match.group(1))
+
+
+def server_timing(header: str) -> dict:
+    """Server-Timing metric name -> (duration ms, description)"""
+    timings = {}
+    for metric in header.split(", "):
+        name, *params = metric.split(";")
+        fields = dict(param.split("=", 1) for param in params)
+        timings[name] = (float(fields["dur"]), fields.get("desc", "").strip('"'))
+    return timings
+
+
+class TestHistogram:
+    """Test cases for the Prometheus histogram"""
+
+    def test_render(self):
+        """Test cumulative buckets, sum and count in exposition format"""
+        histogram = Histogram("latency_seconds", "Latency", ("route",), (0.1, 1))
+        histogram.observe(("/a",), 0.05)
+        histogram.observe(("/a",), 0.1)
+        histogram.observe(("/a",), 5)
+        assert list(histogram.render()) == [
+            "# HELP latency_seconds Latency",
+            "# TYPE latency_seconds histogram",
+            'latency_seconds_bucket{route="/a",le="0.1"} 2',
+            'latency_seconds_bucket{route="/a",le="1"} 2',
+            'latency_seconds_bucket{route="/a",le="+Inf"} 3',
+            'latency_seconds_sum{route="/a"} 5.15',
+            'latency_seconds_count{route="/a"} 3',
+        ]
+
+
+class TestRequestMetrics:
+    """Test cases for the metrics middleware and /metrics"""
+
+    def test_requests_are_recorded_by_route_template(self, client, user_token, test_sweet):
+        """Test latency, DB and serialization histograms are labelled with the route, not the URL"""
+        labels = ("GET", "/api/sweets/{sweet_id}")
+        before = metrics.db_queries.count(labels)
+        for _ in range(2):
+            response = client.get(f"/api/sweets/{test_sweet.id}", headers=auth(user_token))
+            assert response.status_code == status.HTTP_200_OK
+        assert metrics.db_queries.count(labels) == before + 2
+
+        text = client.get("/metrics").text
+        assert sample(
+            text, "http_request_duration_seconds_count", method="GET", route="/api/sweets/{sweet_id}", status="200"
+        ) >= 2
+        assert sample(text, "http_request_db_queries_sum", method="GET", route="/api/sweets/{sweet_id}") >= 1
+        assert f"/api/sweets/{test_sweet.id}\"" not in text
+        assert sample(text, "cache_hits_total", cache="catalog") >= 1
+        assert "# TYPE http_request_serialize_seconds histogram" in text
+
+    def test_server_timing_breaks_down_the_request(self, client, user_token, test_sweet):
+        """Test responses report DB, auth and serialization time"""
+        response = client.get(f"/api/sweets/{test_sweet.id}", headers=auth(user_token))
+        timings = server_timing(response.headers["server-timing"])
+        assert timings["db"][1] != "0 queries"
+        assert {"auth", "serialize", "total"} <= set(timings)
+        assert timings["total"][0] >= timings["db"][0]
+
+    def test_response_model_serialization_is_timed(self, client, user_token):
+        """Test FastAPI's response_model encoding counts as serialization"""
+        response = client.get("/api/auth/me", headers=auth(user_token))
+        assert "serialize" in server_timing(response.headers["server-timing"])
+
+    def test_unmatched_paths_share_a_label(self, client):
+        """Test 404s don't create a series per URL"""
+        client.get("/no/such/path")
+        text = client.get("/metrics").text
+        assert sample(text, "http_request_duration_seconds_count", method="GET", route="unmatched", status="404") >= 1
+
+
+class TestSlowRequestProfiler:
+    """Test cases for the opt-in sampling profiler"""
+
+    def test_slow_request_writes_collapsed_stacks(self, tmp_path):
+        """Test a slow request leaves a flamegraph-compatible dump naming the hot function"""
+        profiler = SlowRequestProfiler(threshold=0.05, interval=0.001, directory=str(tmp_path), max_files=2)
+
+        def busy_lookup(until):
+            while time.perf_counter() < until:
+                pass
+
+        async def scenario():
+            start = time.perf_counter()
+            profiler.request_started()
+            worker = threading.Thread(target=busy_lookup, args=(start + 0.15,), name="busy")
+            worker.start()
+            await asyncio.sleep(0.15)
+            worker.join()
+            return await profiler.request_finished(start, time.perf_counter(), "GET /api/sweets/{sweet_id}")
+
+        path = asyncio.run(scenario())
+        assert path.parent == tmp_path and path.name.endswith("ms.folded")
+        assert "GET_api_sweets_sweet_id" in path.name
+        lines = path.read_text().splitlines()
+        stack, count = lines[0].rsplit(" ", 1)
+        assert int(count) > 0
+        assert any(line.startswith("busy;") and "busy_lookup" in line for line in lines)
+
+        for _ in range(3):
+            profiler.dump(0, time.perf_counter(), "GET /")
+        assert len(list(tmp_path.glob("*.folded"))) == 2
+
+    def test_fast_requests_leave_nothing(self, tmp_path):
+        """Test requests under the threshold are not dumped"""
+        profiler = SlowRequestProfiler(threshold=10, interval=0.001, directory=str(tmp_path))
+
+        async def scenario():
+            start = time.perf_counter()
+            profiler.request_started()
+            return await profiler.request_finished(start, time.perf_counter(), "GET /")
+
+        assert asyncio.run(scenario()) is None
+        assert not list(tmp_path.iterdir())
@@ -0,0 +1,116 @@
+import pytest
+from fastapi import status
+
+from app.models import StockMovement
+
+
+def auth(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+class TestStockLedger:
+    """Test cases for the stock movement ledger"""
+    
+    def test_purchase_and_restock_are_recorded(self, client, user_token, admin_token, test_user, admin_user, test_sweet, db_session):
+        """Test every stock change appends one ledger row in the same transaction"""
+        client.post(f"/api/sweets/{test_sweet.id}/purchase", json={"quantity": 3}, headers=auth(user_token))
+        client.post(f"/api/sweets/{test_sweet.id}/restock", json={"quantity": 10}, headers=auth(admin_token))
+        
+        movements = db_session.query(StockMovement).order_by(StockMovement.id).all()
+        assert [(m.sweet_id, m.user_id, m.kind, m.delta, m.unit_price) for m in movements] == [
+            (test_sweet.id, test_user.id, 1, -3, 2.50),
+            (test_sweet.id, admin_user.id, 2, 10, 2.50),
+        ]
+        assert movements[0].ts <= movements[1].ts
+    
+    def test_batch_purchase_records_each_item(self, client, user_token, multiple_sweets, db_session):
+        """Test a cart appends one row per sweet with merged quantities"""
+        first, second = multiple_sweets[0].id, multiple_sweets[1].id
+        response = client.post("/api/sweets/purchase-batch", headers=auth(user_token), json={"items": [
+            {"sweet_id": first, "quantity": 1},
+            {"sweet_id": second, "quantity": 2},
+            {"sweet_id": first, "quantity": 4},
+        ]})
+        assert response.status_code == status.HTTP_200_OK
+        movements = db_session.query(StockMovement.sweet_id, StockMovement.delta).order_by(StockMovement.id).all()
+        assert movements == [(first, -5), (second, -2)]
+    
+    def test_failed_purchases_record_nothing(self, client, user_token, test_sweet, multiple_sweets, db_session):
+        """Test rejected purchases leave the ledger untouched"""
+        client.post(f"/api/sweets/{test_sweet.id}/purchase", json={"quantity": 1000}, headers=auth(user_token))
+        client.post("/api/sweets/99999/purchase", json={"quantity": 1}, headers=auth(user_token))
+        client.post("/api/sweets/purchase-batch", headers=auth(user_token), json={"items": [
+            {"sweet_id": multiple_sweets[0].id, "quantity": 1},
+            {"sweet_id": multiple_sweets[2].id, "quantity": 1000},
+        ]})
+        assert db_session.query(StockMovement).count() == 0
+
+
+class TestPurchaseHistory:
+    """Test cases for GET /api/orders"""
+    
+    @pytest.fixture
+    def purchases(self, client, user_token, multiple_sweets):
+        for quantity in range(1, 6):
+            sweet = multiple_sweets[quantity % 2]
+            response = client.post(
+                f"/api/sweets/{sweet.id}/purchase", json={"quantity": quantity}, headers=auth(user_token)
+            )
+            assert response.status_code == status.HTTP_200_OK
+    
+    def test_history_is_newest_first(self, client, user_token, test_user, multiple_sweets, purchases):
+        """Test the current user's purchases are listed newest first"""
+        response = client.get("/api/orders", headers=auth(user_token))
+        assert response.status_code == status.HTTP_200_OK
+        orders = response.json()
+        assert [order["delta"] for order in orders] == [-5, -4, -3, -2, -1]
+        assert orders[0] == {
+            "id": orders[0]["id"],
+            "ts": orders[0]["ts"],
+            "sweet_id": multiple_sweets[1].id,
+            "user_id": test_user.id,
+            "kind": "purchase",
+            "delta": -5,
+            "unit_price": 1.50,
+        }
+        assert "X-Next-Cursor" not in response.headers
+    
+    def test_keyset_pagination(self, client, user_token, purchases):
+        """Test walking the history with X-Next-Cursor visits every purchase once"""
+        seen = []
+        cursor = None
+        while True:
+            params = {"limit": 2}
+            if cursor is not None:
+                params["before"] = cursor
+            response = client.get("/api/orders", params=params, headers=auth(user_token))
+            page = response.json()
+            assert len(page) <= 2
+            seen.extend(order["delta"] for order in page)
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor is None:
+                break
+            assert int(cursor) == page[-1]["id"]
+        assert seen == [-5, -4, -3, -2, -1]
+    
+    def test_history_excludes_other_users_and_restocks(self, client, user_token, admin_token, test_sweet, purchases):
+        """Test each user only sees their own purchases"""
+        client.post(f"/api/sweets/{test_sweet.id}/purchase", json={"quantity": 1}, headers=auth(admin_token))
+        client.post(f"/api/sweets/{test_sweet.id}/restock", json={"quantity": 1}, headers=auth(admin_token))
+        assert len(client.get("/api/orders", headers=auth(user_token)).json()) == 5
+        admin_orders = client.get("/api/orders", headers=auth(admin_token)).json()
+        assert [(order["kind"], order["delta"]) for order in admin_orders] == [("purchase", -1)]
+    
+    def test_admin_can_read_any_history(self, client, user_token, admin_token, test_user, purchases):
+        """Test the per-user history endpoint is admin only"""
+        response = client.get(f"/api/orders/users/{test_user.id}?limit=3", headers=auth(admin_token))
+        assert response.status_code == status.HTTP_200_OK
+        assert [order["delta"] for order in response.json()] == [-5, -4, -3]
+        assert "X-Next-Cursor" in response.headers
+        
+        denied = client.get(f"/api/orders/users/{test_user.id}", headers=auth(user_token))
+        assert denied.status_code == status.HTTP_403_FORBIDDEN
+    
+    def test_history_requires_auth(self, client):
+        """Test anonymous requests are refused"""
+        assert client.get("/api/orders").status_code == status.HTTP_401_UNAUTHORIZED
@@ -0,0 +1,126 @@
+import re
+import pytest
+from sqlalchemy import event
+
+from app.database import Base
+from tests.conftest import engine
+
+# A plan step that walks a whole real table (virtual FTS tables are fine:
+# they answer MATCH from their own index; scans of subquery results are
+# filtered out against the table names, and scans of partial indexes only
+# read the rows the index was built to hold)
+FULL_SCAN = re.compile(r"^SCAN (?!.*VIRTUAL TABLE)(\w+)(?: USING (?:COVERING )?INDEX (\w+))?")
+PARTIAL_INDEXES = {
+    index.name
+    for table in Base.metadata.tables.values()
+    for index in table.indexes
+    if index.dialect_options["sqlite"]["where"] is not None
+}
+
+# Every query the routers issue, exercised through the API. Cases marked
+# with a reason read the whole table (or a bounded prefix of it) by design.
+ENDPOINT_CASES = [
+    ("GET", "/api/sweets/{id}", None, None),
+    ("GET", "/api/sweets?limit=2&after={id}", None, None),
+    ("GET", "/api/sweets?limit=2", None, "first page: rowid-ordered scan stopped by LIMIT"),
+    ("GET", "/api/sweets", None, "unpaginated list returns the whole catalog"),
+    ("GET", "/api/sweets?format=ndjson&after={id}", None, None),
+    ("GET", "/api/sweets/export", None, "export streams the whole catalog"),
+    ("GET", "/api/sweets/low-stock", None, None),
+    ("GET", "/api/sweets/low-stock?limit=2&after={id}", None, None),
+    ("GET", "/api/sweets/search?q=chocolate", None, None),
+    ("GET", "/api/sweets/search?name=gummy&max_price=5", None, None),
+    ("GET", "/api/sweets/search?category=gummies", None, None),
+    ("GET", "/api/sweets/search?category=Gummies&min_price=1&max_price=4", None, None),
+    ("GET", "/api/sweets/search?category=gumm&name=bear", None, None),
+    ("GET", "/api/sweets/search?min_price=4.5", None, None),
+    ("GET", "/api/sweets/search", None, "unfiltered, unpaginated search returns the whole catalog"),
+    ("GET", "/api/sweets/search?limit=2", None, "unfiltered search: rowid-ordered scan stopped by LIMIT"),
+    ("PUT", "/api/sweets/{id}", {"price": 3.0}, None),
+    ("POST", "/api/sweets/{id}/purchase", {"quantity": 1}, None),
+    ("POST", "/api/sweets/{id}/purchase", {"quantity": 10000}, None),
+    ("POST", "/api/sweets/{id}/restock", {"quantity": 1}, None),
+    ("POST", "/api/sweets/purchase-batch", {"items": [{"sweet_id": "{id}", "quantity": 1}]}, None),
+    ("POST", "/api/sweets/purchase-batch", {"items": [{"sweet_id": "{id}", "quantity": 10000}]}, None),
+    ("DELETE", "/api/sweets/{id}", None, None),
+    ("GET", "/api/orders", None, None),
+    ("GET", "/api/orders?limit=2&before=100", None, None),
+    ("GET", "/api/orders/users/1", None, None),
+    ("GET", "/api/analytics/sweets", None, None),
+    ("GET", "/api/analytics/sweets?start=2024-01-01&end=2024-01-31", None, None),
+    ("GET", "/api/analytics/categories", None, None),
+    ("GET", "/api/analytics/timeseries?interval=day&sweet_id={id}", None, None),
+    ("GET", "/api/auth/me", None, None),
+    ("POST", "/api/auth/login", {"username": "admin", "password": "adminpass123"}, None),
+    ("POST", "/api/auth/register", {"username": "planner", "email": "planner@example.com", "password": "password123"}, None),
+]
+
+
+@pytest.fixture
+def captured_statements():
+    """Record (statement, parameters) for every SQL statement sent to the test engine"""
+    statements = []
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            statements.append((statement, parameters))
+    
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def explain(statement, parameters):
+    """Return the EXPLAIN QUERY PLAN detail lines for one statement"""
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    return [row[-1] for row in rows]
+
+
+def fill(value, sweet_id):
+    if isinstance(value, str):
+        return value.replace("{id}", str(sweet_id))
+    if isinstance(value, dict):
+        return {key: fill(item, sweet_id) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill(item, sweet_id) for item in value]
+    return value
+
+
+@pytest.mark.parametrize(
+    "method,path,body,full_scan_reason",
+    ENDPOINT_CASES,
+    ids=[f"{method} {path}" for method, path, _, _ in ENDPOINT_CASES]
+)
+def test_endpoint_queries_use_indexes(
+    client, admin_token, multiple_sweets, captured_statements, method, path, body, full_scan_reason
+):
+    """Fail if any statement behind an endpoint degrades to a full table scan"""
+    sweet_id = multiple_sweets[1].id
+    payload = fill(body, sweet_id)
+    if payload and "sweet_id" in str(payload):
+        payload = {"items": [{**item, "sweet_id": int(item["sweet_id"])} for item in payload["items"]]}
+    
+    captured_statements.clear()
+    response = client.request(
+        method,
+        fill(path, sweet_id),
+        headers={"Authorization": f"Bearer {admin_token}"},
+        json=payload
+    )
+    assert response.status_code < 500
+    
+    checked = 0
+    for statement, parameters in captured_statements:
+        if not re.match(r"\s*(SELECT|UPDATE|DELETE)\b", statement, re.IGNORECASE):
+            continue
+        checked += 1
+        scans = [
+            detail for detail in explain(statement, parameters)
+            if (match := FULL_SCAN.match(detail))
+            and match.group(1) in Base.metadata.tables
+            and match.group(2) not in PARTIAL_INDEXES
+        ]
+        if full_scan_reason is None:
+            assert not scans, f"full scan {scans} in: {statement}"
+    assert checked, "endpoint issued no queries to check"
@@ -0,0 +1,191 @@
+import asyncio
+import json
+
+from fastapi import status
+
+from app.main import app
+from app.utils.stock_stream import StockBroadcaster, stock_broadcaster, stream_frames
+
+
+def auth(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def parse_frame(frame: bytes) -> dict:
+    fields = {}
+    for line in frame.decode().strip().splitlines():
+        name, _, value = line.partition(": ")
+        fields[name] = value
+    if "data" in fields:
+        fields["data"] = json.loads(fields["data"])
+    return fields
+
+
+async def open_stream(path: str, headers: dict):
+    """Start a GET through the ASGI app; returns (start message, body chunk queue, task)
+
+    TestClient buffers whole responses, so it can't read an endless stream.
+    """
+    chunks = asyncio.Queue()
+    started = asyncio.get_running_loop().create_future()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "server": ("testserver", 80), "client": ("testclient", 50000),
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+    }
+
+    async def receive():
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            started.set_result(message)
+        elif message.get("body"):
+            await chunks.put(message["body"])
+
+    task = asyncio.create_task(app(scope, receive, send))
+    return await asyncio.wait_for(started, 5), chunks, task
+
+
+class TestStockBroadcaster:
+    """Test cases for the coalescing change log"""
+
+    def test_changes_coalesce_per_sweet_and_field(self):
+        """Test a cursor sees each sweet once, with only fields changed past it"""
+        broadcaster = StockBroadcaster(max_tracked=100, max_subscribers=10)
+        broadcaster.publish([(1, {"quantity": 5}), (2, {"quantity": 7})])
+        cursor = broadcaster.seq
+        broadcaster.publish([(1, {"price": 2.0})])
+        broadcaster.publish([(1, {"quantity": 4}), (3, {"quantity": 1})])
+
+        assert broadcaster.changes_since(0) == (5, [
+            {"id": 2, "quantity": 7}, {"id": 1, "quantity": 4, "price": 2.0}, {"id": 3, "quantity": 1}
+        ])
+        assert broadcaster.changes_since(cursor) == (5, [
+            {"id": 1, "quantity": 4, "price": 2.0}, {"id": 3, "quantity": 1}
+        ])
+        assert broadcaster.changes_since(broadcaster.seq) == (5, [])
+
+    def test_delete_replaces_known_fields(self):
+        """Test a deletion is sent alone, and a later change clears it"""
+        broadcaster = StockBroadcaster(max_tracked=100, max_subscribers=10)
+        broadcaster.publish([(1, {"quantity": 5})])
+        broadcaster.publish([(1, {"deleted": True})])
+        assert broadcaster.changes_since(0)[1] == [{"id": 1, "deleted": True}]
+        broadcaster.publish([(1, {"name": "Fudge", "quantity": 3})])
+        assert broadcaster.changes_since(0)[1] == [{"id": 1, "name": "Fudge", "quantity": 3}]
+
+    def test_memory_is_bounded_and_stale_cursors_resync(self):
+        """Test only max_tracked sweets are kept; cursors before evictions or a reset resync"""
+        broadcaster = StockBroadcaster(max_tracked=3, max_subscribers=10)
+        broadcaster.publish([(sweet_id, {"quantity": sweet_id}) for sweet_id in range(1, 6)])
+        assert broadcaster.stats()["tracked_sweets"] == 3
+        assert broadcaster.changes_since(1) == (5, None)
+        assert [delta["id"] for delta in broadcaster.changes_since(2)[1]] == [3, 4, 5]
+
+        broadcaster.reset()
+        assert broadcaster.changes_since(5) == (6, None)
+        assert broadcaster.changes_since(6) == (6, [])
+
+    def test_stream_frames(self):
+        """Test the frame sequence: retry + id, deltas, heartbeats, and resumption"""
+        broadcaster = StockBroadcaster(max_tracked=100, max_subscribers=10)
+        broadcaster.publish([(1, {"quantity": 9})])
+
+        async def scenario():
+            epoch = broadcaster.epoch.decode()
+            frames = stream_frames(broadcaster, None, heartbeat=0.05)
+            assert await anext(frames) == f"retry: 3000\n\nid: {epoch}.1\n\n".encode()
+            assert broadcaster.subscribers == 1
+            waiting = asyncio.ensure_future(anext(frames))
+            await asyncio.sleep(0)
+            broadcaster.publish([(1, {"quantity": 8}), (2, {"quantity": 4})])
+            broadcaster.publish([(1, {"quantity": 7})])
+            assert parse_frame(await waiting) == {
+                "id": f"{epoch}.4", "event": "stock", "data": [{"id": 2, "quantity": 4}, {"id": 1, "quantity": 7}]
+            }
+            assert await anext(frames) == b": keep-alive\n\n"
+            await frames.aclose()
+            assert broadcaster.subscribers == 0
+
+            resumed = stream_frames(broadcaster, f"{epoch}.2", heartbeat=1)
+            await anext(resumed)
+            assert parse_frame(await anext(resumed))["data"] == [{"id": 2, "quantity": 4}, {"id": 1, "quantity": 7}]
+            await resumed.aclose()
+
+            for stale_id in (f"{epoch}.99", "0badcafe.2", "garbage"):
+                # Ahead of us, or from another worker process: start over
+                expired = stream_frames(broadcaster, stale_id, heartbeat=1)
+                await anext(expired)
+                assert parse_frame(await anext(expired)) == {"id": f"{epoch}.4", "event": "resync", "data": {}}
+                await expired.aclose()
+
+        asyncio.run(scenario())
+
+
+class TestStockStream:
+    """Test cases for GET /api/sweets/stream"""
+
+    def test_writes_publish_deltas(self, client, user_token, admin_token, test_sweet):
+        """Test purchases, restocks, updates, creates and deletes publish only what changed"""
+        cursor = stock_broadcaster.seq
+        sweet_id = test_sweet.id
+        client.post(f"/api/sweets/{sweet_id}/purchase", headers=auth(user_token), json={"quantity": 3})
+        client.post(f"/api/sweets/{sweet_id}/restock", headers=auth(admin_token), json={"quantity": 10})
+        client.put(f"/api/sweets/{sweet_id}", headers=auth(user_token), json={"price": 3.25})
+        assert stock_broadcaster.changes_since(cursor)[1] == [{"id": sweet_id, "quantity": 107, "price": 3.25}]
+
+        created = client.post("/api/sweets", headers=auth(user_token), json={
+            "name": "Fudge", "category": "Toffee", "price": 2.0, "quantity": 3
+        }).json()
+        client.delete(f"/api/sweets/{sweet_id}", headers=auth(admin_token))
+        deltas = stock_broadcaster.changes_since(cursor)[1]
+        assert deltas[0] == created
+        assert deltas[1] == {"id": sweet_id, "deleted": True}
+
+    def test_failed_writes_publish_nothing(self, client, user_token, test_sweet):
+        """Test rejected purchases leave the stream quiet"""
+        cursor = stock_broadcaster.seq
+        client.post(f"/api/sweets/{test_sweet.id}/purchase", headers=auth(user_token), json={"quantity": 1000})
+        assert stock_broadcaster.seq == cursor
+
+    def test_bulk_import_resyncs_subscribers(self, client, admin_token):
+        """Test a bulk import tells subscribers to reload instead of streaming rows"""
+        cursor = stock_broadcaster.seq
+        client.post("/api/sweets/bulk", headers={**auth(admin_token), "Content-Type": "text/csv"},
+                    content="name,category,price,quantity\nFudge,Toffee,2.0,3\n")
+        assert stock_broadcaster.changes_since(cursor)[1] is None
+
+    def test_stream_delivers_published_changes(self, client, user_token, test_sweet):
+        """Test a subscriber receives event-stream frames as changes are published"""
+        async def scenario():
+            start, chunks, task = await open_stream("/api/sweets/stream", auth(user_token))
+            try:
+                headers = dict(start["headers"])
+                assert start["status"] == status.HTTP_200_OK
+                assert headers[b"content-type"].startswith(b"text/event-stream")
+                assert headers[b"cache-control"] == b"no-cache"
+                await asyncio.wait_for(chunks.get(), 5)
+
+                stock_broadcaster.publish([(test_sweet.id, {"quantity": 42})])
+                frame = parse_frame(await asyncio.wait_for(chunks.get(), 5))
+                assert frame["event"] == "stock"
+                assert frame["data"] == [{"id": test_sweet.id, "quantity": 42}]
+                assert frame["id"] == f"{stock_broadcaster.epoch.decode()}.{stock_broadcaster.seq}"
+            finally:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+        asyncio.run(scenario())
+        assert stock_broadcaster.subscribers == 0
+
+    def test_stream_requires_auth(self, client):
+        """Test anonymous clients can't subscribe"""
+        assert client.get("/api/sweets/stream").status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_subscriber_limit(self, client, user_token, monkeypatch):
+        """Test streams beyond STREAM_MAX_SUBSCRIBERS are turned away"""
+        monkeypatch.setattr(stock_broadcaster, "max_subscribers", 0)
+        response = client.get("/api/sweets/stream", headers=auth(user_token))
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
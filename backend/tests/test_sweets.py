@@ -1,5 +1,30 @@
+import asyncio
+import hashlib
+import io
+import json
+import os
 import pytest
-from fastapi import status
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from fastapi import HTTPException, status
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.main import app, upload_files
+from app.config import settings
+from app.database import Base, configure_sqlite, get_db
+from app.models import User, Sweet
+from app.schemas import SweetResponse
+from app.utils.auth import create_access_token
+from app.utils.catalog_cache import catalog_cache, etag_matches
+from app.utils.image_pool import image_pool
+from app.utils.stock_alerts import stock_alerts
+from app.utils.upload_sweeper import UploadSweeper, upload_sweeper
+from app.utils.uploads import image_variants, variants_cache
+from app.utils.write_queue import register_write_queue, unregister_write_queue
 
 class TestCreateSweet:
     """Test cases for creating sweets"""
@@ -81,6 +106,28 @@ class TestGetSweets:
         assert len(data) == 4
         assert all("id" in sweet for sweet in data)
     
+    def test_get_all_sweets_matches_response_model(self, client, user_token, test_sweet, multiple_sweets):
+        """Test the raw JSON fast path emits exactly what SweetResponse would"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        expected = [
+            SweetResponse.model_validate(sweet).model_dump(mode="json")
+            for sweet in sorted([test_sweet, *multiple_sweets], key=lambda sweet: sweet.id)
+        ]
+        assert client.get("/api/sweets", headers=headers).json() == expected
+        assert client.get(f"/api/sweets/{expected[0]['id']}", headers=headers).json() == expected[0]
+        search = client.get("/api/sweets/search?category=gummies", headers=headers).json()
+        assert search == [sweet for sweet in expected if sweet["category"] == "Gummies"]
+        streamed = client.get("/api/sweets?format=ndjson", headers=headers).text.splitlines()
+        assert [json.loads(line) for line in streamed] == expected
+    
+    def test_openapi_keeps_response_models(self, client):
+        """Test raw responses still document SweetResponse in the schema"""
+        paths = client.get("/openapi.json").json()["paths"]
+        list_schema = paths["/api/sweets"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+        assert list_schema["items"]["$ref"].endswith("/SweetResponse")
+        item_schema = paths["/api/sweets/{sweet_id}"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+        assert item_schema["$ref"].endswith("/SweetResponse")
+    
     def test_get_all_sweets_empty(self, client, user_token):
         """Test getting sweets when none exist"""
         response = client.get(
@@ -95,6 +142,43 @@ class TestGetSweets:
         response = client.get("/api/sweets")
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
     
+    def test_get_sweets_paginated(self, client, user_token, multiple_sweets):
+        """Test keyset pagination walks the catalog with limit/after"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        first = client.get("/api/sweets?limit=3", headers=headers)
+        assert first.status_code == status.HTTP_200_OK
+        assert len(first.json()) == 3
+        cursor = first.headers["X-Next-Cursor"]
+        assert cursor == str(first.json()[-1]["id"])
+        
+        second = client.get(f"/api/sweets?limit=3&after={cursor}", headers=headers)
+        assert second.status_code == status.HTTP_200_OK
+        assert len(second.json()) == 1
+        assert "X-Next-Cursor" not in second.headers
+        ids = [sweet["id"] for sweet in first.json() + second.json()]
+        assert ids == sorted(ids)
+        assert len(set(ids)) == 4
+    
+    def test_get_sweets_invalid_limit(self, client, user_token):
+        """Test page size outside the allowed range is rejected"""
+        response = client.get(
+            "/api/sweets?limit=0",
+            headers={"Authorization": f"Bearer {user_token}"}
+        )
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    
+    def test_get_sweets_ndjson_stream(self, client, user_token, multiple_sweets):
+        """Test streaming the catalog as NDJSON"""
+        response = client.get(
+            "/api/sweets?format=ndjson&after=1",
+            headers={"Authorization": f"Bearer {user_token}"}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert len(rows) == 3
+        assert all(row["id"] > 1 for row in rows)
+    
     def test_get_sweet_by_id(self, client, user_token, test_sweet):
         """Test getting a specific sweet by ID"""
         response = client.get(
@@ -115,6 +199,279 @@ class TestGetSweets:
         assert response.status_code == status.HTTP_404_NOT_FOUND
 
 
+class TestCatalogCache:
+    """Test cached catalog responses, ETags and 304s"""
+    
+    def test_if_none_match_returns_304_without_queries(self, client, user_token, db_session, test_sweet):
+        """Test a matching If-None-Match is answered from the cache alone"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        sweet_id = test_sweet.id
+        first = client.get(f"/api/sweets/{sweet_id}", headers=headers)
+        etag = first.headers["ETag"]
+        assert first.json()["name"] == "Chocolate Bar"
+        
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+        try:
+            response = client.get(f"/api/sweets/{sweet_id}", headers={**headers, "If-None-Match": etag})
+        finally:
+            event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+        
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+        assert statements == []
+    
+    def test_writes_invalidate_cached_responses(self, client, user_token, admin_token, test_sweet):
+        """Test purchases, restocks, updates and deletes change the ETag and body"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        admin_headers = {"Authorization": f"Bearer {admin_token}"}
+        
+        def fetch():
+            response = client.get("/api/sweets", headers=headers)
+            return response.headers["ETag"], response.json()
+        
+        etag, sweets = fetch()
+        assert fetch() == (etag, sweets)
+        writes = [
+            lambda: client.post(f"/api/sweets/{test_sweet.id}/purchase", headers=headers, json={"quantity": 1}),
+            lambda: client.post(f"/api/sweets/{test_sweet.id}/restock", headers=admin_headers, json={"quantity": 5}),
+            lambda: client.put(f"/api/sweets/{test_sweet.id}", headers=headers, json={"price": 9.99}),
+            lambda: client.post("/api/sweets", headers=headers, json={
+                "name": "Fudge", "category": "Toffee", "price": 2.0, "quantity": 3
+            }),
+            lambda: client.delete(f"/api/sweets/{test_sweet.id}", headers=admin_headers),
+        ]
+        for write in writes:
+            version = catalog_cache.version
+            assert write().status_code < 300
+            assert catalog_cache.version > version
+            new_etag, new_sweets = fetch()
+            assert new_etag != etag
+            assert new_sweets != sweets
+            etag, sweets = new_etag, new_sweets
+        
+        stale = client.get("/api/sweets", headers={**headers, "If-None-Match": etag})
+        assert stale.status_code == status.HTTP_304_NOT_MODIFIED
+    
+    def test_failed_purchase_keeps_cache(self, client, user_token, test_sweet):
+        """Test a rejected purchase does not invalidate the catalog"""
+        version = catalog_cache.version
+        response = client.post(
+            f"/api/sweets/{test_sweet.id}/purchase",
+            headers={"Authorization": f"Bearer {user_token}"},
+            json={"quantity": 1000}
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert catalog_cache.version == version
+    
+    def test_cached_page_keeps_cursor_header(self, client, user_token, multiple_sweets):
+        """Test the X-Next-Cursor header is served from the cache too"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        first = client.get("/api/sweets?limit=2", headers=headers)
+        hits = catalog_cache.stats()["hits"]
+        second = client.get("/api/sweets?limit=2", headers=headers)
+        assert catalog_cache.stats()["hits"] == hits + 1
+        assert second.headers["X-Next-Cursor"] == first.headers["X-Next-Cursor"]
+        assert second.json() == first.json()
+    
+    def test_etag_matching(self):
+        """Test If-None-Match parsing"""
+        assert etag_matches('"abc"', '"abc"')
+        assert etag_matches('"x", W/"abc"', '"abc"')
+        assert etag_matches("*", '"abc"')
+        assert not etag_matches('"abcd"', '"abc"')
+        assert not etag_matches(None, '"abc"')
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"\x00" * 200
+JPEG_BYTES = b"\xff\xd8\xff\xe0" + b"\x01" * 200
+
+class TestImageUpload:
+    """Test cases for the image upload pipeline"""
+    
+    @pytest.fixture
+    def upload_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+        monkeypatch.setattr(upload_files, "all_directories", [str(tmp_path)])
+        upload_files.lookups.clear()
+        # Generate variants on the threadpool rather than spawning workers
+        monkeypatch.setattr(image_pool, "workers", 0)
+        variants_cache.clear()
+        yield tmp_path / "sweets"
+        variants_cache.clear()
+    
+    def upload(self, client, token, name, content):
+        return client.post(
+            "/api/sweets/upload-image",
+            headers={"Authorization": f"Bearer {token}"},
+            files={"file": (name, content, "application/octet-stream")}
+        )
+    
+    def test_upload_stores_by_content_hash(self, client, user_token, upload_dir):
+        """Test an image is stored under its SHA-256 with the sniffed extension"""
+        response = self.upload(client, user_token, "photo.png", PNG_BYTES)
+        assert response.status_code == status.HTTP_200_OK
+        digest = hashlib.sha256(PNG_BYTES).hexdigest()
+        assert response.json() == {"image_url": f"/uploads/sweets/{digest}.png"}
+        assert (upload_dir / f"{digest}.png").read_bytes() == PNG_BYTES
+    
+    def test_duplicate_uploads_share_one_file(self, client, user_token, upload_dir):
+        """Test identical content is deduplicated and no temp files remain"""
+        first = self.upload(client, user_token, "a.png", PNG_BYTES).json()
+        second = self.upload(client, user_token, "b.png", PNG_BYTES).json()
+        assert first == second
+        # PNG_BYTES is only a signature, so no variants (or manifest) can be made
+        assert len(list(upload_dir.iterdir())) == 1
+    
+    def test_upload_generates_variants(self, client, user_token, upload_dir):
+        """Test resized JPEG and WebP copies are made and listed on the sweet"""
+        image = io.BytesIO()
+        Image.new("RGB", (1200, 800), "purple").save(image, format="JPEG")
+        image_url = self.upload(client, user_token, "big.jpg", image.getvalue()).json()["image_url"]
+        stem = image_url.rsplit("/", 1)[1].removesuffix(".jpg")
+        
+        widths = sorted(settings.IMAGE_VARIANT_WIDTHS)
+        for width in widths:
+            with Image.open(upload_dir / f"{stem}-{width}w.webp") as webp:
+                assert webp.format == "WEBP"
+                assert webp.size == (width, round(800 * width / 1200))
+            assert (upload_dir / f"{stem}-{width}w.jpg").exists()
+        
+        headers = {"Authorization": f"Bearer {user_token}"}
+        created = client.post("/api/sweets", headers=headers, json={
+            "name": "Photo Fudge", "category": "Toffee", "price": 2.0, "quantity": 1, "image_url": image_url
+        }).json()
+        expected = [
+            {
+                "width": width,
+                "url": f"/uploads/sweets/{stem}-{width}w.jpg",
+                "webp_url": f"/uploads/sweets/{stem}-{width}w.webp",
+            }
+            for width in widths
+        ]
+        assert created["image_variants"] == expected
+        assert client.get(f"/api/sweets/{created['id']}", headers=headers).json()["image_variants"] == expected
+        assert client.get("/api/sweets", headers=headers).json()[0]["image_variants"] == expected
+    
+    def test_small_images_get_no_variants(self, client, user_token, upload_dir):
+        """Test images narrower than every configured width are never upscaled"""
+        image = io.BytesIO()
+        Image.new("RGB", (100, 100), "pink").save(image, format="PNG")
+        image_url = self.upload(client, user_token, "tiny.png", image.getvalue()).json()["image_url"]
+        assert sorted(path.suffix for path in upload_dir.iterdir()) == [".json", ".png"]
+        assert image_variants(image_url) == []
+    
+    def test_type_comes_from_magic_bytes(self, client, user_token, upload_dir):
+        """Test the extension is ignored in favour of the file's content"""
+        response = self.upload(client, user_token, "image.txt", JPEG_BYTES)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["image_url"].endswith(".jpg")
+        
+        disguised = self.upload(client, user_token, "image.png", b"<?php echo 1; ?>")
+        assert disguised.status_code == status.HTTP_400_BAD_REQUEST
+        assert "Invalid file type" in disguised.json()["detail"]
+    
+    def test_oversized_upload_is_rejected(self, client, user_token, upload_dir, monkeypatch):
+        """Test uploads over MAX_UPLOAD_BYTES get 413 and leave nothing behind"""
+        monkeypatch.setattr(settings, "MAX_UPLOAD_BYTES", 100 * 1024)
+        response = self.upload(client, user_token, "big.png", PNG_BYTES + b"\x00" * 200 * 1024)
+        assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        assert list(upload_dir.iterdir()) == []
+    
+    def test_upload_requires_auth(self, client, upload_dir):
+        """Test anonymous uploads are refused"""
+        response = client.post(
+            "/api/sweets/upload-image", files={"file": ("a.png", PNG_BYTES, "image/png")}
+        )
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    
+    def test_uploads_are_served_immutable(self, client, user_token, upload_dir):
+        """Test stored images carry long-lived caching and a content-hash ETag"""
+        image_url = self.upload(client, user_token, "photo.jpg", JPEG_BYTES).json()["image_url"]
+        digest = hashlib.sha256(JPEG_BYTES).hexdigest()
+        response = client.get(image_url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.content == JPEG_BYTES
+        assert response.headers["content-type"] == "image/jpeg"
+        assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+        assert response.headers["etag"] == f'"{digest}"'
+        
+        revalidated = client.get(image_url, headers={"If-None-Match": f'W/"{digest}"'})
+        assert revalidated.status_code == status.HTTP_304_NOT_MODIFIED
+        assert revalidated.content == b""
+        assert revalidated.headers["cache-control"] == "public, max-age=31536000, immutable"
+    
+    def test_uploads_support_ranges(self, client, user_token, upload_dir):
+        """Test Range requests return the requested slice"""
+        image_url = self.upload(client, user_token, "photo.jpg", JPEG_BYTES).json()["image_url"]
+        response = client.get(image_url, headers={"Range": "bytes=2-5"})
+        assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+        assert response.content == JPEG_BYTES[2:6]
+        assert response.headers["content-range"] == f"bytes 2-5/{len(JPEG_BYTES)}"
+        
+        stale = client.get(image_url, headers={"Range": "bytes=2-5", "If-Range": '"other"'})
+        assert stale.status_code == status.HTTP_200_OK
+        assert stale.content == JPEG_BYTES
+    
+    def test_manifests_and_partial_files_are_hidden(self, client, user_token, upload_dir):
+        """Test internal files in the upload directory are not served"""
+        image = io.BytesIO()
+        Image.new("RGB", (100, 100), "pink").save(image, format="PNG")
+        image_url = self.upload(client, user_token, "tiny.png", image.getvalue()).json()["image_url"]
+        manifest_url = image_url.removesuffix(".png") + ".variants.json"
+        (upload_dir / ".abc.part").write_bytes(b"partial")
+        assert client.get(manifest_url).status_code == status.HTTP_404_NOT_FOUND
+        assert client.get("/uploads/sweets/.abc.part").status_code == status.HTTP_404_NOT_FOUND
+        assert client.get("/uploads/sweets/missing.png").status_code == status.HTTP_404_NOT_FOUND
+    
+    def test_sweeper_deletes_only_old_orphans(self, client, user_token, admin_token, upload_dir, db_session):
+        """Test unreferenced files past the grace period go, everything else stays"""
+        image = io.BytesIO()
+        Image.new("RGB", (600, 400), "orange").save(image, format="PNG")
+        kept_url = self.upload(client, user_token, "kept.png", image.getvalue()).json()["image_url"]
+        orphan_url = self.upload(client, user_token, "orphan.jpg", JPEG_BYTES).json()["image_url"]
+        client.post("/api/sweets", headers={"Authorization": f"Bearer {user_token}"}, json={
+            "name": "Pictured", "category": "Toffee", "price": 1.0, "quantity": 1, "image_url": kept_url
+        })
+        (upload_dir / ".abc.part").write_bytes(b"partial")
+        kept_files = sorted(path.name for path in upload_dir.iterdir() if not path.name.startswith("."))
+        kept_files.remove(orphan_url.rsplit("/", 1)[1])
+        assert len(kept_files) == 6  # the image, 2 widths x (PNG + WebP), the manifest
+        
+        sweeper = UploadSweeper(grace_seconds=3600, batch_size=2)
+        sweeper.sweep(db_session)
+        assert len(list(upload_dir.iterdir())) == 8  # nothing is old enough yet
+        assert sweeper.stats()["files"] == 8
+        
+        sweeper.sweep(db_session, now=time.time() + 7200)
+        assert sorted(path.name for path in upload_dir.iterdir()) == kept_files
+        stats = sweeper.stats()
+        assert stats["orphans_reclaimed"] == 2
+        assert stats["bytes_reclaimed"] == len(JPEG_BYTES) + len(b"partial")
+        assert stats["files"] == 6
+        assert stats["bytes"] == sum((upload_dir / name).stat().st_size for name in kept_files)
+        assert stats["cycles"] == 2
+        assert client.get(orphan_url).status_code == status.HTTP_404_NOT_FOUND
+    
+    def test_reupload_restarts_grace_period(self, client, user_token, db_session, upload_dir):
+        """Test re-uploading an orphan's content protects it from the next sweep"""
+        image_url = self.upload(client, user_token, "photo.jpg", JPEG_BYTES).json()["image_url"]
+        stored = upload_dir / image_url.rsplit("/", 1)[1]
+        old = time.time() - 7200
+        os.utime(stored, (old, old))
+        self.upload(client, user_token, "again.jpg", JPEG_BYTES)
+        UploadSweeper(grace_seconds=3600, batch_size=10).sweep(db_session)
+        assert stored.exists()
+    
+    def test_upload_stats_are_admin_only(self, client, user_token, admin_token):
+        """Test the storage stats endpoint"""
+        response = client.get("/api/sweets/uploads/stats", headers={"Authorization": f"Bearer {admin_token}"})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == upload_sweeper.stats()
+        denied = client.get("/api/sweets/uploads/stats", headers={"Authorization": f"Bearer {user_token}"})
+        assert denied.status_code == status.HTTP_403_FORBIDDEN
+
 class TestSearchSweets:
     """Test cases for searching sweets"""
     
@@ -140,6 +497,23 @@ class TestSearchSweets:
         assert len(data) == 2
         assert all(sweet["category"] == "Gummies" for sweet in data)
     
+    def test_search_by_category_ignores_case(self, client, user_token, multiple_sweets):
+        """Test category filtering is a case-insensitive match"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        response = client.get("/api/sweets/search?category=hard candy", headers=headers)
+        assert [sweet["name"] for sweet in response.json()] == ["Lollipop"]
+    
+    def test_search_by_partial_category(self, client, user_token, multiple_sweets):
+        """Test part of a category, as typed into the frontend's filter box, still matches"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        response = client.get("/api/sweets/search?category=gumm", headers=headers)
+        assert [sweet["name"] for sweet in response.json()] == ["Gummy Bears", "Sour Worms"]
+        response = client.get("/api/sweets/search?category=candy", headers=headers)
+        assert [sweet["name"] for sweet in response.json()] == ["Lollipop"]
+        # Shorter than a trigram
+        response = client.get("/api/sweets/search?category=oc", headers=headers)
+        assert [sweet["name"] for sweet in response.json()] == ["Dark Chocolate"]
+    
     def test_search_by_price_range(self, client, user_token, multiple_sweets):
         """Test searching sweets by price range"""
         response = client.get(
@@ -162,6 +536,108 @@ class TestSearchSweets:
         assert data[0]["name"] == "Dark Chocolate"
 
 
+class TestFullTextSearch:
+    """Test cases for the full-text search index"""
+    
+    def test_search_matches_description(self, client, user_token, test_sweet, multiple_sweets):
+        """Test q searches descriptions as well as names"""
+        response = client.get(
+            "/api/sweets/search?q=milk choc",
+            headers={"Authorization": f"Bearer {user_token}"}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert [sweet["name"] for sweet in response.json()] == ["Chocolate Bar"]
+    
+    def test_search_ranks_name_matches_first(self, client, user_token, test_sweet, multiple_sweets):
+        """Test a name match outranks a category-only match"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        client.post(
+            "/api/sweets",
+            headers=headers,
+            json={"name": "Fudge", "category": "Toffee", "price": 2.0, "quantity": 5,
+                  "description": "Rich and buttery"}
+        )
+        client.post(
+            "/api/sweets",
+            headers=headers,
+            json={"name": "Toffee Apple", "category": "Fruit", "price": 2.0, "quantity": 5}
+        )
+        response = client.get("/api/sweets/search?q=toffee", headers=headers)
+        assert [sweet["name"] for sweet in response.json()] == ["Toffee Apple", "Fudge"]
+    
+    def test_search_index_follows_updates_and_deletes(self, client, user_token, admin_token, test_sweet):
+        """Test renames and deletions are reflected in search results"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        client.put(f"/api/sweets/{test_sweet.id}", headers=headers, json={"name": "Caramel Block"})
+        assert client.get("/api/sweets/search?name=Chocolate Bar", headers=headers).json() == []
+        assert len(client.get("/api/sweets/search?name=caramel", headers=headers).json()) == 1
+        
+        client.delete(f"/api/sweets/{test_sweet.id}", headers={"Authorization": f"Bearer {admin_token}"})
+        assert client.get("/api/sweets/search?q=caramel", headers=headers).json() == []
+    
+    def test_search_index_covers_bulk_imports(self, client, admin_token, test_sweet):
+        """Test bulk-imported rows are indexed once, and later inserts still are"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        client.post(
+            "/api/sweets/bulk",
+            headers={**headers, "Content-Type": "text/csv"},
+            content="name,category,price,quantity,description\n"
+                    "Sherbet Lemon,Hard Candy,0.80,10,Fizzy centre\n"
+                    "Sherbet Fountain,Powder,1.20,10,\n"
+        )
+        client.post(
+            "/api/sweets",
+            headers=headers,
+            json={"name": "Sherbet Dib Dab", "category": "Powder", "price": 0.9, "quantity": 5}
+        )
+        response = client.get("/api/sweets/search?q=sherbet", headers=headers)
+        assert sorted(sweet["name"] for sweet in response.json()) == [
+            "Sherbet Dib Dab", "Sherbet Fountain", "Sherbet Lemon"
+        ]
+        assert [sweet["name"] for sweet in client.get("/api/sweets/search?q=fizzy", headers=headers).json()] == [
+            "Sherbet Lemon"
+        ]
+    
+    def test_search_short_terms(self, client, user_token, multiple_sweets):
+        """Test terms shorter than a trigram still match as substrings"""
+        response = client.get(
+            "/api/sweets/search?name=op",
+            headers={"Authorization": f"Bearer {user_token}"}
+        )
+        assert [sweet["name"] for sweet in response.json()] == ["Lollipop"]
+    
+    def test_search_pagination(self, client, user_token, multiple_sweets):
+        """Test limit and offset page through results"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        first = client.get("/api/sweets/search?limit=3", headers=headers).json()
+        rest = client.get("/api/sweets/search?limit=3&offset=3", headers=headers).json()
+        assert len(first) == 3
+        assert len(rest) == 1
+        assert {sweet["id"] for sweet in first}.isdisjoint(sweet["id"] for sweet in rest)
+    
+    def test_search_without_limit_returns_every_match(self, client, admin_token):
+        """Test a search without limit is not truncated, as the frontend sends none"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        rows = "".join(f"Drop {i},Licorice,0.50,{i}\n" for i in range(120))
+        client.post(
+            "/api/sweets/bulk",
+            headers={**headers, "Content-Type": "text/csv"},
+            content="name,category,price,quantity\n" + rows
+        )
+        assert len(client.get("/api/sweets/search?category=licorice", headers=headers).json()) == 120
+        assert len(client.get("/api/sweets/search?q=drop", headers=headers).json()) == 120
+        assert len(client.get("/api/sweets/search?q=drop&limit=50", headers=headers).json()) == 50
+    
+    def test_search_query_syntax_is_literal(self, client, user_token, multiple_sweets):
+        """Test FTS operators in user input are treated as plain text"""
+        response = client.get(
+            '/api/sweets/search?q="Gummy" OR NOT bears*',
+            headers={"Authorization": f"Bearer {user_token}"}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == []
+
+
 class TestUpdateSweet:
     """Test cases for updating sweets"""
     
@@ -287,6 +763,338 @@ class TestPurchaseSweet:
         assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
 
 
+class TestBulkImportExport:
+    """Test cases for streaming bulk import and export"""
+    
+    def test_bulk_import_csv(self, client, admin_token):
+        """Test CSV import inserts valid rows and reports bad ones by line"""
+        body = (
+            "name,category,price,quantity,description\n"
+            "Fudge,Toffee,2.50,40,\n"
+            '"Mint, Humbug",Hard Candy,1.25,90,"Striped\nand chewy"\n'
+            "Broken,Toffee,not-a-price,10,\n"
+            "Negative,Toffee,1.00,-5,\n"
+            "Short,Toffee\n"
+        )
+        response = client.post(
+            "/api/sweets/bulk",
+            headers={"Authorization": f"Bearer {admin_token}", "Content-Type": "text/csv"},
+            content=body
+        )
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["inserted"] == 2
+        assert data["failed"] == 3
+        assert [error["line"] for error in data["errors"]] == [5, 6, 7]
+        assert "price" in data["errors"][0]["error"]
+        
+        sweets = client.get("/api/sweets", headers={"Authorization": f"Bearer {admin_token}"}).json()
+        assert {sweet["name"] for sweet in sweets} == {"Fudge", "Mint, Humbug"}
+        assert next(s for s in sweets if s["name"] == "Mint, Humbug")["description"] == "Striped\nand chewy"
+    
+    def test_bulk_import_ndjson(self, client, admin_token):
+        """Test NDJSON import"""
+        lines = [
+            json.dumps({"name": f"Drop {i}", "category": "Licorice", "price": 0.5, "quantity": i})
+            for i in range(25)
+        ]
+        lines.insert(3, "{not json")
+        response = client.post(
+            "/api/sweets/bulk",
+            headers={"Authorization": f"Bearer {admin_token}", "Content-Type": "application/x-ndjson"},
+            content="\n".join(lines) + "\n"
+        )
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["inserted"] == 25
+        assert data["failed"] == 1
+        assert data["errors"][0]["line"] == 4
+    
+    def test_bulk_import_csv_blank_defaulted_cells(self, client, admin_token):
+        """Test a blank cell of a field with a default takes the default"""
+        body = (
+            "name,category,price,quantity,reorder_threshold\n"
+            "Fudge,Toffee,2.50,40,\n"
+            "Humbug,Hard Candy,1.25,90,15\n"
+            ",Toffee,1.00,5,\n"
+        )
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = client.post("/api/sweets/bulk", headers={**headers, "Content-Type": "text/csv"}, content=body)
+        data = response.json()
+        assert data["inserted"] == 2
+        assert [error["line"] for error in data["errors"]] == [4]
+        
+        sweets = {sweet["name"]: sweet for sweet in client.get("/api/sweets", headers=headers).json()}
+        assert sweets["Fudge"]["reorder_threshold"] == 0
+        assert sweets["Humbug"]["reorder_threshold"] == 15
+    
+    def test_export_csv_round_trip(self, client, admin_token, multiple_sweets):
+        """Test a CSV export, reorder thresholds included, can be imported back"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        client.put(f"/api/sweets/{multiple_sweets[0].id}", headers=headers, json={"reorder_threshold": 25})
+        exported = client.get("/api/sweets/export", headers=headers)
+        # Drop the id column so the rows import as new sweets
+        body = "\n".join(line.split(",", 1)[1] for line in exported.text.splitlines()) + "\n"
+        response = client.post("/api/sweets/bulk", headers={**headers, "Content-Type": "text/csv"}, content=body)
+        assert response.json()["inserted"] == 4
+        
+        thresholds = [sweet["reorder_threshold"] for sweet in client.get("/api/sweets", headers=headers).json()]
+        assert sorted(thresholds) == [0, 0, 0, 0, 0, 0, 25, 25]
+    
+    def test_bulk_import_csv_stray_quote(self, client, admin_token):
+        """Test an unbalanced quote fails its own row instead of swallowing the rest"""
+        rows = [f"Drop {i},Licorice,0.50,{i},plain description" for i in range(3000)]
+        rows.insert(1, 'Stray,Licorice,0.50,1,"never closed')
+        response = client.post(
+            "/api/sweets/bulk",
+            headers={"Authorization": f"Bearer {admin_token}", "Content-Type": "text/csv"},
+            content="name,category,price,quantity,description\n" + "\n".join(rows) + "\n"
+        )
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["inserted"] == 3000
+        assert data["failed"] == 1
+        assert data["errors"][0]["line"] == 3
+        assert "longer than" in data["errors"][0]["error"]
+    
+    def test_bulk_import_unsupported_type(self, client, admin_token):
+        """Test bodies that are neither CSV nor NDJSON are rejected"""
+        response = client.post(
+            "/api/sweets/bulk",
+            headers={"Authorization": f"Bearer {admin_token}", "Content-Type": "application/xml"},
+            content="<sweets/>"
+        )
+        assert response.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+    
+    def test_bulk_import_as_regular_user(self, client, user_token):
+        """Test regular users cannot bulk import"""
+        response = client.post(
+            "/api/sweets/bulk",
+            headers={"Authorization": f"Bearer {user_token}", "Content-Type": "text/csv"},
+            content="name,category,price,quantity\n"
+        )
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+    
+    def test_export_csv(self, client, user_token, multiple_sweets):
+        """Test CSV export streams a header plus every sweet"""
+        response = client.get(
+            "/api/sweets/export",
+            headers={"Authorization": f"Bearer {user_token}"}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("text/csv")
+        lines = response.text.strip().splitlines()
+        assert lines[0] == "id,name,category,price,quantity,description,image_url,reorder_threshold"
+        assert len(lines) == 5
+    
+    def test_export_ndjson_round_trip(self, client, admin_token, multiple_sweets):
+        """Test an NDJSON export can be imported back"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        exported = client.get("/api/sweets/export?format=ndjson", headers=headers)
+        assert exported.status_code == status.HTTP_200_OK
+        assert len(exported.text.splitlines()) == 4
+        
+        response = client.post(
+            "/api/sweets/bulk",
+            headers={**headers, "Content-Type": "application/x-ndjson"},
+            content=exported.content
+        )
+        assert response.json()["inserted"] == 4
+        assert len(client.get("/api/sweets", headers=headers).json()) == 8
+
+
+class TestBatchPurchase:
+    """Test cases for purchasing a whole cart in one request"""
+    
+    def test_batch_purchase_success(self, client, user_token, multiple_sweets):
+        """Test every line item is decremented, merging repeated sweets"""
+        gummy, lollipop = multiple_sweets[0], multiple_sweets[1]
+        response = client.post(
+            "/api/sweets/purchase-batch",
+            headers={"Authorization": f"Bearer {user_token}"},
+            json={"items": [
+                {"sweet_id": gummy.id, "quantity": 5},
+                {"sweet_id": lollipop.id, "quantity": 20},
+                {"sweet_id": gummy.id, "quantity": 5}
+            ]}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert [sweet["id"] for sweet in data] == [gummy.id, lollipop.id]
+        assert data[0]["quantity"] == 40
+        assert data[1]["quantity"] == 180
+    
+    def test_batch_purchase_is_all_or_nothing(self, client, user_token, multiple_sweets):
+        """Test one short item rejects the whole cart and leaves stock untouched"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        gummy, dark = multiple_sweets[0], multiple_sweets[2]
+        response = client.post(
+            "/api/sweets/purchase-batch",
+            headers=headers,
+            json={"items": [
+                {"sweet_id": gummy.id, "quantity": 5},
+                {"sweet_id": dark.id, "quantity": 31}
+            ]}
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "Not enough stock" in response.json()["detail"]
+        
+        check = client.get(f"/api/sweets/{gummy.id}", headers=headers)
+        assert check.json()["quantity"] == 50
+    
+    def test_batch_purchase_nonexistent_sweet(self, client, user_token, test_sweet):
+        """Test unknown sweets in the cart return 404"""
+        response = client.post(
+            "/api/sweets/purchase-batch",
+            headers={"Authorization": f"Bearer {user_token}"},
+            json={"items": [
+                {"sweet_id": test_sweet.id, "quantity": 1},
+                {"sweet_id": 9999, "quantity": 1}
+            ]}
+        )
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert "9999" in response.json()["detail"]
+    
+    def test_batch_purchase_empty_cart(self, client, user_token):
+        """Test an empty cart is rejected"""
+        response = client.post(
+            "/api/sweets/purchase-batch",
+            headers={"Authorization": f"Bearer {user_token}"},
+            json={"items": []}
+        )
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+class TestPurchaseConcurrency:
+    """Stress test purchases racing for the same stock"""
+    
+    @pytest.fixture(params=["default", "tuned"])
+    def file_db(self, request, tmp_path):
+        """File-backed database so each request gets its own connection
+
+        The "tuned" variant applies the SQLite profile (WAL, pragmas) and
+        routes purchases through the group-commit write queue.
+        """
+        engine = create_engine(f"sqlite:///{tmp_path / 'race.db'}")
+        write_queue = None
+        if request.param == "tuned":
+            configure_sqlite(engine)
+            write_queue = register_write_queue(engine)
+        Base.metadata.create_all(bind=engine)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        
+        def override_get_db():
+            db = SessionLocal()
+            try:
+                yield db
+            finally:
+                db.close()
+        
+        app.dependency_overrides[get_db] = override_get_db
+        yield SessionLocal, write_queue
+        app.dependency_overrides.clear()
+        unregister_write_queue(engine)
+        engine.dispose()
+    
+    def test_parallel_purchases_never_oversell(self, file_db):
+        """Test thousands of parallel purchases sell exactly the available stock"""
+        SessionLocal, write_queue = file_db
+        db = SessionLocal()
+        db.add(User(username="racer", email="racer@example.com", hashed_password="x"))
+        sweet = Sweet(name="Last Bar", category="Chocolate", price=1.0, quantity=500)
+        db.add(sweet)
+        db.commit()
+        sweet_id = sweet.id
+        db.close()
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': 'racer'})}"}
+        
+        with TestClient(app) as client:
+            def buy(_):
+                return client.post(
+                    f"/api/sweets/{sweet_id}/purchase",
+                    headers=headers,
+                    json={"quantity": 1}
+                ).status_code
+            
+            with ThreadPoolExecutor(max_workers=16) as pool:
+                statuses = list(pool.map(buy, range(2000)))
+        
+        assert statuses.count(status.HTTP_200_OK) == 500
+        assert statuses.count(status.HTTP_400_BAD_REQUEST) == 1500
+        db = SessionLocal()
+        assert db.get(Sweet, sweet_id).quantity == 0
+        journal_mode = db.connection().exec_driver_sql("PRAGMA journal_mode").scalar()
+        db.close()
+        if write_queue is not None:
+            assert journal_mode == "wal"
+            assert write_queue.jobs == 2000
+    
+    def test_write_queue_group_commit(self, tmp_path):
+        """Test queued jobs share commits and one job's failure spares the rest"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'queue.db'}")
+        configure_sqlite(engine)
+        Base.metadata.create_all(bind=engine)
+        write_queue = register_write_queue(engine)
+        
+        def add(db, name):
+            if name == "rejected":
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+            db.add(Sweet(name=name, category="Toffee", price=1.0, quantity=1))
+            db.flush()
+            if name == "broken":
+                raise ValueError("job failed after writing")
+            return name
+        
+        async def submit_all():
+            names = [f"toffee {i}" for i in range(50)] + ["broken", "rejected"]
+            return await asyncio.gather(
+                *(write_queue.submit(add, name) for name in names), return_exceptions=True
+            )
+        
+        try:
+            results = asyncio.run(submit_all())
+        finally:
+            unregister_write_queue(engine)
+        
+        assert results[:50] == [f"toffee {i}" for i in range(50)]
+        assert isinstance(results[50], ValueError)
+        assert isinstance(results[51], HTTPException)
+        assert write_queue.commits < write_queue.jobs
+        db = sessionmaker(bind=engine)()
+        names = {name for (name,) in db.query(Sweet.name)}
+        db.close()
+        engine.dispose()
+        assert names == {f"toffee {i}" for i in range(50)}
+    
+    def test_write_queue_survives_closed_submitter_loop(self, tmp_path):
+        """Test a job whose submitter's event loop closed doesn't stop later writes"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'queue.db'}")
+        configure_sqlite(engine)
+        Base.metadata.create_all(bind=engine)
+        write_queue = register_write_queue(engine)
+        release = threading.Event()
+        
+        def add(db, name):
+            if name == "abandoned":
+                release.wait(5)
+            db.add(Sweet(name=name, category="Toffee", price=1.0, quantity=1))
+            db.flush()
+            return name
+        
+        async def submit(name, timeout):
+            return await asyncio.wait_for(write_queue.submit(add, name), timeout)
+        
+        try:
+            # The submitter gives up and its loop closes while the job still runs
+            with pytest.raises(asyncio.TimeoutError):
+                asyncio.run(submit("abandoned", 0.1))
+            release.set()
+            assert asyncio.run(submit("later", 5)) == "later"
+        finally:
+            unregister_write_queue(engine)
+            engine.dispose()
+
+
 class TestRestockSweet:
     """Test cases for restocking sweets (admin only)"""
     
@@ -327,4 +1135,153 @@ class TestRestockSweet:
             headers={"Authorization": f"Bearer {admin_token}"},
             json={"quantity": 0}
         )
-        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
\ No newline at end of file
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+class TestLowStock:
+    """Test cases for reorder thresholds and low-stock alerts"""
+    
+    @pytest.fixture
+    def low_stock_events(self):
+        events = []
+        stock_alerts.subscribe(events.append)
+        yield events
+        stock_alerts.unsubscribe(events.append)
+    
+    def test_threshold_defaults_and_updates(self, client, user_token, test_sweet):
+        """Test sweets default to no threshold and it can be set like any field"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        assert client.get(f"/api/sweets/{test_sweet.id}", headers=headers).json()["reorder_threshold"] == 0
+        
+        response = client.put(f"/api/sweets/{test_sweet.id}", headers=headers, json={"reorder_threshold": 20})
+        assert response.json()["reorder_threshold"] == 20
+        invalid = client.put(f"/api/sweets/{test_sweet.id}", headers=headers, json={"reorder_threshold": -1})
+        assert invalid.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    
+    def test_low_stock_lists_sweets_below_threshold(self, client, user_token, admin_token, multiple_sweets):
+        """Test the listing follows stock and threshold changes, paginated by id"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        gummy, lollipop, chocolate, worms = multiple_sweets
+        client.put(f"/api/sweets/{lollipop.id}", headers=headers, json={"reorder_threshold": 250})
+        client.put(f"/api/sweets/{chocolate.id}", headers=headers, json={"reorder_threshold": 30})
+        client.put(f"/api/sweets/{worms.id}", headers=headers, json={"reorder_threshold": 100})
+        
+        def low_stock(path="/api/sweets/low-stock"):
+            return [sweet["id"] for sweet in client.get(path, headers=headers).json()]
+        
+        assert low_stock() == [lollipop.id, worms.id]
+        page = client.get("/api/sweets/low-stock?limit=1", headers=headers)
+        assert page.headers["X-Next-Cursor"] == str(lollipop.id)
+        assert low_stock(f"/api/sweets/low-stock?after={lollipop.id}") == [worms.id]
+        
+        client.post(f"/api/sweets/{chocolate.id}/purchase", headers=headers, json={"quantity": 1})
+        client.post(f"/api/sweets/{worms.id}/restock", headers=headers, json={"quantity": 25})
+        assert low_stock() == [lollipop.id, chocolate.id]
+        
+        forbidden = client.get("/api/sweets/low-stock", headers={"Authorization": f"Bearer {user_token}"})
+        assert forbidden.status_code == status.HTTP_403_FORBIDDEN
+    
+    def test_purchase_crossing_threshold_notifies_once(self, client, user_token, test_sweet, db_session, low_stock_events):
+        """Test only the sale that drops stock below the threshold publishes an event"""
+        test_sweet.reorder_threshold = 90
+        db_session.commit()
+        headers = {"Authorization": f"Bearer {user_token}"}
+        
+        for quantity in (5, 10, 1):
+            client.post(f"/api/sweets/{test_sweet.id}/purchase", headers=headers, json={"quantity": quantity})
+        assert [(event.sweet_id, event.name, event.quantity, event.reorder_threshold) for event in low_stock_events] == [
+            (test_sweet.id, "Chocolate Bar", 85, 90)
+        ]
+    
+    def test_batch_purchase_notifies_per_sweet(self, client, user_token, multiple_sweets, db_session, low_stock_events):
+        """Test a cart publishes one event for each sweet it takes below threshold"""
+        gummy, lollipop, chocolate, worms = multiple_sweets
+        gummy.reorder_threshold = 50
+        lollipop.reorder_threshold = 10
+        worms.reorder_threshold = 72
+        db_session.commit()
+        
+        response = client.post("/api/sweets/purchase-batch", headers={"Authorization": f"Bearer {user_token}"}, json={
+            "items": [{"sweet_id": sweet.id, "quantity": 5} for sweet in multiple_sweets]
+        })
+        assert response.status_code == status.HTTP_200_OK
+        assert sorted(event.sweet_id for event in low_stock_events) == [gummy.id, worms.id]
+    
+    def test_failing_subscriber_does_not_break_purchase(self, client, user_token, test_sweet, db_session, low_stock_events):
+        """Test subscriber errors are logged and later subscribers still run"""
+        test_sweet.reorder_threshold = 100
+        db_session.commit()
+        
+        def broken(event):
+            raise RuntimeError("dashboard offline")
+        
+        stock_alerts.subscribers.insert(0, broken)
+        try:
+            response = client.post(
+                f"/api/sweets/{test_sweet.id}/purchase",
+                headers={"Authorization": f"Bearer {user_token}"},
+                json={"quantity": 1}
+            )
+        finally:
+            stock_alerts.unsubscribe(broken)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(low_stock_events) == 1
+
+class TestQueryBudgets:
+    """Statement budgets per endpoint, so an extra query per request fails like a broken response would.
+    
+    Ids are read before each budget: touching an expired fixture object
+    would load it inside the block.
+    """
+    
+    def test_list_and_detail(self, client, user_token, test_sweet, query_counter):
+        """Test a cold read is one statement plus the user lookup, and a cached one is free"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        sweet_id = test_sweet.id
+        with query_counter.budget(2):
+            assert client.get("/api/sweets", headers=headers).status_code == status.HTTP_200_OK
+        with query_counter.budget(0):
+            assert client.get("/api/sweets", headers=headers).status_code == status.HTTP_200_OK
+        with query_counter.budget(1):
+            assert client.get(f"/api/sweets/{sweet_id}", headers=headers).status_code == status.HTTP_200_OK
+        with query_counter.budget(0):
+            assert client.get(f"/api/sweets/{sweet_id}", headers=headers).status_code == status.HTTP_200_OK
+        with query_counter.budget(1):
+            response = client.get("/api/sweets/search?name=Choc", headers=headers)
+            assert response.status_code == status.HTTP_200_OK
+    
+    def test_admin_writes(self, client, admin_token, test_sweet, query_counter):
+        """Test create, update, restock and delete stay within a few statements each"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        sweet_id = test_sweet.id
+        assert client.get("/api/auth/me", headers=headers).status_code == status.HTTP_200_OK
+        with query_counter.budget(2):
+            response = client.post("/api/sweets", headers=headers, json={
+                "name": "Toffee", "category": "Chewy", "price": 1.25, "quantity": 10
+            })
+            assert response.status_code == status.HTTP_201_CREATED
+        with query_counter.budget(3):
+            response = client.put(f"/api/sweets/{sweet_id}", headers=headers, json={"price": 3.0})
+            assert response.status_code == status.HTTP_200_OK
+        with query_counter.budget(2):
+            response = client.post(f"/api/sweets/{sweet_id}/restock", headers=headers, json={"quantity": 5})
+            assert response.status_code == status.HTTP_200_OK
+        with query_counter.budget(2):
+            assert client.delete(f"/api/sweets/{sweet_id}", headers=headers).status_code == status.HTTP_204_NO_CONTENT
+    
+    def test_purchases(self, client, user_token, test_sweet, multiple_sweets, query_counter):
+        """Test purchases don't load the sweet before updating it, and batches don't query per item"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        sweet_ids = [test_sweet.id] + [sweet.id for sweet in multiple_sweets]
+        assert client.get("/api/auth/me", headers=headers).status_code == status.HTTP_200_OK
+        with query_counter.budget(2):
+            response = client.post(f"/api/sweets/{sweet_ids[0]}/purchase", headers=headers, json={"quantity": 1})
+            assert response.status_code == status.HTTP_200_OK
+        with query_counter.budget(2):
+            response = client.post(f"/api/sweets/{sweet_ids[0]}/purchase", headers=headers, json={"quantity": 1000})
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+        with query_counter.budget(3):
+            response = client.post("/api/sweets/purchase-batch", headers=headers, json={
+                "items": [{"sweet_id": sweet_id, "quantity": 1} for sweet_id in sweet_ids]
+            })
+            assert response.status_code == status.HTTP_200_OK